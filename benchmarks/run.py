@@ -0,0 +1,299 @@
+"""Throughput and latency benchmarks of `HttpRequestRecorder`.
+
+Every combination of the given matcher types, expectation counts, concurrency levels and payload sizes is run
+as one scenario in a fresh process, driven by an aiohttp client in the same process:
+
+    python -m benchmarks.run --expectations 10,1000,10000 --concurrency 1,32 --output results.json
+    python -m benchmarks.run --compare baseline.json results.json
+
+Results are written as JSON: requests per second, latency percentiles in milliseconds and the peak RSS of the
+scenario's process (recorder and client together). The time aiohttp's router takes to resolve a request is
+measured separately for the recorder's catch-all route and, for comparison, for one route per method.
+
+With `--workers 1,2,4`, scenarios are also run against a `MultiProcessHttpRequestRecorder` with that many worker
+processes (0 is the single-process recorder). The load then comes from as many client processes as there are workers,
+so the client does not become the bottleneck - throughput only scales with free CPU cores for workers and clients.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import statistics
+import sys
+import time
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any
+
+import aiohttp
+from aiohttp import ClientSession, TCPConnector, web
+from aiohttp.test_utils import make_mocked_request
+
+from http_request_recorder import HttpRequestRecorder, MultiProcessHttpRequestRecorder, matchers
+
+MATCHER_TYPES = ('path', 'path_method', 'regex', 'json', 'callable')
+ROUTER_METHODS = ('GET', 'POST', 'PUT', 'DELETE', 'OPTIONS')
+
+
+def _expect(recorder: HttpRequestRecorder, matcher_type: str, index: int) -> None:
+    path = f'/resource/{index}'
+    responses = iter(lambda: b'ok', None)
+    if matcher_type == 'path':
+        recorder.expect(matchers.path(path), responses)
+    elif matcher_type == 'path_method':
+        recorder.expect(matchers.path(path) & matchers.method('POST'), responses)
+    elif matcher_type == 'regex':
+        recorder.expect(matchers.path_regex(rf'/resource/{index}(/.*)?'), responses)
+    elif matcher_type == 'json':
+        # all expectations share one path, so every request is checked against each of them
+        recorder.expect(matchers.path('/rpc') & matchers.json_field('id', index), responses)
+    elif matcher_type == 'callable':
+        recorder.expect(lambda request: request.path == path, responses, name=path)
+    else:
+        raise ValueError(f"unknown matcher type {matcher_type!r}, use one of {MATCHER_TYPES}")
+
+
+def _request_for(matcher_type: str, index: int, payload_size: int) -> tuple[str, bytes]:
+    if matcher_type == 'json':
+        body = json.dumps({'id': index, 'padding': 'x' * max(0, payload_size - 30)}).encode()
+        return '/rpc', body
+    return f'/resource/{index}', b'x' * payload_size
+
+
+async def _drive(base_url: str, scenario: dict[str, Any], concurrency: int, warmup: list[int], measured: list[int]) -> dict[str, Any]:
+    """Sends the requests for `warmup` and then `measured` targets, the latter are measured."""
+    latencies: list[float] = []
+    errors = 0
+
+    async with ClientSession(connector=TCPConnector(limit=concurrency)) as http_session:
+        async def send(index: int) -> bool:
+            path, body = _request_for(scenario['matcher'], index, scenario['payload_size'])
+            async with http_session.post(base_url + path, data=body) as response:
+                await response.read()
+                return response.status == 200
+
+        async def worker(queue: 'asyncio.Queue[int]', measure: bool) -> None:
+            nonlocal errors
+            while not queue.empty():
+                index = queue.get_nowait()
+                started = time.perf_counter()
+                ok = await send(index)
+                if measure:
+                    latencies.append(time.perf_counter() - started)
+                    errors += not ok
+
+        for measure, batch in ((False, warmup), (True, measured)):
+            queue: asyncio.Queue[int] = asyncio.Queue()
+            for index in batch:
+                queue.put_nowait(index)
+            # monotonic clocks are shared by all processes, so the measured phases of several clients can be combined
+            started = time.monotonic()
+            await asyncio.gather(*(worker(queue, measure) for _ in range(concurrency)))
+            finished = time.monotonic()
+
+    return {'latencies': latencies, 'errors': errors, 'started': started, 'finished': finished}
+
+
+def _drive_in_process(arguments: tuple[str, dict[str, Any], int, list[int], list[int]]) -> dict[str, Any]:
+    return asyncio.run(_drive(*arguments))
+
+
+async def _run_scenario(scenario: dict[str, Any], requests: int, warmup: int, seed: int) -> dict[str, Any]:
+    rng = random.Random(seed)
+    targets = [rng.randrange(scenario['expectations']) for _ in range(warmup + requests)]
+    workers = scenario.get('workers', 0)
+
+    recorder = MultiProcessHttpRequestRecorder('benchmark', workers=workers) if workers else HttpRequestRecorder('benchmark')
+    async with recorder:
+        for index in range(scenario['expectations']):
+            _expect(recorder, scenario['matcher'], index)
+
+        if not workers:
+            drives = [await _drive(recorder.base_url, scenario, scenario['concurrency'], targets[:warmup], targets[warmup:])]
+        else:
+            # one client process per worker, each with its share of the requests and of the concurrency
+            clients = [(recorder.base_url, scenario, max(1, scenario['concurrency'] // workers), targets[:warmup][client::workers],
+                        targets[warmup:][client::workers]) for client in range(workers)]
+            loop = asyncio.get_running_loop()
+            with ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                drives = await asyncio.gather(*(loop.run_in_executor(pool, _drive_in_process, client) for client in clients))
+
+    latencies = [latency for drive in drives for latency in drive['latencies']]
+    errors = sum(drive['errors'] for drive in drives)
+    elapsed = max(drive['finished'] for drive in drives) - min(drive['started'] for drive in drives)
+    return {
+        'scenario': scenario,
+        'requests': requests,
+        'errors': errors,
+        'seconds': round(elapsed, 4),
+        'requests_per_second': round(requests / elapsed, 1),
+        'latency_ms': _percentiles(latencies),
+        # ru_maxrss is in KiB on Linux
+        'peak_rss_kib': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def _percentiles(latencies: Sequence[float]) -> dict[str, float]:
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else list(latencies) * 99
+    return {
+        'p50': round(cuts[49] * 1000, 3),
+        'p90': round(cuts[89] * 1000, 3),
+        'p99': round(cuts[98] * 1000, 3),
+        'max': round(max(latencies) * 1000, 3),
+    }
+
+
+async def _handler(request: web.BaseRequest) -> web.Response:
+    return web.Response()
+
+
+async def _resolve_nanoseconds(routes: list[web.RouteDef], iterations: int) -> float:
+    app = web.Application()
+    app.add_routes(routes)
+    app.freeze()
+    requests = [make_mocked_request(method, '/resource/1?query=1', app=app) for method in ROUTER_METHODS]
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for request in requests:
+            await app.router.resolve(request)
+    return round((time.perf_counter() - started) / (iterations * len(requests)) * 1e9, 1)
+
+
+async def _measure_router(iterations: int) -> dict[str, float]:
+    """Nanoseconds per resolved request, for the routes `HttpRequestRecorder` registers and one route per method."""
+    return {
+        'catch_all_ns': await _resolve_nanoseconds([web.route('*', '/{tail:.*}', _handler)], iterations),
+        'per_method_ns': await _resolve_nanoseconds([web.route(method, '/{tail:.*}', _handler) for method in ROUTER_METHODS], iterations),
+    }
+
+
+def _run_in_process(arguments: tuple[dict[str, Any], int, int, int]) -> dict[str, Any]:
+    return asyncio.run(_run_scenario(*arguments))
+
+
+def _scenario_key(scenario: dict[str, Any]) -> tuple[Any, ...]:
+    # results from before multi-process scenarios existed were all single-process
+    return scenario['matcher'], scenario['expectations'], scenario['concurrency'], scenario['payload_size'], scenario.get('workers', 0)
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    scenarios = [
+        {'matcher': matcher, 'expectations': expectations, 'concurrency': concurrency, 'payload_size': payload_size, 'workers': workers}
+        for matcher, expectations, concurrency, payload_size, workers
+        in itertools.product(args.matchers, args.expectations, args.concurrency, args.payload_sizes, args.workers)
+    ]
+
+    router = asyncio.run(_measure_router(args.router_iterations))
+    print(f"router: {router['catch_all_ns']} ns per request with a catch-all route, {router['per_method_ns']} ns with one route per method",
+          file=sys.stderr)
+
+    results = []
+    # one process per scenario, so neither peak RSS nor garbage carries over between scenarios -
+    # unlike those of a multiprocessing.Pool, these processes may start the workers of a MultiProcessHttpRequestRecorder
+    with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn'), max_tasks_per_child=1) as pool:
+        for scenario in scenarios:
+            result = pool.submit(_run_in_process, (scenario, args.requests, args.warmup, args.seed)).result()
+            results.append(result)
+            print(_format_result(result), file=sys.stderr)
+
+    return {
+        'meta': {
+            'started': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'aiohttp': aiohttp.__version__,
+            'platform': platform.platform(),
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'seed': args.seed,
+        },
+        'router': router,
+        'results': results,
+    }
+
+
+def _format_result(result: dict[str, Any]) -> str:
+    scenario = result['scenario']
+    return (f"{scenario['matcher']:>12} {scenario['expectations']:>6} expectations {scenario['concurrency']:>4} concurrent "
+            f"{scenario['payload_size']:>8} B {scenario.get('workers', 0):>2} workers: {result['requests_per_second']:>9.1f} req/s  p50 {result['latency_ms']['p50']:.2f} ms  "
+            f"p99 {result['latency_ms']['p99']:.2f} ms  {result['peak_rss_kib'] // 1024} MiB")
+
+
+def compare(baseline_path: str, current_path: str, threshold: float) -> int:
+    """Prints the change of every scenario found in both files, returns 1 if any regressed by more than `threshold`."""
+    with open(baseline_path) as file:
+        baseline_file = json.load(file)
+    with open(current_path) as file:
+        current_file = json.load(file)
+    baseline = {_scenario_key(result['scenario']): result for result in baseline_file['results']}
+    current = current_file['results']
+
+    if 'router' in baseline_file and 'router' in current_file:
+        change = current_file['router']['catch_all_ns'] / baseline_file['router']['catch_all_ns'] - 1
+        print(f"{'router resolution':>40}: ns {change:+7.1%}")
+
+    regressed = False
+    for result in current:
+        before = baseline.get(_scenario_key(result['scenario']))
+        if before is None:
+            continue
+        throughput = result['requests_per_second'] / before['requests_per_second'] - 1
+        p99 = result['latency_ms']['p99'] / before['latency_ms']['p99'] - 1 if before['latency_ms']['p99'] else 0.0
+        marker = ''
+        if throughput < -threshold or p99 > threshold:
+            regressed = True
+            marker = '  REGRESSION'
+        print(f"{' '.join(str(value) for value in _scenario_key(result['scenario'])):>40}: "
+              f"req/s {throughput:+7.1%}  p99 {p99:+7.1%}{marker}")
+    return 1 if regressed else 0
+
+
+def _numbers(value: str) -> list[int]:
+    return [int(number) for number in value.split(',')]
+
+
+def _names(value: str) -> list[str]:
+    names = value.split(',')
+    for name in names:
+        if name not in MATCHER_TYPES:
+            raise argparse.ArgumentTypeError(f"unknown matcher type {name!r}, use one of {MATCHER_TYPES}")
+    return names
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--matchers', type=_names, default=['path', 'callable'], help=f"comma separated, of {', '.join(MATCHER_TYPES)}")
+    parser.add_argument('--expectations', type=_numbers, default=[10, 1000], help="comma separated expectation counts")
+    parser.add_argument('--concurrency', type=_numbers, default=[1, 32], help="comma separated numbers of concurrent requests")
+    parser.add_argument('--payload-sizes', type=_numbers, default=[0, 65536], help="comma separated request body sizes in bytes")
+    parser.add_argument('--workers', type=_numbers, default=[0],
+                        help="comma separated worker process counts of a MultiProcessHttpRequestRecorder, 0 for the single-process recorder")
+    parser.add_argument('--requests', type=int, default=2000, help="measured requests per scenario")
+    parser.add_argument('--warmup', type=int, default=200, help="requests per scenario before measuring")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--router-iterations', type=int, default=20000, help="requests per method resolved when measuring the router")
+    parser.add_argument('--output', help="write the results to this file instead of stdout")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="compare two result files instead of running")
+    parser.add_argument('--threshold', type=float, default=0.1, help="relative change counted as a regression when comparing")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        baseline, current = args.compare
+        return compare(baseline, current, args.threshold)
+
+    results = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(results + '\n')
+    else:
+        print(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,3 +1,23 @@
+from . import faults, matchers  # noqa: F401
+from .body_storage import BodyStoragePolicy, RecordedBody  # noqa: F401
+from .capture import CaptureLog, load_capture  # noqa: F401
+from .diagnostics import NearMiss  # noqa: F401
+from .faults import FaultProfile  # noqa: F401
+from .history import HistoryLimits, RequestHistory  # noqa: F401
+from .http2 import Http2Listener  # noqa: F401
 from .http_request_recorder import HttpRequestRecorder, RecordedRequest  # noqa: F401
+from .listeners import TcpListener, UnixListener  # noqa: F401
+from .metrics import RecorderMetrics  # noqa: F401
+from .multiprocess import MultiProcessHttpRequestRecorder  # noqa: F401
+from .proxy import ForwardedExchange, Upstream  # noqa: F401
+from .responses import StreamedResponse  # noqa: F401
+from .rpc import RpcError  # noqa: F401
+from .server import RecorderServer, RecorderSession  # noqa: F401
+from .streams import RequestStream  # noqa: F401
+from .tls import TlsConfig  # noqa: F401
 
-__all__ = ['HttpRequestRecorder', 'RecordedRequest']
+__all__ = [
+    'BodyStoragePolicy', 'CaptureLog', 'FaultProfile', 'ForwardedExchange', 'HistoryLimits', 'Http2Listener', 'HttpRequestRecorder', 'MultiProcessHttpRequestRecorder', 'NearMiss',
+    'RecordedBody', 'RecordedRequest', 'RecorderMetrics', 'RecorderServer', 'RecorderSession', 'RequestHistory', 'RequestStream', 'RpcError', 'StreamedResponse', 'TcpListener',
+    'TlsConfig', 'UnixListener', 'Upstream', 'faults', 'load_capture', 'matchers',
+]
@@ -0,0 +1,45 @@
+"""Runs a recorder until it is interrupted, e.g. as a sidecar container controlled through its control plane:
+
+    python -m http_request_recorder --port 8080 --control-plane
+"""
+import argparse
+import asyncio
+import logging
+import signal
+
+from .http_request_recorder import HttpRequestRecorder
+from .metrics import RecorderMetrics
+from .tls import TlsConfig
+
+
+async def serve(args: argparse.Namespace) -> None:
+    metrics = RecorderMetrics(endpoint=True) if args.metrics else None
+    async with HttpRequestRecorder(args.name, args.port, host=args.host, control_plane=args.control_plane, metrics=metrics,
+                                   upstream=args.upstream, tls=TlsConfig() if args.tls else None) as recorder:
+        logging.getLogger("recorder").warning(f"{recorder} is listening on {recorder.base_url}")
+
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_number, stopped.set)
+        await stopped.wait()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog='python -m http_request_recorder', description="Runs an HttpRequestRecorder until interrupted.")
+    parser.add_argument('--name', default='recorder')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=0, help="0 picks a free port")
+    parser.add_argument('--control-plane', action='store_true', help="serve the control API below /__recorder/")
+    parser.add_argument('--metrics', action='store_true', help="serve metrics at /__recorder/metrics")
+    parser.add_argument('--upstream', help="forward requests no expectation matches to this URL")
+    parser.add_argument('--tls', action='store_true', help="serve HTTPS with a self-signed certificate")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.log_level.upper())
+    asyncio.run(serve(args))
+
+
+if __name__ == '__main__':
+    main()
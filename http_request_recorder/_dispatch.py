@@ -0,0 +1,76 @@
+from typing import Generic, NamedTuple, TypeVar
+
+T = TypeVar('T')
+
+
+class DispatchKey(NamedTuple):
+    """What is known up front about the requests an expectation can match."""
+    path: str | None = None
+    path_prefix: str | None = None
+    methods: frozenset[str] | None = None
+
+
+class ExpectationIndex(Generic[T]):
+    """Narrows down the expectations that need to be asked about a request.
+
+    Expectations with a known path, path prefix or method are stored in hash indices,
+    everything else (opaque matchers) goes into a fallback bucket that is always consulted.
+    The index only pre-selects candidates - the expectations still decide on their own.
+    """
+
+    def __init__(self) -> None:
+        self._by_path: dict[str, dict[str | None, list[T]]] = {}
+        self._by_prefix: dict[str, dict[str | None, list[T]]] = {}
+        self._prefix_lengths: list[int] = []
+        self._by_method: dict[str, list[T]] = {}
+        self._fallback: list[T] = []
+        self._buckets: dict[int, list[list[T]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def add(self, item: T, key: DispatchKey = DispatchKey()) -> None:
+        methods: list[str | None] = [None] if key.methods is None else [*sorted(key.methods)]
+
+        buckets: list[list[T]]
+        if key.path is not None:
+            by_method = self._by_path.setdefault(key.path, {})
+            buckets = [by_method.setdefault(method, []) for method in methods]
+        elif key.path_prefix is not None:
+            by_method = self._by_prefix.setdefault(key.path_prefix, {})
+            buckets = [by_method.setdefault(method, []) for method in methods]
+            if len(key.path_prefix) not in self._prefix_lengths:
+                self._prefix_lengths.append(len(key.path_prefix))
+                self._prefix_lengths.sort()
+        elif key.methods is not None:
+            buckets = [self._by_method.setdefault(method, []) for method in key.methods]
+        else:
+            buckets = [self._fallback]
+
+        for bucket in buckets:
+            bucket.append(item)
+        self._buckets[id(item)] = buckets
+
+    def remove(self, item: T) -> None:
+        for bucket in self._buckets.pop(id(item), []):
+            bucket.remove(item)
+
+    def candidates(self, method: str, path: str) -> list[T]:
+        candidates: list[T] = []
+
+        by_method = self._by_path.get(path)
+        if by_method is not None:
+            candidates += by_method.get(method, [])
+            candidates += by_method.get(None, [])
+
+        for length in self._prefix_lengths:
+            if length > len(path):
+                break
+            by_method = self._by_prefix.get(path[:length])
+            if by_method is not None:
+                candidates += by_method.get(method, [])
+                candidates += by_method.get(None, [])
+
+        candidates += self._by_method.get(method, [])
+        candidates += self._fallback
+        return candidates
@@ -0,0 +1,201 @@
+import asyncio
+import hashlib
+import mmap
+import os
+import tempfile
+import weakref
+from typing import IO, Literal
+
+from aiohttp.web_request import BaseRequest
+
+_CHUNK_SIZE = 64 * 1024
+
+# (data, path, size, digest) of a body handed over to another process, see `RecordedBody._hand_over()`
+_BodyParts = tuple[bytes | None, str | None, int, str | None]
+
+
+class BodyStoragePolicy:
+    """Decides how recorded request bodies are kept.
+
+    Bodies up to `max_in_memory` bytes are kept as `bytes`. Larger ones are either streamed to a
+    temporary file in `directory` (`overflow='spill'`) or only hashed and counted (`overflow='digest'`).
+    Writing to the temporary file and hashing spilled chunks is done in the default executor.
+    """
+
+    def __init__(self, max_in_memory: int = 1024 * 1024, overflow: Literal['spill', 'digest'] = 'spill', directory: str | None = None) -> None:
+        if overflow not in ('spill', 'digest'):
+            raise ValueError("overflow must be 'spill' or 'digest'")
+
+        self.max_in_memory = max_in_memory
+        self.overflow = overflow
+        self.directory = directory
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} max_in_memory={self.max_in_memory} overflow={self.overflow!r}>"
+
+    async def read(self, request: BaseRequest) -> 'RecordedBody':
+        sink = _BodySink(self)
+        try:
+            async for chunk in request.content.iter_chunked(_CHUNK_SIZE):
+                await sink.write_async(chunk)
+        except BaseException:
+            # e.g. the client aborted the upload - a half written temporary file must not be left behind
+            sink.discard()
+            raise
+        return sink.close()
+
+    def store(self, data: bytes) -> 'RecordedBody':
+        """Applies this policy to a body that was already read, e.g. by another process."""
+        sink = _BodySink(self)
+        sink.write(data)
+        return sink.close()
+
+
+class _BodySink:
+    def __init__(self, policy: BodyStoragePolicy) -> None:
+        self._policy = policy
+        self._buffer = bytearray()
+        self._spill_file: IO[bytes] | None = None
+        self._digest = hashlib.sha256()
+        self._size = 0
+
+    async def write_async(self, chunk: bytes) -> None:
+        """Like `write()`, but chunks going to the temporary file are written without blocking the event loop."""
+        if self._policy.overflow == 'digest' or (self._spill_file is None and self._size + len(chunk) <= self._policy.max_in_memory):
+            self.write(chunk)
+        else:
+            await asyncio.get_running_loop().run_in_executor(None, self.write, chunk)
+
+    def write(self, chunk: bytes) -> None:
+        self._size += len(chunk)
+        if self._spill_file is None and self._size <= self._policy.max_in_memory:
+            self._buffer += chunk
+            return
+
+        if self._policy.overflow == 'digest':
+            if self._buffer:
+                self._digest.update(self._buffer)
+                self._buffer = bytearray()
+            self._digest.update(chunk)
+            return
+
+        if self._spill_file is None:
+            self._spill_file = tempfile.NamedTemporaryFile(prefix='recorded-body-', dir=self._policy.directory, delete=False)
+            self._spill_file.write(self._buffer)
+            self._digest.update(self._buffer)
+            self._buffer = bytearray()
+        self._spill_file.write(chunk)
+        self._digest.update(chunk)
+
+    def discard(self) -> None:
+        """Removes the temporary file of a body that will never be complete."""
+        if self._spill_file is not None:
+            self._spill_file.close()
+            _remove_file(self._spill_file.name)
+            self._spill_file = None
+
+    def close(self) -> 'RecordedBody':
+        if self._spill_file is not None:
+            self._spill_file.close()
+            return RecordedBody.from_file(self._spill_file.name, self._size, self._digest.hexdigest())
+        if self._size > self._policy.max_in_memory:
+            return RecordedBody.from_digest(self._size, self._digest.hexdigest())
+        return RecordedBody(bytes(self._buffer))
+
+
+class RecordedBody:
+    """A request body that is either kept in memory, in a temporary file or only as size and digest."""
+
+    __slots__ = ('size', '_data', '_path', '_digest', '_mmap', '_finalizer', '__weakref__')
+
+    def __init__(self, data: bytes = b'') -> None:
+        self.size: int = len(data)
+        self._data: bytes | None = data
+        self._path: str | None = None
+        self._digest: str | None = None
+        self._mmap: mmap.mmap | None = None
+        self._finalizer: 'weakref.finalize[[str], RecordedBody] | None' = None
+
+    @classmethod
+    def from_file(cls, path: str, size: int, digest: str) -> 'RecordedBody':
+        body = cls()
+        body.size, body._data, body._path, body._digest = size, None, path, digest
+        # the temporary file lives exactly as long as this body
+        body._finalizer = weakref.finalize(body, _remove_file, path)
+        return body
+
+    @classmethod
+    def _taken_over(cls, parts: _BodyParts) -> 'RecordedBody':
+        """The body another process handed over with `_hand_over()`, including its temporary file."""
+        data, path, size, digest = parts
+        if data is not None:
+            body = cls(data)
+            body._digest = digest
+            return body
+        if path is not None and digest is not None:
+            return cls.from_file(path, size, digest)
+        return cls.from_digest(size, digest or '')
+
+    def _hand_over(self) -> _BodyParts:
+        """Picklable parts of this body for another process, which becomes responsible for removing its temporary file."""
+        if self._finalizer is not None:
+            self._finalizer.detach()
+        return self._data, self._path, self.size, self._digest
+
+    @classmethod
+    def from_digest(cls, size: int, digest: str) -> 'RecordedBody':
+        body = cls()
+        body.size, body._data, body._digest = size, None, digest
+        return body
+
+    def __repr__(self) -> str:
+        storage = 'memory' if self._data is not None else 'file' if self._path is not None else 'digest only'
+        return f"<{self.__class__.__name__} {self.size} bytes in {storage}>"
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bytes__(self) -> bytes:
+        if self._data is not None:
+            return self._data
+        if self._path is not None:
+            with open(self._path, 'rb') as file:
+                return file.read()
+        raise LookupError(f"{self} was not retained, only its size and digest are known")
+
+    @property
+    def is_retained(self) -> bool:
+        return self._data is not None or self._path is not None
+
+    @property
+    def sha256(self) -> str:
+        if self._digest is None:
+            self._digest = hashlib.sha256(bytes(self)).hexdigest()
+        return self._digest
+
+    def view(self) -> memoryview:
+        """Zero-copy access to the body, backed by a memory map for bodies in temporary files."""
+        if self._data is not None:
+            return memoryview(self._data)
+        if self._path is not None:
+            if self._mmap is None:
+                with open(self._path, 'rb') as file:
+                    self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            return memoryview(self._mmap)
+        raise LookupError(f"{self} was not retained, only its size and digest are known")
+
+    def head(self, size: int) -> bytes:
+        """The first `size` bytes of the body, empty if it was not retained."""
+        if self._data is not None:
+            return self._data[:size]
+        if self._path is not None:
+            with open(self._path, 'rb') as file:
+                return file.read(size)
+        return b''
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
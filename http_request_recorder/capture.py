@@ -0,0 +1,192 @@
+"""Capturing recorded traffic to disk and replaying it as expectations.
+
+A `CaptureLog` appends every request and the response it got to a file while the recorder runs:
+
+    async with HttpRequestRecorder('upstream', capture=CaptureLog('traffic.jsonl.gz')) as recorder:
+        ...
+
+    async with HttpRequestRecorder('replayed upstream') as recorder:
+        expectations = load_capture(recorder, 'traffic.jsonl.gz')
+
+The file holds one JSON object per line, with request headers as received, including repeated ones. Bodies are stored
+once per SHA-256 in the directory `<path>.bodies`, exchanges refer to them by digest. A body already in the directory
+is not written again, also not by later runs. Files ending in `.gz` are gzip compressed; appending adds a gzip member,
+so a capture can be continued by later runs. Replayed responses stream their bodies from the body directory.
+"""
+import gzip
+import hashlib
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+from collections.abc import Iterator
+from logging import getLogger
+from typing import IO, TYPE_CHECKING, Any
+from urllib.parse import parse_qsl
+
+from aiohttp import web
+
+from . import matchers
+from .responses import StreamedResponse, _file_chunks
+
+if TYPE_CHECKING:
+    from .http_request_recorder import ExpectedInteraction, HttpRequestRecorder, RecordedRequest, ResponsesType
+
+CAPTURE_VERSION = 1
+
+_GZIP_MAGIC = b'\x1f\x8b'
+_STOP = object()
+_TEXT_HEADERS = {'Content-Type': 'text/plain; charset=utf-8'}
+
+
+class CaptureLog:
+    """Appends recorded requests and their responses to `path` from a background thread.
+
+    Requests are handed over to the thread as they are, so recording never waits for the disk.
+    Only `str`, `bytes` and `web.Response` bodies of responses are captured, other responses are stored without body.
+    """
+
+    def __init__(self, path: str | os.PathLike[str], compress: bool | None = None) -> None:
+        self.path = os.fspath(path)
+        self.compress = self.path.endswith('.gz') if compress is None else compress
+        self.bodies_dir = _bodies_dir(self.path)
+        self._queue: queue.SimpleQueue[Any] = queue.SimpleQueue()
+        self._thread: threading.Thread | None = None
+        self._logger = getLogger("recorder")
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.path}>"
+
+    def open(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._write_all, name=f"capture {self.path}", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        """Writes everything appended so far and stops the writer thread. Blocks, so use it from an executor in async code."""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def append(self, request: 'RecordedRequest', response: 'ResponsesType | None', expected: bool = True) -> None:
+        # only cheap references are taken here, hashing, encoding and writing happen on the writer thread
+        status, headers, body = _response_parts(response) if expected else (404, {}, None)
+        self._queue.put((time.time(), request.method, request.path, request.query_string, request.raw_headers, request.stored_body,
+                         expected, status, headers, body))
+
+    def _write_all(self) -> None:
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        file: gzip.GzipFile | IO[bytes] = gzip.open(self.path, 'ab') if self.compress else open(self.path, 'ab')
+        with file:
+            if new_file:
+                file.write(_line({'capture': CAPTURE_VERSION}))
+
+            while True:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                try:
+                    file.write(self._encode(item))
+                except Exception:
+                    self._logger.exception(f"{self} failed to write a request")
+                if self._queue.empty():
+                    file.flush()
+
+    def _encode(self, item: tuple[Any, ...]) -> bytes:
+        at, method, path, query_string, headers, stored_body, expected, status, response_headers, response_body = item
+
+        request_digest = stored_body.sha256
+        if stored_body.is_retained:
+            self._store_body(request_digest, stored_body.view())
+
+        response_digest = None
+        if response_body is not None:
+            response_digest = hashlib.sha256(response_body).hexdigest()
+            self._store_body(response_digest, response_body)
+
+        exchange = {'at': at, 'method': method, 'path': path, 'query': query_string, 'headers': [[name, value] for name, value in headers.items()],
+                    'body': request_digest, 'size': stored_body.size, 'status': status, 'response_headers': response_headers,
+                    'response_body': response_digest, 'response_size': len(response_body) if response_body is not None else 0}
+        if not expected:
+            exchange['unexpected'] = True
+        return _line(exchange)
+
+    def _store_body(self, digest: str, data: bytes | memoryview) -> None:
+        path = os.path.join(self.bodies_dir, digest)
+        # the directory is the index of stored bodies, it outlives this writer and may be shared with other processes
+        if os.path.exists(path):
+            return
+        with tempfile.NamedTemporaryFile(dir=self.bodies_dir, prefix='.body-', delete=False) as file:
+            file.write(data)
+        os.replace(file.name, path)
+
+
+def load_capture(recorder: 'HttpRequestRecorder', path: str | os.PathLike[str], timeout: float = 3) -> list['ExpectedInteraction']:
+    """Registers the captured exchanges of `path` as expectations of `recorder`, responding as they were captured.
+
+    Exchanges with the same method, path, query and body become one expectation responding in captured order.
+    Unexpected requests are skipped. Only status, headers and body digest of the responses are kept in memory,
+    their bodies are streamed from the body directory when they are sent.
+    """
+    path = os.fspath(path)
+    bodies_dir = _bodies_dir(path)
+    exchanges: dict[tuple[str, str, str, str], list[tuple[int, dict[str, str], str | None, int]]] = {}
+
+    for record in _read_records(path):
+        if 'method' in record and not record.get('unexpected', False):
+            key = (record['method'], record['path'], record['query'], record['body'])
+            exchanges.setdefault(key, []).append((record['status'], record['response_headers'], record['response_body'], record['response_size']))
+
+    expectations = []
+    for (method, path_, query_string, body_digest), captured in exchanges.items():
+        matcher = matchers.method(method) & matchers.path(path_) & matchers.body_sha256(body_digest)
+        for name, value in parse_qsl(query_string, keep_blank_values=True):
+            matcher = matcher & matchers.query_param(name, value)
+
+        responses = [_replayed(bodies_dir, *exchange) for exchange in captured]
+        expectations.append(recorder.expect(matcher, responses, name=f"captured {method} {path_}", timeout=timeout))
+    return expectations
+
+
+def _replayed(bodies_dir: str, status: int, headers: dict[str, str], digest: str | None, size: int) -> web.Response | StreamedResponse:
+    if digest is None or size == 0:
+        return web.Response(status=status, headers=headers)
+    body_path = os.path.join(bodies_dir, digest)
+    return StreamedResponse(lambda: _file_chunks(body_path), status, headers, content_length=size)
+
+
+def _bodies_dir(path: str) -> str:
+    return f'{path}.bodies'
+
+
+def _read_records(path: str) -> Iterator[dict[str, Any]]:
+    with open(path, 'rb') as raw:
+        compressed = raw.read(2) == _GZIP_MAGIC
+    file: gzip.GzipFile | IO[bytes] = gzip.open(path, 'rb') if compressed else open(path, 'rb')
+    with file:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _response_parts(response: 'ResponsesType | None') -> tuple[int, dict[str, str], bytes | None]:
+    if isinstance(response, str):
+        return 200, dict(_TEXT_HEADERS), response.encode()
+    if isinstance(response, bytes):
+        return 200, {}, response
+    if isinstance(response, web.Response):
+        headers = {name: value for name, value in response.headers.items() if name.lower() != 'content-length'}
+        return response.status, headers, response.body if isinstance(response.body, bytes) else None
+    if isinstance(response, (web.StreamResponse, StreamedResponse)):
+        return response.status, {}, None
+    return 200, {}, None
+
+
+def _line(record: dict[str, Any]) -> bytes:
+    return json.dumps(record, separators=(',', ':')).encode() + b'\n'
@@ -0,0 +1,281 @@
+"""An HTTP API to control a recorder from other processes, e.g. when it runs as a sidecar container.
+
+Enabled with `HttpRequestRecorder(..., control_plane=True)` or `python -m http_request_recorder --control-plane`,
+all endpoints are served below `/__recorder/` and exchange JSON:
+
+- `POST /__recorder/expectations` registers any number of expectations in one call:
+
+      {"expectations": [{"name": "create user",
+                         "match": {"method": "POST", "path": "/users", "json": {"name": "alice"}},
+                         "responses": [{"status": 201, "json": {"id": 1}}],
+                         "timeout": 3}]}
+
+  `match` combines `path`, `path_prefix`, `path_regex`, `path_glob`, `method` (one or a list), `headers`,
+  `query`, `json` (dotted fields), `xml` (ElementTree paths) and `body_sha256`. Values of `headers`, `query` and `xml`
+  are either a string, `{"regex": "..."}` or `null` to only require presence.
+  Each response is either a string or an object with `status`, `headers` and one of `body`, `body_base64` or `json`.
+  With `"repeat": true`, the responses are repeated forever.
+  The answer lists an `id` per expectation, in order. If any expectation is invalid, none are registered.
+- `GET /__recorder/expectations` lists all expectations and how many requests they got.
+- `POST /__recorder/wait` long-polls until expectations got their requests, like `wait_for()`:
+  `{"ids": ["1", "2"], "count": 1, "timeout": 5}`. Without `ids`, it waits for all expectations with limited responses.
+  Answers with the requests per id, or 408 listing what is missing - a timed out wait can be retried.
+- `GET /__recorder/requests?expectation=<id>&offset=0&limit=100` pages through the requests an expectation got,
+  `expectation=unexpected` through the unexpected ones. Offsets count from the first request ever recorded.
+"""
+import base64
+import json
+import re
+from collections.abc import Callable
+from itertools import count, cycle
+from typing import TYPE_CHECKING, Any
+
+from aiohttp import web
+from aiohttp.web_request import BaseRequest
+
+from . import matchers
+
+if TYPE_CHECKING:
+    from .history import RequestHistory
+    from .http_request_recorder import ExpectedInteraction, HttpRequestRecorder, RecordedRequest
+
+CONTROL_PLANE_PREFIX = '/__recorder'
+
+_DEFAULT_PAGE_SIZE = 100
+_MAX_PAGE_SIZE = 1000
+
+
+class ControlPlane:
+    """Serves the control API of one recorder."""
+
+    def __init__(self, recorder: 'HttpRequestRecorder') -> None:
+        self._recorder = recorder
+        self._ids = count(1)
+        self._expectations: dict[str, 'ExpectedInteraction'] = {}
+
+    def routes(self) -> list[web.RouteDef]:
+        return [
+            web.post(f'{CONTROL_PLANE_PREFIX}/expectations', self.register),
+            web.get(f'{CONTROL_PLANE_PREFIX}/expectations', self.list_expectations),
+            web.post(f'{CONTROL_PLANE_PREFIX}/wait', self.wait),
+            web.get(f'{CONTROL_PLANE_PREFIX}/requests', self.requests),
+        ]
+
+    async def register(self, request: BaseRequest) -> web.Response:
+        document = await _read_json(request)
+        specs = document.get('expectations') if isinstance(document, dict) else document
+        if not isinstance(specs, list):
+            raise _bad_request("expected a list of expectations or an object with 'expectations'")
+
+        # everything is validated before anything is registered, so a bad call leaves no half of its expectations behind
+        parsed = []
+        for position, spec in enumerate(specs):
+            try:
+                parsed.append(_parse_expectation(spec))
+            except (ValueError, TypeError, re.error) as error:
+                raise _bad_request(f"expectation {position}: {error}") from None
+
+        registered = []
+        for matcher, responses, name, timeout in parsed:
+            expectation = self._recorder.expect(matcher, responses, name=name, timeout=timeout)
+            expectation_id = str(next(self._ids))
+            self._expectations[expectation_id] = expectation
+            registered.append({'id': expectation_id, 'name': expectation.name})
+        return web.json_response({'expectations': registered}, status=201)
+
+    async def list_expectations(self, request: BaseRequest) -> web.Response:
+        return web.json_response({'expectations': [
+            {'id': expectation_id, 'name': expectation.name, 'recorded': expectation._recorded_count,
+             'expected': expectation.expected_count, 'satisfied': not expectation.is_still_expecting_requests()}
+            for expectation_id, expectation in self._expectations.items()
+        ]})
+
+    async def wait(self, request: BaseRequest) -> web.Response:
+        document = await _read_json(request) if request.can_read_body else {}
+        if not isinstance(document, dict):
+            raise _bad_request("expected an object")
+
+        ids, count, timeout = document.get('ids'), document.get('count'), document.get('timeout')
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(expectation_id, (str, int)) for expectation_id in ids)):
+            raise _bad_request("ids must be a list of expectation ids")
+        if count is not None and (not _is_number(count, int) or count < 0):
+            raise _bad_request("count must be a non-negative integer")
+        if timeout is not None and (not _is_number(timeout, (int, float)) or timeout < 0):
+            raise _bad_request("timeout must be a non-negative number of seconds")
+
+        if ids is None:
+            ids = [expectation_id for expectation_id, expectation in self._expectations.items() if expectation.expected_count is not None]
+        expectations = {self._lookup(str(expectation_id)): str(expectation_id) for expectation_id in ids}
+
+        try:
+            recorded = await self._recorder._wait_for_requests(expectations, count, timeout)
+        except TimeoutError as error:
+            return web.json_response({'error': str(error)}, status=408)
+        except ValueError as error:
+            raise _bad_request(str(error)) from None
+
+        return web.json_response({'requests': {expectations[expectation]: [_request_to_json(recorded_request) for recorded_request in requests]
+                                               for expectation, requests in recorded.items()}})
+
+    async def requests(self, request: BaseRequest) -> web.Response:
+        expectation_id = request.query.get('expectation', 'unexpected')
+        history: 'RequestHistory'
+        if expectation_id == 'unexpected':
+            history = self._recorder.unexpected_request_history
+        else:
+            history = self._lookup(expectation_id).history
+
+        try:
+            offset = max(0, int(request.query.get('offset', 0)))
+            limit = min(_MAX_PAGE_SIZE, max(1, int(request.query.get('limit', _DEFAULT_PAGE_SIZE))))
+        except ValueError:
+            raise _bad_request("offset and limit must be integers") from None
+
+        total = history.evicted + len(history)
+        start = max(offset, history.evicted)
+        page = [_request_to_json(history[position - history.evicted]) for position in range(start, min(total, start + limit))]
+        next_offset = start + len(page) if start + len(page) < total else None
+        return web.json_response({'requests': page, 'offset': start, 'next_offset': next_offset, 'total': total, 'evicted': history.evicted})
+
+    def _lookup(self, expectation_id: str) -> 'ExpectedInteraction':
+        try:
+            return self._expectations[expectation_id]
+        except KeyError:
+            raise web.HTTPNotFound(text=json.dumps({'error': f"no expectation with id {expectation_id!r}"}), content_type='application/json') from None
+
+
+async def _read_json(request: BaseRequest) -> Any:
+    try:
+        return json.loads(await request.read())
+    except ValueError as error:
+        raise _bad_request(f"invalid JSON: {error}") from None
+
+
+def _is_number(value: Any, types: type | tuple[type, ...]) -> bool:
+    # bool is an int, but `"count": true` is a mistake
+    return isinstance(value, types) and not isinstance(value, bool)
+
+
+def _bad_request(message: str) -> web.HTTPBadRequest:
+    return web.HTTPBadRequest(text=json.dumps({'error': message}), content_type='application/json')
+
+
+def _parse_expectation(spec: Any) -> tuple[matchers.Matcher, Any, str | None, float]:
+    if not isinstance(spec, dict):
+        raise TypeError("must be an object")
+    unknown = set(spec) - {'name', 'match', 'responses', 'repeat', 'timeout'}
+    if unknown:
+        raise ValueError(f"unknown keys {sorted(unknown)}")
+
+    matcher = _parse_matcher(spec.get('match', {}))
+
+    response_specs = spec.get('responses', [""])
+    if not isinstance(response_specs, list):
+        response_specs = [response_specs]
+    responses = [_parse_response(response) for response in response_specs]
+
+    timeout = spec.get('timeout', 3)
+    if not isinstance(timeout, (int, float)):
+        raise TypeError("timeout must be a number")
+    name = spec.get('name')
+    if name is not None and not isinstance(name, str):
+        raise TypeError("name must be a string")
+
+    return matcher, cycle(responses) if spec.get('repeat', False) else responses, name, timeout
+
+
+def _parse_matcher(spec: Any) -> matchers.Matcher:
+    if not isinstance(spec, dict):
+        raise TypeError("match must be an object")
+
+    parts: list[matchers.Matcher] = []
+    for key, value in spec.items():
+        if key == 'path':
+            parts.append(matchers.path(_string(key, value)))
+        elif key == 'path_prefix':
+            parts.append(matchers.path_prefix(_string(key, value)))
+        elif key == 'path_regex':
+            parts.append(matchers.path_regex(_string(key, value)))
+        elif key == 'path_glob':
+            parts.append(matchers.path_glob(_string(key, value)))
+        elif key == 'method':
+            methods = [value] if isinstance(value, str) else value
+            parts.append(matchers.method(*(_string(key, method) for method in methods)))
+        elif key == 'headers':
+            parts.extend(matchers.header(name, _value(key, expected)) for name, expected in _object(key, value).items())
+        elif key == 'query':
+            parts.extend(matchers.query_param(name, _value(key, expected)) for name, expected in _object(key, value).items())
+        elif key == 'json':
+            parts.extend(matchers.json_field(field, expected) for field, expected in _object(key, value).items())
+        elif key == 'xml':
+            parts.extend(matchers.xml_field(path, _value(key, expected)) for path, expected in _object(key, value).items())
+        elif key == 'body_sha256':
+            parts.append(matchers.body_sha256(_string(key, value)))
+        else:
+            raise ValueError(f"unknown match key {key!r}")
+
+    if not parts:
+        # like a callable always returning True, but still declarative
+        return matchers.path_prefix('/')
+    return parts[0] if len(parts) == 1 else matchers.AllOf(*parts)
+
+
+def _parse_response(spec: Any) -> str | Callable[['RecordedRequest'], web.Response]:
+    if isinstance(spec, str):
+        return spec
+    if not isinstance(spec, dict):
+        raise TypeError("a response must be a string or an object")
+    unknown = set(spec) - {'status', 'headers', 'body', 'body_base64', 'json'}
+    if unknown:
+        raise ValueError(f"unknown response keys {sorted(unknown)}")
+
+    status = spec.get('status', 200)
+    if not isinstance(status, int):
+        raise TypeError("status must be an integer")
+    headers = {name: _string('headers', value) for name, value in _object('headers', spec.get('headers', {})).items()}
+
+    content_type = None
+    if 'json' in spec:
+        body = json.dumps(spec['json']).encode()
+        content_type = 'application/json'
+    elif 'body_base64' in spec:
+        body = base64.b64decode(_string('body_base64', spec['body_base64']), validate=True)
+    else:
+        body = _string('body', spec.get('body', '')).encode()
+    if content_type is not None and not any(name.lower() == 'content-type' for name in headers):
+        headers['Content-Type'] = content_type
+
+    # a web.Response can only be sent once, so a fresh one is created for every request
+    return lambda _: web.Response(status=status, headers=headers, body=body)
+
+
+def _request_to_json(request: 'RecordedRequest') -> dict[str, Any]:
+    result: dict[str, Any] = {'method': request.method, 'path': request.path, 'query': request.query_string, 'headers': request.headers,
+                              'body_size': request.stored_body.size, 'body_sha256': request.stored_body.sha256}
+    if request.stored_body.is_retained:
+        body = request.body
+        try:
+            result['body'] = body.decode('utf-8')
+        except UnicodeDecodeError:
+            result['body_base64'] = base64.b64encode(body).decode('ascii')
+    return result
+
+
+def _string(key: str, value: Any) -> str:
+    if not isinstance(value, str):
+        raise TypeError(f"{key} must be a string")
+    return value
+
+
+def _object(key: str, value: Any) -> dict[str, Any]:
+    if not isinstance(value, dict):
+        raise TypeError(f"{key} must be an object")
+    return value
+
+
+def _value(key: str, value: Any) -> str | re.Pattern[str] | None:
+    if value is None or isinstance(value, str):
+        return value
+    if isinstance(value, dict) and set(value) == {'regex'}:
+        return re.compile(_string(key, value['regex']))
+    raise TypeError(f"values of {key} must be a string, {{\"regex\": ...}} or null")
@@ -0,0 +1,124 @@
+"""Explaining unexpected requests: which expectations came closest to matching them, and what they failed on.
+
+    for request, near_misses in recorder.diagnose_unexpected_requests():
+        print(request, *near_misses, sep='\\n  ')
+
+Nothing is computed while requests are handled. The features of expectations (methods, path segments, header names,
+RPC method) are extracted from their declarative matchers when they are first needed and kept for later diagnoses.
+They rank all expectations cheaply; only the closest ones are asked which of their predicates a request fails.
+"""
+from collections.abc import Sequence
+from logging import getLogger
+from typing import TYPE_CHECKING, NamedTuple
+
+from . import matchers
+
+if TYPE_CHECKING:
+    from .http_request_recorder import ExpectedInteraction, RecordedRequest
+
+# how many of the most similar expectations are explained, the rest is only ranked by features
+_SHORTLIST = 20
+
+
+class NearMiss(NamedTuple):
+    """An expectation that did not match a request, with the share of its predicates the request satisfies."""
+    expectation: 'ExpectedInteraction'
+    score: float
+    failed: tuple[str, ...]
+
+    def __str__(self) -> str:
+        return f"{self.expectation.name!r} ({self.score:.0%}): {'; '.join(self.failed)}"
+
+
+class _Features(NamedTuple):
+    methods: frozenset[str] | None
+    path_segments: tuple[str, ...] | None
+    path_prefix: str | None
+    header_names: tuple[str, ...]
+    rpc_method: str | None
+
+
+_NO_FEATURES = _Features(None, None, None, (), None)
+
+
+class NearMissIndex:
+    """Features of expectations, extracted on first use, to find the expectations closest to a request."""
+
+    def __init__(self) -> None:
+        self._features: dict[int, _Features] = {}
+
+    def near_misses(self, request: 'RecordedRequest', expectations: Sequence['ExpectedInteraction'], limit: int = 3) -> list[NearMiss]:
+        """The `limit` expectations coming closest to matching `request`, closest first."""
+        similarity = {id(expectation): self._similarity(self._features_of(expectation), request) for expectation in expectations}
+        ranked = sorted(expectations, key=lambda expectation: similarity[id(expectation)], reverse=True)
+        explained = [_explain(expectation, request) for expectation in ranked[:max(limit, _SHORTLIST)]]
+        explained.sort(key=lambda near_miss: (near_miss.score, similarity[id(near_miss.expectation)]), reverse=True)
+        return explained[:limit]
+
+    def _features_of(self, expectation: 'ExpectedInteraction') -> _Features:
+        features = self._features.get(id(expectation))
+        if features is None:
+            features = self._features[id(expectation)] = _extract(expectation._declared)
+        return features
+
+    @staticmethod
+    def _similarity(features: _Features, request: 'RecordedRequest') -> float:
+        """Between 0 and 1: the average agreement of the request with each feature the expectation has."""
+        parts: list[float] = []
+        if features.methods is not None:
+            parts.append(1.0 if request.method in features.methods else 0.0)
+        if features.path_prefix is not None:
+            parts.append(1.0 if request.path.startswith(features.path_prefix) else 0.0)
+        elif features.path_segments is not None:
+            actual = _segments(request.path)
+            same = sum(1 for expected, segment in zip(features.path_segments, actual) if expected == segment)
+            parts.append(same / max(len(features.path_segments), len(actual)))
+        if features.header_names:
+            parts.append(sum(1 for name in features.header_names if name in request.raw_headers) / len(features.header_names))
+        if features.rpc_method is not None:
+            parts.append(1.0 if request.rpc_method() == features.rpc_method else 0.0)
+        return sum(parts) / len(parts) if parts else 0.0
+
+
+def _segments(path: str) -> tuple[str, ...]:
+    return tuple(path.strip('/').split('/'))
+
+
+def _extract(matcher: matchers.Matcher | None) -> _Features:
+    if matcher is None:
+        return _NO_FEATURES
+    methods: frozenset[str] | None = None
+    path_segments, path_prefix, header_names, rpc_method = None, None, [], None
+    # only the parts every matching request has - alternatives and negations are left out
+    for part in matcher.matchers if isinstance(matcher, matchers.AllOf) else (matcher,):
+        if isinstance(part, matchers.Method):
+            methods = part.methods if methods is None else methods & part.methods
+        elif isinstance(part, matchers.PathEquals):
+            path_segments = _segments(part.path)
+        elif isinstance(part, matchers.PathPrefix):
+            path_prefix = part.prefix
+        elif isinstance(part, matchers.Header):
+            header_names.append(part.name)
+        elif isinstance(part, matchers.RpcMethod):
+            rpc_method = part.name
+    return _Features(methods, path_segments, path_prefix, tuple(header_names), rpc_method)
+
+
+def _explain(expectation: 'ExpectedInteraction', request: 'RecordedRequest') -> NearMiss:
+    declared = expectation._declared
+    try:
+        if declared is not None:
+            failed = [repr(predicate) for predicate in declared.explain(request)]
+            count = declared.predicate_count()
+        else:
+            failed = [] if expectation._matcher(request) else ["custom matcher returned False"]
+            count = 1
+    except Exception as error:
+        getLogger("recorder").debug(f"{expectation} raised while explaining why it did not match", exc_info=True)
+        return NearMiss(expectation, 0.0, (f"matcher raised {error!r}",))
+
+    if failed:
+        return NearMiss(expectation, 1 - len(failed) / count, tuple(failed))
+    if expectation.is_exhausted():
+        return NearMiss(expectation, 1.0, (f"matches, but had no responses left after {expectation.expected_count} requests",))
+    return NearMiss(expectation, 1.0, ("matches now, it may have been registered after the request",))
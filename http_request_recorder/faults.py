@@ -0,0 +1,174 @@
+"""Latency, bandwidth and fault injection for responses.
+
+A `FaultProfile` can be attached to single expectations or to a whole recorder:
+
+    from http_request_recorder import faults
+
+    slow_and_flaky = faults.FaultProfile(delay=faults.lognormal(mu=-3, sigma=0.8), bytes_per_second=256 * 1024,
+                                         reset_probability=0.01, seed=42)
+    recorder.expect_path('/download', payload, faults=slow_and_flaky)
+
+All waiting is done with asyncio, so any number of delayed or throttled responses overlap.
+"""
+import asyncio
+import os
+import random
+import socket
+import struct
+from collections.abc import Awaitable, Callable, Iterable
+from os import PathLike
+from typing import Any, NamedTuple
+
+from aiohttp import web
+from aiohttp.web_request import BaseRequest
+
+from .responses import StreamedResponse, _file_chunks, _iterate
+
+DelayType = float | Callable[[random.Random], float]
+
+# throttled bodies are written in slices of this many seconds worth of bytes
+_THROTTLE_INTERVAL = 0.05
+
+
+def fixed(seconds: float) -> Callable[[random.Random], float]:
+    return lambda _: seconds
+
+
+def uniform(low: float, high: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.uniform(low, high)
+
+
+def normal(mean: float, stddev: float) -> Callable[[random.Random], float]:
+    """Normally distributed delay, negative samples are cut off at 0."""
+    return lambda rng: max(0.0, rng.gauss(mean, stddev))
+
+
+def lognormal(mu: float, sigma: float) -> Callable[[random.Random], float]:
+    """Log-normally distributed delay - a typical shape for latencies with a long tail."""
+    return lambda rng: rng.lognormvariate(mu, sigma)
+
+
+def exponential(mean: float) -> Callable[[random.Random], float]:
+    return lambda rng: rng.expovariate(1 / mean)
+
+
+class FaultProfile:
+    """How responses are delayed, throttled or broken.
+
+    - `delay`: seconds before the response is started, either fixed or drawn from a distribution (see `lognormal` et al.)
+    - `bytes_per_second`: limits the rate at which the body is written
+    - `reset_probability`: chance that the connection is reset instead of responding
+    - `partial_body_probability`: chance that only `partial_body_fraction` of the body is sent before the connection is reset
+    - `seed`: makes all random decisions reproducible
+    """
+
+    def __init__(self, delay: DelayType = 0.0, bytes_per_second: float | None = None, reset_probability: float = 0.0,
+                 partial_body_probability: float = 0.0, partial_body_fraction: float = 0.5, seed: int | None = None) -> None:
+        self.delay = delay
+        self.bytes_per_second = bytes_per_second
+        self.reset_probability = reset_probability
+        self.partial_body_probability = partial_body_probability
+        self.partial_body_fraction = partial_body_fraction
+        self._random = random.Random(seed)
+
+    def __repr__(self) -> str:
+        return (f"<{self.__class__.__name__} delay={self.delay!r} bytes_per_second={self.bytes_per_second} "
+                f"reset_probability={self.reset_probability} partial_body_probability={self.partial_body_probability}>")
+
+    def _next_delay(self) -> float:
+        return self.delay(self._random) if callable(self.delay) else self.delay
+
+    def _plan(self) -> '_FaultPlan':
+        # all random decisions are made up front, so a seeded profile behaves the same regardless of timing
+        delay = self._next_delay()
+        reset = self.reset_probability > 0 and self._random.random() < self.reset_probability
+        partial = self.partial_body_probability > 0 and self._random.random() < self.partial_body_probability
+        return _FaultPlan(delay, reset, partial, self.bytes_per_second, self.partial_body_fraction)
+
+    async def respond(self, request: BaseRequest, response: Any, render: Callable[[BaseRequest, Any], Awaitable[web.StreamResponse]]) -> web.StreamResponse:
+        return await _apply(self._plan(), request, response, render)
+
+
+class _FaultPlan(NamedTuple):
+    """The decisions of a `FaultProfile` for one response - picklable, so they can be applied in another process."""
+    delay: float
+    reset: bool
+    partial: bool
+    bytes_per_second: float | None
+    partial_body_fraction: float
+
+
+async def _apply(plan: _FaultPlan, request: BaseRequest, response: Any,
+                 render: Callable[[BaseRequest, Any], Awaitable[web.StreamResponse]]) -> web.StreamResponse:
+    if plan.delay > 0:
+        await asyncio.sleep(plan.delay)
+
+    if plan.reset:
+        _reset_connection(request)
+        return web.Response(status=200)
+
+    if plan.bytes_per_second is None and not plan.partial:
+        return await render(request, response)
+
+    streamed = _as_streamed(response)
+    if streamed is None:
+        # e.g. native web.StreamResponses - these can only be delayed or reset
+        return await render(request, response)
+
+    stream = streamed.prepare_response()
+    await stream.prepare(request)
+
+    chunks = streamed.chunks() if callable(streamed.chunks) else streamed.chunks
+    budget = int(streamed.content_length * plan.partial_body_fraction) if plan.partial and streamed.content_length is not None else None
+    sent = 0
+    started = asyncio.get_running_loop().time()
+    async for chunk in _iterate(chunks):
+        if budget is not None:
+            chunk = chunk[:budget - sent]
+        for piece in _slices(chunk, plan.bytes_per_second):
+            await stream.write(piece)
+            sent += len(piece)
+            if plan.bytes_per_second is not None:
+                # sleep until the rate is met again instead of a fixed time, so the overhead doesn't add up
+                due = started + sent / plan.bytes_per_second
+                await asyncio.sleep(max(0.0, due - asyncio.get_running_loop().time()))
+        # without a known length, a partial body ends after the first chunk
+        if plan.partial and (budget is None or sent >= budget):
+            _reset_connection(request)
+            return stream
+
+    await stream.write_eof()
+    return stream
+
+
+def _slices(chunk: bytes, bytes_per_second: float | None) -> Iterable[bytes]:
+    if bytes_per_second is None:
+        return (chunk,)
+    size = max(1, int(bytes_per_second * _THROTTLE_INTERVAL))
+    return (chunk[start:start + size] for start in range(0, len(chunk), size))
+
+
+def _as_streamed(response: Any) -> StreamedResponse | None:
+    if isinstance(response, StreamedResponse):
+        return response
+    if isinstance(response, (str, bytes)):
+        body = response.encode() if isinstance(response, str) else response
+        return StreamedResponse((body,), content_length=len(body))
+    if isinstance(response, web.Response) and isinstance(response.body, bytes):
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in ('content-length', 'content-type')}
+        return StreamedResponse((response.body,), status=response.status, headers=headers,
+                                content_type=response.content_type, content_length=len(response.body))
+    if isinstance(response, PathLike):
+        return StreamedResponse(lambda: _file_chunks(response), content_length=os.path.getsize(response))
+    return None
+
+
+def _reset_connection(request: BaseRequest) -> None:
+    transport = request.transport
+    if transport is None:
+        return
+    sock = transport.get_extra_info('socket')
+    if sock is not None:
+        # closing with a zero linger timeout sends a TCP RST instead of a FIN
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    transport.abort()
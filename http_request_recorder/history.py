@@ -0,0 +1,89 @@
+from collections import deque
+from collections.abc import Iterable, Iterator
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .http_request_recorder import RecordedRequest
+
+
+class HistoryLimits:
+    """Bounds for how many recorded requests are kept and how many body bytes they may hold.
+
+    Once `max_bytes` is exceeded, the oldest requests are evicted - or, with `metadata_only_over_budget`,
+    reduced to method, path, the `metadata_headers` and size and digest of their body.
+    """
+
+    def __init__(self, max_count: int | None = None, max_bytes: int | None = None, metadata_only_over_budget: bool = False,
+                 metadata_headers: Iterable[str] = ('Content-Type', 'Content-Length')) -> None:
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.metadata_only_over_budget = metadata_only_over_budget
+        self.metadata_headers = tuple(metadata_headers)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} max_count={self.max_count} max_bytes={self.max_bytes}>"
+
+
+class RequestHistory:
+    """Ring buffer of recorded requests, keeping the most recent window within its `HistoryLimits`."""
+
+    def __init__(self, limits: HistoryLimits | None = None) -> None:
+        self.limits = limits or HistoryLimits()
+        self.evicted = 0
+        self.reduced_to_metadata = 0
+        self.retained_bytes = 0
+
+        self._requests: deque[RecordedRequest] = deque()
+        # requests are reduced oldest first, so all reduced ones are at the start of `_requests`
+        self._metadata_only = 0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {len(self)} requests, {self.retained_bytes} bytes, {self.evicted} evicted>"
+
+    def __len__(self) -> int:
+        return len(self._requests)
+
+    def __iter__(self) -> Iterator['RecordedRequest']:
+        return iter(self._requests)
+
+    def __getitem__(self, index: int) -> 'RecordedRequest':
+        return self._requests[index]
+
+    def to_list(self) -> list['RecordedRequest']:
+        return list(self._requests)
+
+    def append(self, request: 'RecordedRequest') -> None:
+        self._requests.append(request)
+        self.retained_bytes += self._size_of(request)
+
+        max_count = self.limits.max_count
+        while max_count is not None and len(self._requests) > max_count:
+            self._evict_oldest()
+
+        max_bytes = self.limits.max_bytes
+        if max_bytes is None:
+            return
+
+        while self.retained_bytes > max_bytes and self._requests:
+            if self.limits.metadata_only_over_budget and self._metadata_only < len(self._requests):
+                self._reduce_oldest_to_metadata()
+            else:
+                self._evict_oldest()
+
+    def _evict_oldest(self) -> None:
+        evicted = self._requests.popleft()
+        self.retained_bytes -= self._size_of(evicted)
+        self._metadata_only = max(0, self._metadata_only - 1)
+        self.evicted += 1
+
+    def _reduce_oldest_to_metadata(self) -> None:
+        full = self._requests[self._metadata_only]
+        reduced = full.metadata_only(self.limits.metadata_headers)
+        self._requests[self._metadata_only] = reduced
+        self.retained_bytes += self._size_of(reduced) - self._size_of(full)
+        self._metadata_only += 1
+        self.reduced_to_metadata += 1
+
+    @staticmethod
+    def _size_of(request: 'RecordedRequest') -> int:
+        return request.stored_body.size if request.stored_body.is_retained else 0
@@ -0,0 +1,208 @@
+"""HTTP/2 for recorders, to test how clients multiplex requests over few connections:
+
+    tls = TlsConfig()
+    async with HttpRequestRecorder('upstream', tls=tls, listeners=[Http2Listener(port=8443, tls=tls)]) as recorder:
+        ...
+
+Needs the optional `h2` package. With `tls`, HTTP/2 is negotiated through ALPN, otherwise clients have to speak h2c
+with prior knowledge. aiohttp only serves HTTP/1.1, so the listener has its own server: requests are dispatched to the
+recorder's expectations like all others, but responses are sent as a whole once they are complete - bodies of
+`StreamedResponse`s and files are collected first, `FaultProfile`s, metrics and control plane routes are not served.
+"""
+import asyncio
+import socket
+from typing import TYPE_CHECKING, Any
+
+from aiohttp import HttpVersion
+from yarl import URL
+
+from .responses import _materialize
+from .tls import TlsConfig
+
+if TYPE_CHECKING:
+    from .http_request_recorder import HttpRequestRecorder
+
+# not allowed in HTTP/2 (RFC 9113, section 8.2.2)
+_CONNECTION_HEADERS = frozenset({'connection', 'keep-alive', 'proxy-connection', 'transfer-encoding', 'upgrade', 'content-length'})
+_HTTP_2 = HttpVersion(2, 0)
+
+
+class Http2Listener:
+    """Listens on `host` and `port` for HTTP/2 connections, see the module documentation.
+
+    `connections` and `streams` count what clients opened, e.g. to check that they multiplex their requests.
+    """
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 0, tls: TlsConfig | None = None) -> None:
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.connections = 0
+        self.streams = 0
+        self._server: asyncio.Server | None = None
+        self._transports: set[asyncio.Transport] = set()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.host}:{self.port}>"
+
+    async def start(self, recorder: 'HttpRequestRecorder') -> tuple[str, int]:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            raise RuntimeError(f"{self} needs the h2 package, e.g. `pip install h2`") from None
+
+        ssl_context = await self.tls.server_context(alpn_protocols=('h2',)) if self.tls is not None else None
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.create_server((self.host, self.port), family=family, backlog=128)
+        self._server = await asyncio.get_running_loop().create_server(lambda: _Http2Connection(recorder, self), sock=sock, ssl=ssl_context)
+
+        host, port = sock.getsockname()[:2]
+        return host, port
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for transport in list(self._transports):
+            transport.close()
+        await self._server.wait_closed()
+        self._server = None
+
+
+class _Http2Connection(asyncio.Protocol):
+    def __init__(self, recorder: 'HttpRequestRecorder', listener: Http2Listener) -> None:
+        import h2.config
+        import h2.connection
+
+        self._recorder = recorder
+        self._listener = listener
+        self._connection = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False, header_encoding='utf-8'))
+        self._transport: asyncio.Transport | None = None
+        self._remote: str | None = None
+        # headers and body of requests until their stream ends
+        self._requests: dict[int, tuple[list[tuple[str, str]], bytearray]] = {}
+        self._flow_control: dict[int, asyncio.Event] = {}
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def connection_made(self, transport: asyncio.BaseTransport) -> None:
+        assert isinstance(transport, asyncio.Transport)
+        self._transport = transport
+        self._listener._transports.add(transport)
+        peer = transport.get_extra_info('peername')
+        self._remote = peer[0] if peer else None
+        self._listener.connections += 1
+        self._connection.initiate_connection()
+        self._flush()
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        if self._transport is not None:
+            self._listener._transports.discard(self._transport)
+        self._transport = None
+        for waiting in self._flow_control.values():
+            waiting.set()
+
+    def data_received(self, data: bytes) -> None:
+        import h2.events
+        import h2.exceptions
+
+        try:
+            events = self._connection.receive_data(data)
+        except h2.exceptions.ProtocolError:
+            self._flush()
+            if self._transport is not None:
+                self._transport.close()
+            return
+
+        for event in events:
+            if isinstance(event, h2.events.RequestReceived):
+                self._requests[event.stream_id] = ([(str(name), str(value)) for name, value in event.headers or []], bytearray())
+                self._listener.streams += 1
+            elif isinstance(event, h2.events.DataReceived):
+                if event.stream_id in self._requests and event.data is not None:
+                    self._requests[event.stream_id][1].extend(event.data)
+                self._connection.acknowledge_received_data(event.flow_controlled_length or 0, event.stream_id)
+            elif isinstance(event, h2.events.StreamEnded):
+                headers, body = self._requests.pop(event.stream_id, ([], bytearray()))
+                task = asyncio.get_running_loop().create_task(self._respond(event.stream_id, headers, bytes(body)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+            elif isinstance(event, h2.events.StreamReset):
+                self._requests.pop(event.stream_id, None)
+                self._resume(event.stream_id)
+            elif isinstance(event, h2.events.WindowUpdated):
+                self._resume(event.stream_id)
+            elif isinstance(event, h2.events.ConnectionTerminated):
+                if self._transport is not None:
+                    self._transport.close()
+        self._flush()
+
+    def _flush(self) -> None:
+        data = self._connection.data_to_send()
+        if data and self._transport is not None:
+            self._transport.write(data)
+
+    def _resume(self, stream_id: int | None) -> None:
+        # a window update of stream 0 opens the window of the whole connection
+        for waiting_stream, waiting in self._flow_control.items():
+            if not stream_id or waiting_stream == stream_id:
+                waiting.set()
+
+    async def _respond(self, stream_id: int, headers: list[tuple[str, str]], body: bytes) -> None:
+        from .http_request_recorder import RecordedRequest
+
+        pseudo_headers = {name: value for name, value in headers if name.startswith(':')}
+        url = URL(pseudo_headers.get(':path', '/'), encoded=True)
+        recorded_request = RecordedRequest()
+        recorded_request.stored_body = self._recorder._body_storage.store(body)
+        recorded_request.method = pseudo_headers.get(':method', 'GET')
+        recorded_request.path = url.path
+        recorded_request.query_string = url.query_string
+        request_headers = [(name, value) for name, value in headers if not name.startswith(':')]
+        if ':authority' in pseudo_headers:
+            request_headers.insert(0, ('Host', pseudo_headers[':authority']))
+        recorded_request.headers = request_headers
+        recorded_request.version = _HTTP_2
+        recorded_request.remote = self._remote
+
+        response_headers: list[tuple[str, str]]
+        try:
+            dispatched = await self._recorder._dispatch(recorded_request)
+            if dispatched is None:
+                status, response_headers, response_body = 404, [], b''
+            else:
+                status, response_headers, response_body = await _materialize(dispatched[1])
+        except Exception:
+            self._recorder._logger.exception(f"{self._recorder} failed to respond to {recorded_request}")
+            status, response_headers, response_body = 500, [], b''
+
+        await self._send(stream_id, status, response_headers, b'' if recorded_request.method == 'HEAD' else response_body, len(response_body))
+
+    async def _send(self, stream_id: int, status: int, headers: list[tuple[str, str]], body: bytes, content_length: int) -> None:
+        import h2.exceptions
+
+        response_headers: list[tuple[str, Any]] = [(':status', str(status)), ('content-length', str(content_length))]
+        response_headers += [(name.lower(), value) for name, value in headers if name.lower() not in _CONNECTION_HEADERS]
+        try:
+            self._connection.send_headers(stream_id, response_headers, end_stream=not body)
+            self._flush()
+            while body:
+                window = min(self._connection.local_flow_control_window(stream_id), self._connection.max_outbound_frame_size)
+                if window <= 0:
+                    await self._wait_for_window(stream_id)
+                    continue
+                chunk, body = body[:window], body[window:]
+                self._connection.send_data(stream_id, chunk, end_stream=not body)
+                self._flush()
+        except (h2.exceptions.StreamClosedError, h2.exceptions.ProtocolError):
+            # the client reset the stream or went away
+            return
+
+    async def _wait_for_window(self, stream_id: int) -> None:
+        if self._transport is None:
+            import h2.exceptions
+            raise h2.exceptions.StreamClosedError(stream_id)
+        waiting = self._flow_control[stream_id] = asyncio.Event()
+        try:
+            await waiting.wait()
+        finally:
+            del self._flow_control[stream_id]
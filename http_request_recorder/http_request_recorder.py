@@ -1,217 +1,971 @@
 import asyncio
 import contextlib
+import json
 import re
 from asyncio import Event
-from itertools import tee
-from logging import getLogger
+from logging import INFO, WARNING, getLogger
+from os import PathLike
 from typing import Iterable, Any
-from collections.abc import Callable
-
-from aiohttp import web
+from collections.abc import AsyncIterable, AsyncIterator, Awaitable, Callable, Iterator, Mapping, Sized
+from inspect import isawaitable
+from itertools import repeat
+from time import perf_counter
+from urllib.parse import parse_qsl
+from xml.etree import ElementTree
+
+from aiohttp import HttpVersion, web
 from aiohttp.web_request import BaseRequest
-
-ResponsesType = str | bytes | web.Response
+from multidict import CIMultiDict, CIMultiDictProxy, MultiDict, MultiDictProxy
+
+from . import matchers
+from ._dispatch import DispatchKey, ExpectationIndex
+from .body_storage import BodyStoragePolicy, RecordedBody
+from .capture import CaptureLog
+from .control_plane import ControlPlane
+from .diagnostics import NearMiss, NearMissIndex
+from .faults import FaultProfile
+from .history import HistoryLimits, RequestHistory
+from .http2 import Http2Listener
+from .listeners import AddressType, ListenerType, TcpListener, base_url
+from .metrics import METRICS_PATH, RecorderMetrics
+from .proxy import Upstream
+from .responses import StreamedResponse
+from .rpc import INVALID_REQUEST, METHOD_NOT_FOUND, PARSE_ERROR, RpcError, RpcProtocol, is_json_rpc_call, json_rpc_response, xml_rpc_response
+from .streams import OverflowPolicy, RequestStream
+from .tls import TlsConfig
+
+ResponsesType = str | bytes | web.StreamResponse | StreamedResponse | PathLike[str]
+
+# keeps infinite expectations nobody waits on from growing without bound, see `HistoryLimits` to change it -
+# expectations with a known number of responses are bounded by it
+DEFAULT_EXPECTATION_HISTORY = HistoryLimits(max_count=10_000)
+# RPC endpoints record every call in the history of the call's expectation, they keep none of their own
+_NO_HISTORY = HistoryLimits(max_count=0)
+
+# how much of a request body is searched for RPC method names when logging
+_LOG_SCAN_LIMIT = 4096
+# unexpected requests explained in the log when exiting, all are available through diagnose_unexpected_requests()
+_EXPLAINED_ON_EXIT = 20
+_XML_RPC_METHOD = re.compile(b"<methodName>.*?</methodName>")
+_JSON_RPC_METHOD = re.compile(b'"method":".*?"')
+
+_DEFAULT_BODY_STORAGE = BodyStoragePolicy()
+_EMPTY_BODY = RecordedBody()
+_NO_HEADERS: CIMultiDictProxy[str] = CIMultiDictProxy(CIMultiDict())
 
 
 class RecordedRequest:
+    """A request as the recorder received it.
+
+    Headers are kept as received, including repeated ones, in `raw_headers`. Parsed views of the request -
+    `headers` as a dict, `query`, `json()`, `form()`, `xml()` and `rpc_method()` - are computed on first use
+    and shared by all matchers looking at this request.
+    """
+
+    __slots__ = ('stored_body', 'method', 'path', 'query_string', 'version', 'remote', '_raw_headers', '_headers', '_parsed')
+
     def __init__(self) -> None:
-        self.body: bytes = b''
+        self.stored_body: RecordedBody = _EMPTY_BODY
         self.method: str = ""
         self.path: str = ""
-        self.headers: dict[str, str] = dict()
+        self.query_string: str = ""
+        self.version: HttpVersion | None = None
+        self.remote: str | None = None
+
+        self._raw_headers: CIMultiDictProxy[str] = _NO_HEADERS
+        self._headers: dict[str, str] | None = None
+        self._parsed: dict[str, Any] | None = None
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.method} {self.path} {self.stored_body.size} bytes>"
+
+    @property
+    def body(self) -> bytes:
+        """The whole body, read from the temporary file for large bodies - see `stored_body` for lazy access."""
+        return bytes(self.stored_body)
+
+    @body.setter
+    def body(self, body: bytes) -> None:
+        self.stored_body = RecordedBody(body)
+
+    @property
+    def raw_headers(self) -> CIMultiDictProxy[str]:
+        """All headers as received, case-insensitive and including repeated ones."""
+        return self._raw_headers
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """The headers as a plain dict - of repeated headers, only the first value is kept."""
+        if self._headers is None:
+            self._headers = dict(self._raw_headers)
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers: Mapping[str, str] | Iterable[tuple[str, str]]) -> None:
+        self._raw_headers = CIMultiDictProxy(CIMultiDict(headers))
+        self._headers = None
+
+    @property
+    def query(self) -> MultiDictProxy[str]:
+        """The query parameters, including repeated ones."""
+        return self._memoized('query', lambda: MultiDictProxy(MultiDict(parse_qsl(self.query_string, keep_blank_values=True))))  # type: ignore[no-any-return]
+
+    def json(self) -> Any:
+        """The body parsed as JSON. Raises `ValueError` if it isn't JSON or was not retained."""
+        parsed = self._json_body()
+        if parsed is matchers._MISSING:
+            raise ValueError(f"the body of {self} is not JSON")
+        return parsed
+
+    def form(self) -> MultiDictProxy[str]:
+        """The body parsed as `application/x-www-form-urlencoded`, empty if it can't be."""
+        def parse() -> MultiDictProxy[str]:
+            try:
+                fields = parse_qsl(self.body.decode(), keep_blank_values=True) if self.stored_body.is_retained else []
+            except UnicodeDecodeError:
+                fields = []
+            return MultiDictProxy(MultiDict(fields))
+        return self._memoized('form', parse)  # type: ignore[no-any-return]
+
+    def xml(self) -> ElementTree.Element | None:
+        """The root element of the body parsed as XML, None if it isn't XML or was not retained."""
+        def parse() -> ElementTree.Element | None:
+            try:
+                return ElementTree.fromstring(self.body) if self.stored_body.is_retained else None
+            except ElementTree.ParseError:
+                return None
+        return self._memoized('xml', parse)  # type: ignore[no-any-return]
+
+    def rpc_method(self) -> str | None:
+        """The method called by an XML-RPC or JSON-RPC request, None for anything else."""
+        def parse() -> str | None:
+            json_body = self._json_body()
+            if isinstance(json_body, dict):
+                method = json_body.get('method')
+                return method if isinstance(method, str) else None
+            if json_body is not matchers._MISSING:
+                return None
+            root = self.xml()
+            if root is not None and root.tag == 'methodCall':
+                return root.findtext('methodName')
+            return None
+        return self._memoized('rpc_method', parse)  # type: ignore[no-any-return]
+
+    def _json_body(self) -> Any:
+        def parse() -> Any:
+            try:
+                return json.loads(self.body) if self.stored_body.is_retained else matchers._MISSING
+            except ValueError:
+                return matchers._MISSING
+        return self._memoized('json', parse)
+
+    def _memoized(self, key: str, compute: Callable[[], Any]) -> Any:
+        parsed = self._memoized_views()
+        if key in parsed:
+            return parsed[key]
+        value = parsed[key] = compute()
+        return value
+
+    def metadata_only(self, header_names: Iterable[str]) -> "RecordedRequest":
+        """A copy keeping method, path, query, the given headers and only size and digest of the body."""
+        reduced = RecordedRequest()
+        reduced.stored_body = RecordedBody.from_digest(self.stored_body.size, self.stored_body.sha256)
+        reduced.method = self.method
+        reduced.path = self.path
+        reduced.query_string = self.query_string
+        reduced.version = self.version
+        reduced.remote = self.remote
+        wanted = {name.lower() for name in header_names}
+        reduced.headers = [(name, value) for name, value in self._raw_headers.items() if name.lower() in wanted]
+        return reduced
+
+    def _with_method(self, method: str) -> "RecordedRequest":
+        """A copy with another method, sharing body, headers and parsed views."""
+        copy = RecordedRequest()
+        copy.stored_body = self.stored_body
+        copy.method = method
+        copy.path = self.path
+        copy.query_string = self.query_string
+        copy.version = self.version
+        copy.remote = self.remote
+        copy._raw_headers = self._raw_headers
+        copy._headers = self._headers
+        copy._parsed = self._memoized_views()
+        return copy
+
+    def _memoized_views(self) -> dict[str, Any]:
+        if self._parsed is None:
+            self._parsed = {}
+        return self._parsed
+
+    def _for_call(self, call: Any) -> "RecordedRequest":
+        """A copy with one call of a JSON-RPC batch as its body, which is already parsed."""
+        single = RecordedRequest()
+        single.body = json.dumps(call).encode()
+        single.method = self.method
+        single.path = self.path
+        single.query_string = self.query_string
+        single.version = self.version
+        single.remote = self.remote
+        single._raw_headers = self._raw_headers
+        single._parsed = {'json': call}
+        return single
 
     @staticmethod
-    async def from_base_request(request: BaseRequest) -> "RecordedRequest":
+    async def from_base_request(request: BaseRequest, body_storage: BodyStoragePolicy | None = None) -> "RecordedRequest":
         recorded_request = RecordedRequest()
 
-        recorded_request.body = await request.read()
+        recorded_request.stored_body = await (body_storage or _DEFAULT_BODY_STORAGE).read(request)
         recorded_request.method = request.method
         recorded_request.path = request.path
-        recorded_request.headers = dict(request.headers)
+        # the headers aiohttp parsed are immutable, so they are kept instead of copied
+        recorded_request._raw_headers = request.headers
+        recorded_request.query_string = request.query_string
+        recorded_request.version = request.version
+        recorded_request.remote = request.remote
 
         return recorded_request
 
 
+MatcherType = matchers.Matcher | Callable[[RecordedRequest], bool]
+# computes the response from the request, possibly asynchronously
+DynamicResponseType = Callable[[RecordedRequest], ResponsesType | Awaitable[ResponsesType]]
+ResponseSourceType = (ResponsesType | DynamicResponseType
+                      | Iterable[ResponsesType | DynamicResponseType] | AsyncIterable[ResponsesType | DynamicResponseType])
+
+
+class _Signal:
+    """Wakes up everyone currently waiting on it whenever it is fired - one primitive for any number of waiters.
+    Each expectation has its own, so a request only wakes up those waiting for that expectation."""
+
+    def __init__(self) -> None:
+        self._event = Event()
+        self.waiters = 0
+
+    def fire(self) -> None:
+        if self.waiters:
+            self._event.set()
+            self._event = Event()
+
+    async def wait(self) -> None:
+        self.waiters += 1
+        try:
+            await self._event.wait()
+        finally:
+            self.waiters -= 1
+
+
+class _NoResponsesLeft(Exception):
+    pass
+
+
+_NOTHING: Any = object()
+
+
 class ExpectedInteraction:
-    class SingleRequest:
-        def __init__(self, response: ResponsesType) -> None:
-            self.request: bytes | None = None
-            self.was_triggered = Event()
-            self.response: ResponsesType = response
+    """State of one expectation: which responses are left, how many requests were recorded and returned by `wait()`.
 
-    def __init__(self, matcher: Callable[[RecordedRequest], bool], responses: ResponsesType | Iterable[ResponsesType], name: str | None, timeout: int) -> None:
-        self.name: str | None = name
-        self._timeout: int = timeout
-        self.responses: Iterable[ExpectedInteraction.SingleRequest]
+    Responses are pulled from their source one at a time, so an infinite source does not pile up anything here -
+    recorded requests are only kept in the `history`. For sources of unknown length it is bounded by
+    `DEFAULT_EXPECTATION_HISTORY` unless the recorder was given other `HistoryLimits`; a known number of responses
+    already bounds it, and `wait()` still has to return all of those requests.
+    """
+
+    __slots__ = ('name', 'expected_count', 'history', 'head_history', 'faults', '_timeout', '_matcher', '_declared', '_signal',
+                 '_responses', '_async_responses', '_async_lock', '_next_response', '_recorded_count', '_returned_count')
 
-        self.expected_count = None  # None: use infinitely
-        if isinstance(responses, (str, bytes, web.Response)):
-            self.responses = (ExpectedInteraction.SingleRequest(responses),)
+    def __init__(self, matcher: Callable[[RecordedRequest], bool], responses: ResponseSourceType, name: str | None, timeout: float,
+                 history: HistoryLimits | None = None, faults: FaultProfile | None = None) -> None:
+        self.name: str | None = name
+        self.faults: FaultProfile | None = faults
+        self._timeout: float = timeout
+        self._responses: Iterator[ResponsesType | DynamicResponseType] | None = None
+        self._async_responses: AsyncIterator[ResponsesType | DynamicResponseType] | None = None
+        self._async_lock: asyncio.Lock | None = None
+        # sync sources are read one response ahead to know whether they are exhausted
+        self._next_response: ResponsesType | DynamicResponseType = _NOTHING
+
+        self.expected_count: int | None = None  # None: use infinitely, or until the source is exhausted
+        if isinstance(responses, (str, bytes, web.StreamResponse, StreamedResponse, PathLike)):
+            self._responses = iter((responses,))
             self.expected_count = 1
+        elif callable(responses):
+            self._responses = repeat(responses)
+        elif isinstance(responses, AsyncIterable):
+            self._async_responses = aiter(responses)
+            self._async_lock = asyncio.Lock()
         elif isinstance(responses, Iterable):
             # Mypy thinks `responses` can be an int here - maybe because bytes is almost Iterable[int]
-            self.responses = (ExpectedInteraction.SingleRequest(chr(r)) if isinstance(
-                r, int) else ExpectedInteraction.SingleRequest(r) for r in responses)
-            if hasattr(responses, "__len__"):
-                self.expected_count = sum(1 for _ in responses)
+            self._responses = (chr(r) if isinstance(r, int) else r for r in responses)
+            if isinstance(responses, Sized):
+                self.expected_count = len(responses)
         else:
             raise TypeError(
-                "responses must be str | bytes | web.Response | Iterable[str] | Iterable[bytes] | Iterable[web.Response]")
-
-        self._recorded: list[ExpectedInteraction.SingleRequest] = []
-        self._next_for_response, self._next_to_return = tee(self.responses)
+                "responses must be str | bytes | web.StreamResponse | StreamedResponse | PathLike | Callable[[RecordedRequest], ...] or an (async) iterable of these")
+
+        self._recorded_count = 0
+        self._returned_count = 0
+        self._signal = _Signal()
+        self.history = RequestHistory(history or (DEFAULT_EXPECTATION_HISTORY if self.expected_count is None else None))
+        # HEAD requests answered like GET by this expectation, they use up no response and are not returned by `wait()`
+        self.head_history = RequestHistory(history or DEFAULT_EXPECTATION_HISTORY)
         self._matcher: Callable[[RecordedRequest], bool] = matcher
+        # the declarative matcher `_matcher` was compiled from, to explain near misses
+        self._declared: matchers.Matcher | None = None
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} '{self.name}'>"
 
-    def record_once(self, request_body: bytes) -> ResponsesType:
-        for_response = next(self._next_for_response)
-        for_response.request = request_body
-        for_response.was_triggered.set()
-        self._recorded.append(for_response)
-        return for_response.response
+    async def record_once(self, request: RecordedRequest) -> ResponsesType:
+        response: ResponsesType | DynamicResponseType
+        if self._async_responses is not None and self._async_lock is not None:
+            # an async generator must not be advanced concurrently - requests get their responses in arrival order
+            async with self._async_lock:
+                if not await self._has_next_async_response():
+                    raise _NoResponsesLeft()
+                response, self._next_response = self._next_response, _NOTHING
+                self._record(request)
+        else:
+            if not self._has_next_response():
+                raise _NoResponsesLeft()
+            response, self._next_response = self._next_response, _NOTHING
+            self._record(request)
+            self._has_next_response()
+
+        if not callable(response):
+            return response
+        # computed outside of the lock, other requests to this expectation are not held up by slow responses
+        computed = response(request)
+        if isawaitable(computed):
+            return await computed
+        return computed
+
+    async def _respond_to_head(self, request: RecordedRequest) -> ResponsesType | None:
+        """Records a HEAD request falling back to this expectation for GET in `head_history` and returns the next response,
+        without using it up. A computed response is computed for the HEAD request as well, to send its status and headers.
+        None if no responses are left."""
+        if self._async_responses is not None and self._async_lock is not None:
+            async with self._async_lock:
+                if not await self._has_next_async_response():
+                    return None
+        elif not self._has_next_response():
+            return None
+        self.head_history.append(request)
+
+        response = self._next_response
+        if callable(response):
+            computed = response(request)
+            return await computed if isawaitable(computed) else computed
+        # a web.StreamResponse can only be sent once, the GET request gets the original
+        if isinstance(response, web.Response):
+            return web.Response(status=response.status, reason=response.reason, headers=response.headers, body=response.body)
+        if isinstance(response, web.StreamResponse):
+            return web.StreamResponse(status=response.status, reason=response.reason, headers=response.headers)
+        return response
+
+    def _record(self, request: RecordedRequest) -> None:
+        self._recorded_count += 1
+        self.history.append(request)
+        self._signal.fire()
+
+    async def _has_next_async_response(self) -> bool:
+        """Like `_has_next_response()` for async sources, only to be called holding `_async_lock`."""
+        assert self._async_responses is not None
+        if self._next_response is _NOTHING:
+            try:
+                self._next_response = await anext(self._async_responses)
+            except StopAsyncIteration:
+                self.expected_count = self._recorded_count
+                return False
+        return True
+
+    def _has_next_response(self) -> bool:
+        if self._responses is None:
+            return self.expected_count is None
+        if self._next_response is _NOTHING:
+            try:
+                self._next_response = next(self._responses)
+            except StopIteration:
+                self._responses = None
+                self.expected_count = self._recorded_count
+                return False
+        return True
 
     def is_still_expecting_requests(self) -> bool:
         if self.expected_count is None:
             return False
-        return len(self._recorded) < self.expected_count
+        return self._recorded_count < self.expected_count
 
-    def can_respond(self, request: RecordedRequest) -> bool:
+    def is_exhausted(self) -> bool:
         if self.expected_count is None:
-            will_respond = True
-        else:
-            will_respond = len(self._recorded) < self.expected_count
+            return False
+        return self._recorded_count >= self.expected_count
 
-        return self._matcher(request) and will_respond
+    def can_respond(self, request: RecordedRequest) -> bool:
+        return self._matcher(request) and self._has_next_response()
 
     async def wait(self) -> bytes:
-        to_return = next(self._next_to_return)
+        return (await self.wait_for_request()).body
+
+    async def wait_for_request(self) -> RecordedRequest:
+        """Like `wait()`, but returns the whole `RecordedRequest` instead of only its body."""
+        index = self._take_to_return(1)[0]
 
         # suppress (not very helpful) stack of asyncio errors that get raised on timeout
         with contextlib.suppress(asyncio.TimeoutError):
-            await asyncio.wait_for(to_return.was_triggered.wait(), self._timeout)
-        if not to_return.was_triggered.is_set():
+            await asyncio.wait_for(self._wait_until_recorded(index), self._timeout)
+        if self._recorded_count <= index:
             # the above wait_for() timed out, raise a useful Exception:
             raise TimeoutError(f"{self} timed out waiting for a request")
 
-        if to_return.request is None:
-            raise LookupError("expected request body to be set")
+        return self._recorded_at(index)
+
+    async def _wait_until_recorded(self, index: int) -> None:
+        while self._recorded_count <= index:
+            await self._signal.wait()
+
+    def _recorded_at(self, index: int) -> RecordedRequest:
+        position = index - self.history.evicted
+        if position < 0:
+            raise LookupError(f"request #{index} to {self} was evicted from its history")
+        return self.history[position]
+
+    def _take_to_return(self, count: int) -> range:
+        """Advances the cursor of `wait()` by `count` requests."""
+        taken = self._to_return(count)
+        self._returned_count = taken.stop
+        return taken
+
+    def _to_return(self, count: int) -> range:
+        """The next `count` requests to return, without advancing the cursor of `wait()`."""
+        if self.expected_count is not None and self._returned_count + count > self.expected_count:
+            raise ValueError(f"{self} will only ever respond to {self.expected_count} requests")
+        return range(self._returned_count, self._returned_count + count)
 
-        return to_return.request
+    def _mark_returned(self, returned: range) -> None:
+        self._returned_count = max(self._returned_count, returned.stop)
+
+    def _remaining_count(self) -> int:
+        """Requests not yet returned by `wait()`, 0 if this is responding infinitely."""
+        if self.expected_count is None:
+            return 0
+        return self.expected_count - self._returned_count
+
+
+class _RpcEndpoint:
+    """Answers the RPC calls to one path. Calls are parsed once per request and dispatched by their method name,
+    a JSON-RPC batch is answered with one response per call (notifications are not answered)."""
+
+    def __init__(self, recorder: 'HttpRequestRecorder', protocol: RpcProtocol) -> None:
+        self.protocol = protocol
+        self._recorder = recorder
+        self._by_method: dict[str, list[ExpectedInteraction]] = {}
+        self.expectation: ExpectedInteraction | None = None
+
+    def add(self, method: str, expectation: ExpectedInteraction) -> None:
+        self._by_method.setdefault(method, []).append(expectation)
+
+    async def respond(self, request: RecordedRequest) -> web.Response:
+        if self.protocol == 'xml-rpc':
+            return web.Response(body=xml_rpc_response(await self._call(request, request.rpc_method())), content_type='text/xml')
+
+        body = request._json_body()
+        if body is matchers._MISSING:
+            self._recorder._handle_unexpected(request)
+            return self._json_response(json_rpc_response(None, RpcError(PARSE_ERROR, "Parse error")))
+        if isinstance(body, list) and body:
+            answers = await asyncio.gather(*(self._answer(request._for_call(call), call) for call in body))
+            answered = [answer for answer in answers if answer is not None]
+            return self._json_response(b'[' + b','.join(answered) + b']') if answered else web.Response(status=204)
+        answer = await self._answer(request, body)
+        return self._json_response(answer) if answer is not None else web.Response(status=204)
+
+    @staticmethod
+    def _json_response(body: bytes) -> web.Response:
+        return web.Response(body=body, content_type='application/json')
+
+    async def _answer(self, request: RecordedRequest, call: Any) -> bytes | None:
+        if not is_json_rpc_call(call):
+            self._recorder._handle_unexpected(request)
+            return json_rpc_response(None, RpcError(INVALID_REQUEST, "Invalid Request"))
+        result = await self._call(request, call['method'])
+        # calls without an id are notifications, which get no response
+        return json_rpc_response(call['id'], result) if 'id' in call else None
+
+    async def _call(self, request: RecordedRequest, method: str | None) -> Any:
+        candidates = self._by_method.get(method, []) if method is not None else []
+        matches = [expectation for expectation in candidates if expectation.can_respond(request)]
+        if len(matches) > 1:
+            raise Exception(f"{self._recorder} got an RPC call that would match multiple expectations: {matches}")
+
+        if matches:
+            expectation = matches[0]
+            result: Any
+            try:
+                result = await expectation.record_once(request)
+            except RpcError as error:
+                result = error
+            except _NoResponsesLeft:
+                # only known for async response sources once they are asked for another response
+                result = _NOTHING
+            if (result is _NOTHING or expectation.is_exhausted()) and expectation in candidates:
+                candidates.remove(expectation)
+            if result is not _NOTHING:
+                return result
+
+        self._recorder._handle_unexpected(request)
+        return RpcError(METHOD_NOT_FOUND, f"Method not found: {method}")
 
 
 class HttpRequestRecorder:
-    def __init__(self, name: str, port: int) -> None:
+    def __init__(self, name: str, port: int = 0, body_storage: BodyStoragePolicy | None = None, history: HistoryLimits | None = None,
+                 faults: FaultProfile | None = None, host: str = '0.0.0.0', listeners: Iterable[ListenerType] = (),
+                 capture: CaptureLog | None = None, metrics: RecorderMetrics | None = None, control_plane: bool = False,
+                 upstream: Upstream | str | None = None, tls: TlsConfig | None = None) -> None:
+        """With `port=0`, a free port is chosen - see `port` and `base_url` once the recorder is entered.
+        Further `listeners` (ports, IPv6 hosts, Unix domain sockets) are served alongside `host` and `port`.
+        All requests and responses are appended to `capture` while the recorder is entered.
+        Where time is spent handling requests is collected in `metrics`, if given.
+        With `control_plane`, expectations can be registered and awaited over HTTP - see `control_plane.py`.
+        Requests no expectation matches are forwarded to `upstream` instead of being answered with 404 - see `proxy.py`.
+        With `tls`, HTTPS is served on `host` and `port` - see `tls.py`, and `http2.py` for HTTP/2 listeners."""
         self._logger = getLogger("recorder")
 
         self._name = name
+        self._host = host
         self._port = port
+        self._listeners: list[ListenerType] = list(listeners)
+        self.addresses: list[AddressType] = []
+        self._body_storage = body_storage or BodyStoragePolicy()
+        self._history_limits = history
+        self._faults = faults
+        self._capture = capture
+        self.tls = tls
 
         self._expectations: list[ExpectedInteraction] = []
-        self._unexpected_requests: list[RecordedRequest] = []
-
-        app = web.Application()
-
-        app.add_routes([web.get('/{tail:.*}', self.handle_request)])
-        app.add_routes([web.post('/{tail:.*}', self.handle_request)])
-        app.add_routes([web.put('/{tail:.*}', self.handle_request)])
-        app.add_routes([web.delete('/{tail:.*}', self.handle_request)])
-        app.add_routes([web.options('/{tail:.*}', self.handle_request)])
-
-        self.runner = web.AppRunner(app)
+        self._index: ExpectationIndex[ExpectedInteraction] = ExpectationIndex()
+        self.unexpected_request_history = RequestHistory(history)
+        self._streams: list[RequestStream] = []
+        self._rpc_endpoints: dict[str, _RpcEndpoint] = {}
+        # expectations of the deprecated expect_json_rpc() and expect_xml_rpc() by their (lower case) path
+        self._legacy_rpc_expectations: dict[str, list[ExpectedInteraction]] = {}
+        self._near_miss_index = NearMissIndex()
+
+        self.metrics = metrics
+        self.control_plane = ControlPlane(self) if control_plane else None
+        self.upstream = Upstream(upstream) if isinstance(upstream, str) else upstream
+        if metrics is not None:
+            metrics.gauges.update(pending_waiters=lambda: sum(expectation._signal.waiters for expectation in self._expectations), retained_bytes=self._retained_bytes,
+                                  active_expectations=lambda: len(self._index))
+
+        # the server is only set up when entering the recorder - creating one is cheap
+        self.runner: web.AppRunner | None = None
 
     def __repr__(self) -> str:
         return f"<{self.__class__.__name__} '{self._name}' on :{self._port}>"
 
     async def __aenter__(self) -> "HttpRequestRecorder":
+        app = web.Application()
+
+        if self.metrics is not None and self.metrics.endpoint:
+            # before the catch-all routes, which would take it otherwise
+            app.add_routes([web.get(METRICS_PATH, self._serve_metrics)])
+        if self.control_plane is not None:
+            app.add_routes(self.control_plane.routes())
+        # one route for all methods, including extension methods - expectations are filtered by method in the index
+        app.add_routes([web.route('*', '/{tail:.*}', self.handle_request)])
+
+        self.runner = web.AppRunner(app)
         await self.runner.setup()
-        site = web.TCPSite(self.runner, '0.0.0.0', self._port)
-        await site.start()
+        bound_host, self._port = await TcpListener(self._host, self._port, tls=self.tls).start(self.runner)
+        self.addresses.append((bound_host, self._port))
+        for listener in self._listeners:
+            # HTTP/2 is not served by aiohttp, but by the listener itself
+            self.addresses.append(await (listener.start(self) if isinstance(listener, Http2Listener) else listener.start(self.runner)))
+        if self._capture is not None:
+            self._capture.open()
+        if self.upstream is not None:
+            await self.upstream.open()
 
         return self
 
-    async def __aexit__(self, *args: tuple[Any], **kwargs: dict[str, Any]) -> None:
-        if len(self.unsatisfied_expectations()) > 0:
-            self._logger.warning(
-                f"{self} is exiting but there are unsatisfied Expectations: {self.unsatisfied_expectations()}")
-
-        await self.runner.cleanup()
+    @property
+    def port(self) -> int:
+        """The port actually bound, if the recorder was created with `port=0`."""
+        return self._port
 
-    async def handle_request(self, request: BaseRequest) -> web.Response:
-        request_body = await request.read()
-        self._logger.info(f"{self} got {await self._request_string_for_log(request)}")
+    @property
+    def base_url(self) -> str:
+        """e.g. `http://localhost:8080`, without trailing slash"""
+        return base_url(self._host, self._port, 'https' if self.tls is not None else 'http')
 
-        recorded_request = await RecordedRequest.from_base_request(request)
+    async def __aexit__(self, *args: tuple[Any], **kwargs: dict[str, Any]) -> None:
+        self._wind_down()
+
+        for listener in self._listeners:
+            if isinstance(listener, Http2Listener):
+                await listener.stop()
+        if self.runner is not None:
+            await self.runner.cleanup()
+        if self.upstream is not None:
+            await self.upstream.close()
+        await self._close_capture()
+
+    def _wind_down(self) -> None:
+        """What every recorder does when exiting, however it is served - subclasses call it from their `__aexit__`."""
+        self._warn_about_unsatisfied_expectations()
+        self._explain_unexpected_requests()
+        self._end_streams()
+
+    async def _close_capture(self) -> None:
+        if self._capture is not None:
+            await asyncio.get_running_loop().run_in_executor(None, self._capture.close)
+
+    def _end_streams(self) -> None:
+        for stream in self._streams:
+            stream._end()
+        self._streams.clear()
+
+    def _warn_about_unsatisfied_expectations(self) -> None:
+        unsatisfied_expectations = self.unsatisfied_expectations()
+        if len(unsatisfied_expectations) > 0:
+            self._logger.warning(
+                f"{self} is exiting but there are unsatisfied Expectations: {unsatisfied_expectations}")
+
+    def _explain_unexpected_requests(self) -> None:
+        if len(self.unexpected_request_history) == 0 or not self._logger.isEnabledFor(WARNING):
+            return
+        unexpected = self.unexpected_requests()
+        # ranking every request against every expectation takes long, only those that are logged are diagnosed
+        lines = [f"{self._request_string_for_log(request)}: " + (" | ".join(str(near_miss) for near_miss in self.near_misses(request)) or "no expectations")
+                 for request in unexpected[:_EXPLAINED_ON_EXIT]]
+        if len(unexpected) > _EXPLAINED_ON_EXIT:
+            lines.append(f"... and {len(unexpected) - _EXPLAINED_ON_EXIT} more")
+        self._logger.warning(f"{self} is exiting after unexpected requests, the nearest expectations were:\n  " + "\n  ".join(lines))
+
+    async def handle_request(self, request: BaseRequest) -> web.StreamResponse:
+        metrics = self.metrics
+        started = perf_counter() if metrics is not None else 0.0
+        recorded_request = await RecordedRequest.from_base_request(request, self._body_storage)
+        if metrics is not None:
+            metrics.body_read_seconds.observe(perf_counter() - started)
+
+        dispatched = await self._dispatch(recorded_request)
+        if dispatched is None:
+            if self.upstream is not None:
+                return await self._forward(request, recorded_request)
+            return web.Response(status=404)
 
-        matches = [exp for exp in self._expectations if exp.can_respond(
-            recorded_request)]
+        expectation, response = dispatched
+        faults = expectation.faults or self._faults
+        started = perf_counter() if metrics is not None else 0.0
+        if faults is not None:
+            rendered = await faults.respond(request, response, self._render)
+        else:
+            rendered = await self._render(request, response)
+        if metrics is not None:
+            # responses that are not written by the handler itself are written after this and not included
+            metrics.response_write_seconds.observe(perf_counter() - started)
+        return rendered
+
+    async def _dispatch(self, recorded_request: RecordedRequest) -> tuple[ExpectedInteraction, ResponsesType] | None:
+        """Records the request with the expectation it matches and returns the response to send, None if it is unexpected."""
+        dispatched = await self._match(recorded_request)
+        if self._streams:
+            # delivered before responding, so blocking streams slow down the client instead of buffering
+            for stream in list(self._streams):
+                await stream._deliver(recorded_request)
+        return dispatched
+
+    async def _match(self, recorded_request: RecordedRequest) -> tuple[ExpectedInteraction, ResponsesType] | None:
+        metrics = self.metrics
+        if metrics is not None:
+            metrics.requests += 1
+        if self._logger.isEnabledFor(INFO):
+            started = perf_counter() if metrics is not None else 0.0
+            self._logger.info(f"{self} got {self._request_string_for_log(recorded_request)}")
+            if metrics is not None:
+                metrics.logging_seconds.observe(perf_counter() - started)
+
+        matches = self._matches(recorded_request.method, recorded_request)
+        if not matches and recorded_request.method == 'HEAD':
+            matches = self._matches('GET', recorded_request._with_method('GET'))
+            if len(matches) == 1:
+                # answered like GET without using up its response or being recorded as one of its requests,
+                # the body is left out when responding
+                head_response = await matches[0]._respond_to_head(recorded_request)
+                if head_response is None:
+                    self._handle_unmatched(recorded_request)
+                    return None
+                if self._capture is not None:
+                    self._capture.append(recorded_request, head_response)
+                return matches[0], head_response
         if len(matches) == 0:
-            self._logger.warning(f"{self} got unexpected {await self._request_string_for_log(request)}")
-            self._unexpected_requests.append(recorded_request)
-            return web.Response(status=404)
+            self._handle_unmatched(recorded_request)
+            return None
 
         if len(matches) > 1:
             error = f"{self} got a request that would match multiple expectations: {matches}"
             raise Exception(error)
 
         expectation_to_use = matches[0]
-        response = expectation_to_use.record_once(request_body)
+        try:
+            response = await expectation_to_use.record_once(recorded_request)
+        except _NoResponsesLeft:
+            # only known for async response sources once they are asked for another response
+            self._index.remove(expectation_to_use)
+            self._handle_unmatched(recorded_request)
+            return None
+        if expectation_to_use.is_exhausted():
+            self._index.remove(expectation_to_use)
+
+        if self._capture is not None:
+            self._capture.append(recorded_request, response)
+        return expectation_to_use, response
+
+    def _matches(self, method: str, recorded_request: RecordedRequest) -> list[ExpectedInteraction]:
+        candidates = self._index.candidates(method, recorded_request.path)
+        if self.metrics is None:
+            return [exp for exp in candidates if exp.can_respond(recorded_request)]
+        return self.metrics.match(candidates, recorded_request)
 
-        if isinstance(response, web.Response):
+    @staticmethod
+    async def _render(request: BaseRequest, response: ResponsesType) -> web.StreamResponse:
+        if isinstance(response, web.StreamResponse):
             return response
+        if isinstance(response, StreamedResponse):
+            if request.method == 'HEAD':
+                # the chunks are not even produced
+                head = response.prepare_response()
+                await head.prepare(request)
+                await head.write_eof()
+                return head
+            return await response.write_to(request)
+        if isinstance(response, PathLike):
+            # served with sendfile where possible, the file is never read into memory
+            return web.FileResponse(response)
 
         return web.Response(status=200, body=response)
 
-    def expect(self, matcher: Callable[[RecordedRequest], bool], responses: ResponsesType | Iterable[ResponsesType] = "", name: str | None = None, timeout: int = 3) -> ExpectedInteraction:
-        expectation = ExpectedInteraction(matcher, responses, name, timeout)
-        self._expectations.append(expectation)
+    async def _forward(self, request: BaseRequest, recorded_request: RecordedRequest) -> web.StreamResponse:
+        assert self.upstream is not None
+        response, exchange = await self.upstream._exchange(request, recorded_request)
+        if self._capture is not None and exchange is not None:
+            self._capture.append(recorded_request, web.Response(status=exchange.status, headers=exchange.headers,
+                                                                body=bytes(exchange.body) if exchange.body.is_retained else None))
+        return response
+
+    def _handle_unmatched(self, recorded_request: RecordedRequest) -> None:
+        if self.upstream is None:
+            self._handle_unexpected(recorded_request)
+            return
+        # not unexpected, the upstream answers it
+        if self._logger.isEnabledFor(INFO):
+            self._logger.info(f"{self} forwards {self._request_string_for_log(recorded_request)} to {self.upstream}")
+        if self.metrics is not None:
+            self.metrics.forwarded_requests += 1
+
+    def _handle_unexpected(self, recorded_request: RecordedRequest) -> None:
+        if self._logger.isEnabledFor(WARNING):
+            self._logger.warning(f"{self} got unexpected {self._request_string_for_log(recorded_request)}")
+        self.unexpected_request_history.append(recorded_request)
+        if self.metrics is not None:
+            self.metrics.unexpected_requests += 1
+        if self._capture is not None:
+            self._capture.append(recorded_request, None, expected=False)
+
+    def expect(self, matcher: MatcherType, responses: ResponseSourceType = "", name: str | None = None, timeout: float = 3,
+               faults: FaultProfile | None = None) -> ExpectedInteraction:
+        """`matcher` is either a declarative `matchers.Matcher` (which can be indexed) or any callable on the `RecordedRequest`."""
+        if isinstance(matcher, matchers.Matcher):
+            expectation = ExpectedInteraction(matcher.compile(), responses, name if name is not None else repr(matcher), timeout, self._history_limits, faults)
+            expectation._declared = matcher
+            self._register(expectation, matcher.dispatch_key())
+        else:
+            expectation = ExpectedInteraction(matcher, responses, name, timeout, self._history_limits, faults)
+            self._register(expectation)
         return expectation
 
-    def expect_path(self, path: str, responses: ResponsesType | Iterable[ResponsesType] = "", timeout: int = 3) -> ExpectedInteraction:
-        return self.expect(lambda request: path == request.path, responses, name=path, timeout=timeout)
+    def expect_path(self, path: str, responses: ResponseSourceType = "", timeout: float = 3, method: str | None = None,
+                    faults: FaultProfile | None = None) -> ExpectedInteraction:
+        if method is None:
+            return self.expect(matchers.path(path), responses, name=path, timeout=timeout, faults=faults)
+        return self.expect(matchers.path(path) & matchers.method(method), responses, name=f"{method.upper()} {path}", timeout=timeout, faults=faults)
+
+    def expect_json_rpc_call(self, method: str, result: Any = None, path: str = '/jsonrpc', repeat: bool = False,
+                             name: str | None = None, timeout: float = 3) -> ExpectedInteraction:
+        """Answers a JSON-RPC 2.0 call of `method` to `path` with `result`, wrapped in a response object with the id of the call.
+
+        `result` is any JSON value, an `RpcError`, or a (sync or async) callable computing either from the `RecordedRequest`
+        of the call - it may also raise `RpcError`. With `repeat`, every call of `method` is answered, otherwise only one.
+        Batches are answered call by call; calls of methods nobody expects get a "Method not found" error.
+        """
+        return self._expect_rpc_call('json-rpc', method, result, path, repeat, name or f"JsonRpc: {method}", timeout)
+
+    def expect_xml_rpc_call(self, method: str, result: Any = None, path: str = '/RPC2', repeat: bool = False,
+                            name: str | None = None, timeout: float = 3) -> ExpectedInteraction:
+        """Like `expect_json_rpc_call()`, for XML-RPC: `result` is sent as the only parameter of a `methodResponse`,
+        an `RpcError` as fault."""
+        return self._expect_rpc_call('xml-rpc', method, result, path, repeat, name or f"XmlRpc: {method}", timeout)
+
+    def _expect_rpc_call(self, protocol: RpcProtocol, method: str, result: Any, path: str, repeat_result: bool, name: str,
+                         timeout: float) -> ExpectedInteraction:
+        endpoint = self._rpc_endpoints.get(path)
+        if endpoint is None:
+            if any(not legacy.is_exhausted() for legacy in self._legacy_rpc_expectations.get(path.lower(), ())):
+                raise ValueError(f"{path} has expectations of the deprecated expect_{protocol.replace('-', '_')}(), "
+                                 f"they can't be mixed with expect_{protocol.replace('-', '_')}_call()")
+            # one expectation for the whole path, the calls are dispatched by the endpoint
+            endpoint = self._rpc_endpoints[path] = _RpcEndpoint(self, protocol)
+            endpoint_matcher = matchers.path(path) & matchers.method('POST')
+            endpoint.expectation = ExpectedInteraction(endpoint_matcher.compile(), endpoint.respond, f"{protocol} endpoint {path}", 3, _NO_HISTORY)
+            endpoint.expectation._declared = endpoint_matcher
+            self._register(endpoint.expectation, endpoint_matcher.dispatch_key())
+        elif endpoint.protocol != protocol:
+            raise ValueError(f"{path} already answers {endpoint.protocol} calls")
+
+        def answer(request: RecordedRequest) -> Any:
+            return result
+        compute = result if callable(result) else answer
+
+        expectation = ExpectedInteraction(lambda request: True, repeat(compute) if repeat_result else (compute,), name, timeout,
+                                          self._history_limits)
+        # only used to explain near misses, the endpoint dispatches by method name
+        expectation._declared = matchers.path(path) & matchers.method('POST') & matchers.rpc_method(method)
+        self._expectations.append(expectation)
+        endpoint.add(method, expectation)
+        return expectation
 
-    # deprecated - use custom matcher through expect() instead
-    def expect_xml_rpc(self, method_name: bytes, responses: ResponsesType | Iterable[ResponsesType] = "", timeout: int = 3) -> ExpectedInteraction:
-        self._logger.warning("expect_xml_rpc() is deprecated and will be removed in a future release")
+    # deprecated - use expect_xml_rpc_call() instead
+    def expect_xml_rpc(self, method_name: bytes, responses: ResponseSourceType = "", timeout: int = 3) -> ExpectedInteraction:
+        self._logger.warning("expect_xml_rpc() is deprecated and will be removed in a future release, use expect_xml_rpc_call()")
 
         def matcher(request: RecordedRequest) -> bool:
             return "/rpc2" == request.path.lower() and b'<methodName>' + method_name + b'</methodName>' in request.body
-        return self.expect(matcher,
-                           responses=responses,
-                           name=f"XmlRpc: {method_name.decode('UTF-8')}",
-                           timeout=timeout)
+        return self._expect_legacy_rpc('xml-rpc', '/rpc2', matcher, responses, f"XmlRpc: {method_name.decode('UTF-8')}", timeout)
 
-    # deprecated - use custom matcher through expect() instead
-    def expect_json_rpc(self, method_name: bytes, responses: ResponsesType | Iterable[ResponsesType] = "", timeout: int = 3) -> ExpectedInteraction:
-        self._logger.warning("expect_json_rpc() is deprecated and will be removed in a future release")
+    # deprecated - use expect_json_rpc_call() instead
+    def expect_json_rpc(self, method_name: bytes, responses: ResponseSourceType = "", timeout: int = 3) -> ExpectedInteraction:
+        self._logger.warning("expect_json_rpc() is deprecated and will be removed in a future release, use expect_json_rpc_call()")
 
         def matcher(request: RecordedRequest) -> bool:
             return "/jsonrpc" == request.path.lower() and re.search(b'"method":\s*"' + method_name + b'"', request.body) is not None
-        return self.expect(matcher,
-                           responses=responses,
-                           name=f"JsonRpc: {method_name.decode('UTF-8')}",
-                           timeout=timeout)
+        return self._expect_legacy_rpc('json-rpc', '/jsonrpc', matcher, responses, f"JsonRpc: {method_name.decode('UTF-8')}", timeout)
+
+    def _expect_legacy_rpc(self, protocol: RpcProtocol, path: str, matcher: Callable[[RecordedRequest], bool], responses: ResponseSourceType,
+                           name: str, timeout: float) -> ExpectedInteraction:
+        # an endpoint would answer the same requests, which then match two expectations
+        if any(endpoint_path.lower() == path for endpoint_path in self._rpc_endpoints):
+            raise ValueError(f"{path} already answers {protocol} calls of expect_{protocol.replace('-', '_')}_call(), "
+                             f"the deprecated expect_{protocol.replace('-', '_')}() can't be used for it as well")
+        expectation = self.expect(matcher, responses=responses, name=name, timeout=timeout)
+        self._legacy_rpc_expectations.setdefault(path, []).append(expectation)
+        return expectation
+
+    async def wait_for(self, *expectations: ExpectedInteraction, count: int | None = None, timeout: float | None = None) -> dict[ExpectedInteraction, list[bytes]]:
+        """Waits for the next `count` requests of each expectation, by default all requests not yet returned by `wait()`.
+
+        All expectations share a single deadline, by default the longest of their timeouts. If any requests are missing
+        once it is reached, a single `TimeoutError` lists all of them and none of the requests count as returned.
+        """
+        recorded = await self._wait_for_requests(expectations, count, timeout)
+        return {expectation: [request.body for request in requests] for expectation, requests in recorded.items()}
+
+    async def _wait_for_requests(self, expectations: Iterable[ExpectedInteraction], count: int | None, timeout: float | None) -> dict[ExpectedInteraction, list[RecordedRequest]]:
+        expectations = list(expectations)
+        if timeout is None:
+            timeout = max((expectation._timeout for expectation in expectations), default=0)
+
+        # the cursors of `wait()` are only advanced once all requests arrived, a timed out wait can be retried
+        to_return = {expectation: expectation._to_return(expectation._remaining_count() if count is None else count)
+                     for expectation in expectations}
+
+        # all are needed, so waiting for one expectation after the other takes no longer than waiting for any of them
+        with contextlib.suppress(TimeoutError):
+            async with asyncio.timeout(timeout):
+                for expectation, indices in to_return.items():
+                    if indices:
+                        await expectation._wait_until_recorded(indices[-1])
+
+        missing = {expectation: missing_count for expectation, indices in to_return.items()
+                   if (missing_count := sum(1 for index in indices if index >= expectation._recorded_count)) > 0}
+        if missing:
+            details = ", ".join(f"{expectation} ({missing_count} of {len(to_return[expectation])} requests missing)"
+                                for expectation, missing_count in missing.items())
+            raise TimeoutError(f"{self} timed out waiting for {details}")
+
+        recorded = {expectation: [expectation._recorded_at(index) for index in indices]
+                    for expectation, indices in to_return.items()}
+        for expectation, indices in to_return.items():
+            expectation._mark_returned(indices)
+        return recorded
+
+    async def wait_for_all(self, timeout: float | None = None) -> dict[ExpectedInteraction, list[bytes]]:
+        """Waits for all requests of all expectations with a limited number of responses, see `wait_for()`."""
+        return await self.wait_for(*(expectation for expectation in self._expectations if expectation.expected_count is not None), timeout=timeout)
+
+    def stream(self, matcher: MatcherType | None = None, maxsize: int = 1000, overflow: OverflowPolicy = 'block') -> RequestStream:
+        """Subscribes to all requests (or those matching `matcher`), expected or not, as they arrive:
+
+            async with recorder.stream(matchers.path_prefix('/events'), maxsize=100, overflow='drop_oldest') as requests:
+                async for request in requests:
+                    ...
+
+        Each subscriber has its own queue of at most `maxsize` requests, see `RequestStream` for the `overflow` policies.
+        """
+        predicate = matcher.compile() if isinstance(matcher, matchers.Matcher) else matcher
+        subscription = RequestStream(predicate, maxsize, overflow, self._unsubscribe)
+        self._streams.append(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: RequestStream) -> None:
+        if subscription in self._streams:
+            self._streams.remove(subscription)
 
     def unsatisfied_expectations(self) -> list[ExpectedInteraction]:
         """Usage in unittest: `self.assertListEqual([], a_recorder.unsatisfied_expectations())`"""
         return [exp for exp in self._expectations if exp.is_still_expecting_requests()]
 
     def unexpected_requests(self) -> list[RecordedRequest]:
-        """Usage in unittest: `self.assertListEqual([], a_recorder._unexpected_requests())`"""
-        return self._unexpected_requests
+        """Usage in unittest: `self.assertListEqual([], a_recorder._unexpected_requests())`
+
+        Only the window retained by the recorder's `HistoryLimits` is returned."""
+        return self.unexpected_request_history.to_list()
+
+    def near_misses(self, request: RecordedRequest, limit: int = 3) -> list[NearMiss]:
+        """The `limit` expectations coming closest to matching `request`, with the predicates it failed.
+        Computed on demand, see `http_request_recorder.diagnostics`."""
+        endpoints = [endpoint.expectation for endpoint in self._rpc_endpoints.values()]
+        return self._near_miss_index.near_misses(request, [exp for exp in self._expectations if exp not in endpoints], limit)
+
+    def diagnose_unexpected_requests(self, limit: int = 3) -> list[tuple[RecordedRequest, list[NearMiss]]]:
+        """`near_misses()` of each retained unexpected request."""
+        return [(request, self.near_misses(request, limit)) for request in self.unexpected_requests()]
+
+    def _retained_bytes(self) -> int:
+        return self.unexpected_request_history.retained_bytes + sum(expectation.history.retained_bytes + expectation.head_history.retained_bytes
+                                                                    for expectation in self._expectations)
+
+    async def _serve_metrics(self, request: BaseRequest) -> web.Response:
+        assert self.metrics is not None
+        return web.Response(text=self.metrics.to_prometheus(), content_type='text/plain', charset='utf-8',
+                            headers={'Cache-Control': 'no-store'})
+
+    def _register(self, expectation: ExpectedInteraction, key: DispatchKey = DispatchKey()) -> None:
+        self._expectations.append(expectation)
+        self._index.add(expectation, key)
 
     @staticmethod
-    async def _request_string_for_log(request: BaseRequest) -> str:
-        request_body = await request.read()
+    def _request_string_for_log(request: RecordedRequest) -> str:
+        # only the start of the body is searched, uploads can be arbitrarily large
+        body_start = request.stored_body.head(_LOG_SCAN_LIMIT)
 
-        xml_rpc_method = re.search(
-            b"<methodName>.*?</methodName>", request_body)
+        xml_rpc_method = _XML_RPC_METHOD.search(body_start)
         if xml_rpc_method is not None:
-            return f"{request.method} - XmlRpc - {xml_rpc_method.group(0).decode('UTF-8')}"
+            return f"{request.method} - XmlRpc - {xml_rpc_method.group(0).decode('UTF-8', errors='replace')}"
 
-        json_rpc_method = re.search(b'"method":".*?"', request_body)
+        json_rpc_method = _JSON_RPC_METHOD.search(body_start)
         if json_rpc_method is not None:
-            return f"{request.method} - jsonRpc - {json_rpc_method.group(0).decode('UTF-8')}"
+            return f"{request.method} - jsonRpc - {json_rpc_method.group(0).decode('UTF-8', errors='replace')}"
 
-        return f"{request.method} to '{request.path}' with body {request_body[:10]!r}"
+        return f"{request.method} to '{request.path}' with body {body_start[:10]!r}"
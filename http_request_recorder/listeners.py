@@ -0,0 +1,60 @@
+import socket
+from typing import TYPE_CHECKING, Union
+
+from aiohttp import web
+
+from .tls import TlsConfig
+
+if TYPE_CHECKING:
+    from .http2 import Http2Listener
+
+AddressType = tuple[str, int] | str
+
+
+class TcpListener:
+    """Listens on `host` and `port`. Port 0 binds a free ephemeral port, IPv6 hosts like `::` are supported.
+    With `tls`, HTTPS is served instead of plain HTTP."""
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 0, reuse_port: bool = False, tls: TlsConfig | None = None) -> None:
+        self.host = host
+        self.port = port
+        self.reuse_port = reuse_port
+        self.tls = tls
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.host}:{self.port}>"
+
+    async def start(self, runner: web.BaseRunner) -> tuple[str, int]:
+        ssl_context = await self.tls.server_context() if self.tls is not None else None
+        # binding ourselves instead of using a TCPSite gives away the port that was actually bound
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.create_server((self.host, self.port), family=family, backlog=128, reuse_port=self.reuse_port)
+        await web.SockSite(runner, sock, ssl_context=ssl_context).start()
+
+        host, port = sock.getsockname()[:2]
+        return host, port
+
+
+class UnixListener:
+    """Listens on a Unix domain socket at `path`."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.path}>"
+
+    async def start(self, runner: web.BaseRunner) -> str:
+        await web.UnixSite(runner, self.path).start()
+        return self.path
+
+
+ListenerType = Union[TcpListener, UnixListener, 'Http2Listener']
+
+
+def base_url(host: str, port: int, scheme: str = 'http') -> str:
+    if host in ('', '0.0.0.0', '::'):
+        host = 'localhost'
+    elif ':' in host:
+        host = f'[{host}]'
+    return f"{scheme}://{host}:{port}"
@@ -0,0 +1,395 @@
+"""Declarative request matchers.
+
+Matchers describe what an expected request looks like and can be combined with `&`, `|` and `~`:
+
+    from http_request_recorder import matchers as m
+
+    recorder.expect(m.path('/users') & m.method('POST') & m.json_field('name', 'alice'))
+
+Unlike plain callables, the recorder can look into them: they are compiled once into a single predicate
+and requests are only checked against matchers whose path and method could fit at all.
+"""
+import abc
+import re
+from collections.abc import Callable
+from fnmatch import translate
+from typing import TYPE_CHECKING, Any
+
+from ._dispatch import DispatchKey
+
+if TYPE_CHECKING:
+    from .http_request_recorder import RecordedRequest
+
+Predicate = Callable[['RecordedRequest'], bool]
+
+_MISSING: Any = object()
+
+
+class Matcher(abc.ABC):
+    """Base class of all declarative matchers."""
+
+    _compiled: Predicate | None = None
+
+    @abc.abstractmethod
+    def compile(self) -> Predicate:
+        """The predicate checking requests, created once on first use."""
+
+    def dispatch_key(self) -> DispatchKey:
+        return DispatchKey()
+
+    def explain(self, request: 'RecordedRequest') -> list['Matcher']:
+        """The predicates of this matcher `request` does not satisfy, empty if it matches."""
+        return [] if self(request) else [self]
+
+    def predicate_count(self) -> int:
+        """How many predicates `explain()` can report at most."""
+        return 1
+
+    def __call__(self, request: 'RecordedRequest') -> bool:
+        if self._compiled is None:
+            self._compiled = self.compile()
+        return self._compiled(request)
+
+    def __and__(self, other: 'Matcher') -> 'Matcher':
+        return AllOf(self, other)
+
+    def __or__(self, other: 'Matcher') -> 'Matcher':
+        return AnyOf(self, other)
+
+    def __invert__(self) -> 'Matcher':
+        return Not(self)
+
+
+class AllOf(Matcher):
+    def __init__(self, *matchers: Matcher) -> None:
+        # flatten `a & b & c` so the compiled predicate is a single loop
+        self.matchers: tuple[Matcher, ...] = tuple(
+            child for matcher in matchers for child in (matcher.matchers if isinstance(matcher, AllOf) else (matcher,)))
+
+    def __repr__(self) -> str:
+        return '(' + ' & '.join(repr(matcher) for matcher in self.matchers) + ')'
+
+    def compile(self) -> Predicate:
+        predicates = tuple(matcher.compile() for matcher in self.matchers)
+
+        def predicate(request: 'RecordedRequest') -> bool:
+            for child in predicates:
+                if not child(request):
+                    return False
+            return True
+        return predicate
+
+    def dispatch_key(self) -> DispatchKey:
+        path, path_prefix, methods = None, None, None
+        for key in (matcher.dispatch_key() for matcher in self.matchers):
+            path = path if path is not None else key.path
+            path_prefix = path_prefix if path_prefix is not None else key.path_prefix
+            if key.methods is not None:
+                methods = key.methods if methods is None else methods & key.methods
+        return DispatchKey(path, path_prefix, methods)
+
+    def explain(self, request: 'RecordedRequest') -> list[Matcher]:
+        return [failed for matcher in self.matchers for failed in matcher.explain(request)]
+
+    def predicate_count(self) -> int:
+        return sum(matcher.predicate_count() for matcher in self.matchers)
+
+
+class AnyOf(Matcher):
+    def __init__(self, *matchers: Matcher) -> None:
+        self.matchers: tuple[Matcher, ...] = tuple(
+            child for matcher in matchers for child in (matcher.matchers if isinstance(matcher, AnyOf) else (matcher,)))
+
+    def __repr__(self) -> str:
+        return '(' + ' | '.join(repr(matcher) for matcher in self.matchers) + ')'
+
+    def compile(self) -> Predicate:
+        predicates = tuple(matcher.compile() for matcher in self.matchers)
+
+        def predicate(request: 'RecordedRequest') -> bool:
+            for child in predicates:
+                if child(request):
+                    return True
+            return False
+        return predicate
+
+    def dispatch_key(self) -> DispatchKey:
+        # only the methods can be narrowed down safely: the union of all alternatives
+        methods: frozenset[str] = frozenset()
+        for key in (matcher.dispatch_key() for matcher in self.matchers):
+            if key.methods is None:
+                return DispatchKey()
+            methods |= key.methods
+        return DispatchKey(methods=methods)
+
+
+class Not(Matcher):
+    def __init__(self, matcher: Matcher) -> None:
+        self.matcher = matcher
+
+    def __repr__(self) -> str:
+        return f'~{self.matcher!r}'
+
+    def compile(self) -> Predicate:
+        child = self.matcher.compile()
+        return lambda request: not child(request)
+
+
+class PathEquals(Matcher):
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def __repr__(self) -> str:
+        return f'path == {self.path!r}'
+
+    def compile(self) -> Predicate:
+        expected = self.path
+        return lambda request: request.path == expected
+
+    def dispatch_key(self) -> DispatchKey:
+        return DispatchKey(path=self.path)
+
+
+class PathPrefix(Matcher):
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix
+
+    def __repr__(self) -> str:
+        return f'path starts with {self.prefix!r}'
+
+    def compile(self) -> Predicate:
+        prefix = self.prefix
+        return lambda request: request.path.startswith(prefix)
+
+    def dispatch_key(self) -> DispatchKey:
+        return DispatchKey(path_prefix=self.prefix)
+
+
+class PathRegex(Matcher):
+    def __init__(self, pattern: str | re.Pattern[str], description: str | None = None, literal_prefix: str | None = None) -> None:
+        self.pattern: re.Pattern[str] = re.compile(pattern)
+        self._description = description or f'path matches {self.pattern.pattern!r}'
+        self._literal_prefix = literal_prefix if literal_prefix is not None else _regex_literal_prefix(self.pattern)
+
+    def __repr__(self) -> str:
+        return self._description
+
+    def compile(self) -> Predicate:
+        fullmatch = self.pattern.fullmatch
+        return lambda request: fullmatch(request.path) is not None
+
+    def dispatch_key(self) -> DispatchKey:
+        # a literal start of the pattern narrows down the candidates just like a prefix
+        return DispatchKey(path_prefix=self._literal_prefix) if self._literal_prefix else DispatchKey()
+
+
+def _regex_literal_prefix(compiled: re.Pattern[str]) -> str:
+    # a prefix compared case-sensitively would skip requests an ignore-case pattern matches
+    if '|' in compiled.pattern or compiled.flags & (re.IGNORECASE | re.VERBOSE):
+        return ''
+    pattern = compiled.pattern.removeprefix('^')
+    literal = re.match(r'[^.^$*+?{}\[\]\\|()]*', pattern)
+    prefix = literal.group(0) if literal is not None else ''
+    # in `/ab?` or `/ab*` the quantifier makes the last literal character optional
+    if pattern[len(prefix):len(prefix) + 1] in ('*', '?', '{'):
+        prefix = prefix[:-1]
+    return prefix
+
+
+class Method(Matcher):
+    def __init__(self, *methods: str) -> None:
+        self.methods = frozenset(method.upper() for method in methods)
+
+    def __repr__(self) -> str:
+        return f'method in {sorted(self.methods)}'
+
+    def compile(self) -> Predicate:
+        methods = self.methods
+        return lambda request: request.method in methods
+
+    def dispatch_key(self) -> DispatchKey:
+        return DispatchKey(methods=self.methods)
+
+
+class RpcMethod(Matcher):
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f'rpc method == {self.name!r}'
+
+    def compile(self) -> Predicate:
+        name = self.name
+        return lambda request: request.rpc_method() == name
+
+
+def _value_check(value: str | re.Pattern[str] | None) -> Callable[[str | None], bool]:
+    if value is None:
+        return lambda actual: actual is not None
+    if isinstance(value, re.Pattern):
+        fullmatch = value.fullmatch
+        return lambda actual: actual is not None and fullmatch(actual) is not None
+    return lambda actual: actual == value
+
+
+class Header(Matcher):
+    def __init__(self, name: str, value: str | re.Pattern[str] | None = None) -> None:
+        self.name = name
+        self.value = value
+
+    def __repr__(self) -> str:
+        if self.value is None:
+            return f'header {self.name!r} present'
+        return f'header {self.name!r} == {self.value!r}'
+
+    def compile(self) -> Predicate:
+        name = self.name
+        check = _value_check(self.value)
+        # repeated headers match if any of their values does
+        return lambda request: any(check(actual) for actual in request.raw_headers.getall(name, [None]))
+
+
+class QueryParam(Matcher):
+    def __init__(self, name: str, value: str | re.Pattern[str] | None = None) -> None:
+        self.name = name
+        self.value = value
+
+    def __repr__(self) -> str:
+        if self.value is None:
+            return f'query {self.name!r} present'
+        return f'query {self.name!r} == {self.value!r}'
+
+    def compile(self) -> Predicate:
+        name = self.name
+        check = _value_check(self.value)
+        return lambda request: any(check(actual) for actual in request.query.getall(name, [None]))
+
+
+class BodySha256(Matcher):
+    def __init__(self, digest: str) -> None:
+        self.digest = digest.lower()
+
+    def __repr__(self) -> str:
+        return f'body sha256 {self.digest[:12]}...'
+
+    def compile(self) -> Predicate:
+        digest = self.digest
+        return lambda request: request.stored_body.sha256 == digest
+
+
+class JsonField(Matcher):
+    def __init__(self, field: str, value: Any = _MISSING) -> None:
+        self.field = field
+        self.value = value
+        self._steps: tuple[str | int, ...] = tuple(int(step) if step.isdigit() else step for step in field.split('.')) if field else ()
+
+    def __repr__(self) -> str:
+        if self.value is _MISSING:
+            return f'json {self.field!r} present'
+        return f'json {self.field!r} == {self.value!r}'
+
+    def compile(self) -> Predicate:
+        steps, expected = self._steps, self.value
+
+        def predicate(request: 'RecordedRequest') -> bool:
+            current = request._json_body()
+            for step in steps:
+                if isinstance(step, int) and isinstance(current, list):
+                    if step >= len(current):
+                        return False
+                    current = current[step]
+                elif isinstance(current, dict) and str(step) in current:
+                    current = current[str(step)]
+                else:
+                    return False
+            return current is not _MISSING and (expected is _MISSING or current == expected)
+        return predicate
+
+
+class XmlField(Matcher):
+    def __init__(self, path: str, value: str | re.Pattern[str] | None = None) -> None:
+        self.path = path
+        self.value = value
+
+        # ElementTree only evaluates paths relative to an element, so `/root/child` is split up
+        self._root_tag: str | None = None
+        self._relative_path = path
+        if path.startswith('/') and not path.startswith('//'):
+            self._root_tag, _, self._relative_path = path[1:].partition('/')
+        elif path.startswith('//'):
+            self._relative_path = '.' + path
+
+    def __repr__(self) -> str:
+        if self.value is None:
+            return f'xml {self.path!r} present'
+        return f'xml {self.path!r} == {self.value!r}'
+
+    def compile(self) -> Predicate:
+        root_tag, relative_path = self._root_tag, self._relative_path
+        check = _value_check(self.value)
+
+        def predicate(request: 'RecordedRequest') -> bool:
+            root = request.xml()
+            if root is None or (root_tag is not None and root.tag != root_tag):
+                return False
+            element = root.find(relative_path) if relative_path else root
+            if element is None:
+                return False
+            return check((element.text or '').strip())
+        return predicate
+
+
+def path(value: str) -> Matcher:
+    """Request path equals `value`."""
+    return PathEquals(value)
+
+
+def path_prefix(prefix: str) -> Matcher:
+    """Request path starts with `prefix`."""
+    return PathPrefix(prefix)
+
+
+def path_regex(pattern: str | re.Pattern[str]) -> Matcher:
+    """Whole request path matches the regular expression."""
+    return PathRegex(pattern)
+
+
+def path_glob(pattern: str) -> Matcher:
+    """Request path matches a shell-style pattern like `/users/*/avatar`."""
+    literal_prefix = re.match(r'[^*?\[]*', pattern)
+    return PathRegex(translate(pattern), description=f'path like {pattern!r}', literal_prefix=literal_prefix.group(0) if literal_prefix else '')
+
+
+def method(*methods: str) -> Matcher:
+    """Request method is one of `methods` (case-insensitive)."""
+    return Method(*methods)
+
+
+def header(name: str, value: str | re.Pattern[str] | None = None) -> Matcher:
+    """Header `name` (case-insensitive) is present and, if given, one of its values equals or fully matches `value`."""
+    return Header(name, value)
+
+
+def query_param(name: str, value: str | re.Pattern[str] | None = None) -> Matcher:
+    """Query parameter `name` is present and, if given, equals or fully matches `value`."""
+    return QueryParam(name, value)
+
+
+def body_sha256(digest: str) -> Matcher:
+    """The SHA-256 of the body equals the hex `digest` - also works for bodies that were not retained."""
+    return BodySha256(digest)
+
+
+def json_field(field: str, value: Any = _MISSING) -> Matcher:
+    """JSON body contains the dotted `field` (e.g. `params.0.id`) and, if given, it equals `value`."""
+    return JsonField(field, value)
+
+
+def xml_field(path: str, value: str | re.Pattern[str] | None = None) -> Matcher:
+    """XML body contains an element at the ElementTree path (e.g. `/methodCall/methodName`, `//name`)."""
+    return XmlField(path, value)
+
+
+def rpc_method(name: str) -> Matcher:
+    """The request is an XML-RPC or JSON-RPC call of method `name`."""
+    return RpcMethod(name)
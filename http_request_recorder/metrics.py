@@ -0,0 +1,180 @@
+"""Counters and histograms of where a recorder spends its time.
+
+Pass a `RecorderMetrics` to a recorder to collect them - without one, nothing is measured at all:
+
+    metrics = RecorderMetrics(endpoint=True)
+    async with HttpRequestRecorder('upstream', metrics=metrics) as recorder:
+        ...
+        print(metrics.snapshot()['matching_seconds'])
+
+With `endpoint=True`, the recorder also serves them in Prometheus text format at `/__recorder/metrics`.
+"""
+from bisect import bisect_left
+from collections.abc import Callable, Iterable
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from .http_request_recorder import ExpectedInteraction, RecordedRequest
+
+METRICS_PATH = '/__recorder/metrics'
+
+# from 10 µs to 10 s - recorder internals are usually at the lower end, response writes of large bodies at the upper
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 10)
+# the series of all expectations beyond `max_expectations`
+OTHER_EXPECTATIONS = 'other'
+
+
+class Histogram:
+    """Counts observations into cumulative buckets, like a Prometheus histogram."""
+
+    __slots__ = ('buckets', 'counts', 'count', 'sum')
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        # one more for observations above the largest bucket
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.count} observations, {self.sum:.6f} total>"
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> list[tuple[float, int]]:
+        """(upper bound, observations up to it) for every bucket, ending with infinity."""
+        total = 0
+        result = []
+        for bound, bucket_count in zip((*self.buckets, float('inf')), self.counts):
+            total += bucket_count
+            result.append((bound, total))
+        return result
+
+
+class RecorderMetrics:
+    """Collects timings and counts of a recorder's request handling.
+
+    - `body_read_seconds`, `matching_seconds`, `logging_seconds`, `response_write_seconds`: time per request in each step
+    - `matcher_seconds` and `match_attempts`: time and number of checks per expectation. Expectations are numbered in the
+      order they are first checked (`#0 name`). Only the first `max_expectations` get a series of their own, the checks
+      of all others are added up in the `other` series, so generated expectations don't add series without bounds.
+    - `requests`, `unexpected_requests` and `forwarded_requests`: handled requests
+    - gauges read from the recorder when exported: pending `wait()` callers and bytes retained in histories
+    """
+
+    def __init__(self, endpoint: bool = False, buckets: Iterable[float] = DEFAULT_BUCKETS, max_expectations: int = 100) -> None:
+        self.endpoint = endpoint
+        self.max_expectations = max_expectations
+        self._buckets = tuple(buckets)
+
+        self.body_read_seconds = Histogram(self._buckets)
+        self.matching_seconds = Histogram(self._buckets)
+        self.logging_seconds = Histogram(self._buckets)
+        self.response_write_seconds = Histogram(self._buckets)
+        self.matcher_seconds: dict[str, Histogram] = {}
+        self.match_attempts: dict[str, int] = {}
+        self._series: dict['ExpectedInteraction', str] = {}
+        self.requests = 0
+        self.unexpected_requests = 0
+        self.forwarded_requests = 0
+
+        # set by the recorder these metrics are passed to
+        self.gauges: dict[str, Callable[[], float]] = {}
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.requests} requests>"
+
+    def match(self, candidates: Iterable['ExpectedInteraction'], request: 'RecordedRequest') -> list['ExpectedInteraction']:
+        """Like checking every candidate with `can_respond()`, but timed per expectation."""
+        matches = []
+        started = perf_counter()
+        for expectation in candidates:
+            checked = perf_counter()
+            if expectation.can_respond(request):
+                matches.append(expectation)
+            name = self._series.get(expectation) or self._add_series(expectation)
+            histogram = self.matcher_seconds.get(name)
+            if histogram is None:
+                histogram = self.matcher_seconds[name] = Histogram(self._buckets)
+            histogram.observe(perf_counter() - checked)
+            self.match_attempts[name] = self.match_attempts.get(name, 0) + 1
+        self.matching_seconds.observe(perf_counter() - started)
+        return matches
+
+    def _add_series(self, expectation: 'ExpectedInteraction') -> str:
+        if len(self._series) >= self.max_expectations:
+            return OTHER_EXPECTATIONS
+        index = len(self._series)
+        series = self._series[expectation] = f'#{index}' if expectation.name is None else f'#{index} {expectation.name}'
+        return series
+
+    def snapshot(self) -> dict[str, Any]:
+        """All values as plain data, e.g. to be dumped as JSON."""
+        def histogram(h: Histogram) -> dict[str, Any]:
+            return {'count': h.count, 'sum': h.sum, 'buckets': [[bound, count] for bound, count in h.cumulative()]}
+
+        return {
+            'requests': self.requests,
+            'unexpected_requests': self.unexpected_requests,
+            'forwarded_requests': self.forwarded_requests,
+            'body_read_seconds': histogram(self.body_read_seconds),
+            'matching_seconds': histogram(self.matching_seconds),
+            'logging_seconds': histogram(self.logging_seconds),
+            'response_write_seconds': histogram(self.response_write_seconds),
+            'matcher_seconds': {name: histogram(h) for name, h in self.matcher_seconds.items()},
+            'match_attempts': dict(self.match_attempts),
+            **{name: gauge() for name, gauge in self.gauges.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        """All values in the Prometheus text exposition format."""
+        lines: list[str] = []
+        _counter(lines, 'recorder_requests_total', 'Requests handled.', self.requests)
+        _counter(lines, 'recorder_unexpected_requests_total', 'Requests that matched no expectation.', self.unexpected_requests)
+        _counter(lines, 'recorder_forwarded_requests_total', 'Requests forwarded to the upstream.', self.forwarded_requests)
+        _histogram(lines, 'recorder_body_read_seconds', 'Time spent reading request bodies.', {'': self.body_read_seconds})
+        _histogram(lines, 'recorder_matching_seconds', 'Time spent finding the expectation of a request.', {'': self.matching_seconds})
+        _histogram(lines, 'recorder_logging_seconds', 'Time spent logging requests.', {'': self.logging_seconds})
+        _histogram(lines, 'recorder_response_write_seconds', 'Time spent writing responses.', {'': self.response_write_seconds})
+        _histogram(lines, 'recorder_matcher_seconds', 'Time spent checking requests against one expectation.',
+                   {_labels(expectation=name): h for name, h in self.matcher_seconds.items()})
+
+        lines.append('# HELP recorder_match_attempts_total Requests checked against one expectation.')
+        lines.append('# TYPE recorder_match_attempts_total counter')
+        lines.extend(f'recorder_match_attempts_total{_labels(expectation=name)} {attempts}' for name, attempts in self.match_attempts.items())
+
+        for name, gauge in self.gauges.items():
+            lines.append(f'# TYPE recorder_{name} gauge')
+            lines.append(f'recorder_{name} {gauge()}')
+        return '\n'.join(lines) + '\n'
+
+
+def _counter(lines: list[str], name: str, description: str, value: int) -> None:
+    lines.append(f'# HELP {name} {description}')
+    lines.append(f'# TYPE {name} counter')
+    lines.append(f'{name} {value}')
+
+
+def _histogram(lines: list[str], name: str, description: str, histograms: dict[str, Histogram]) -> None:
+    lines.append(f'# HELP {name} {description}')
+    lines.append(f'# TYPE {name} histogram')
+    for labels, histogram in histograms.items():
+        # the `le` label is added to the labels of the series
+        prefix = labels[:-1] + ',' if labels else '{'
+        for bound, count in histogram.cumulative():
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            lines.append(f'{name}_bucket{prefix}le="{le}"}} {count}')
+        lines.append(f'{name}_sum{labels} {histogram.sum}')
+        lines.append(f'{name}_count{labels} {histogram.count}')
+
+
+def _labels(**labels: str) -> str:
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
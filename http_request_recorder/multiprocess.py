@@ -0,0 +1,361 @@
+"""A recorder spreading HTTP handling over several processes, for load tests that saturate a single event loop.
+
+Worker processes share the listening port with `SO_REUSEPORT`, so the kernel balances connections between them.
+Workers only parse HTTP: every request is forwarded to the recorder in the test's process, which matches it,
+records it and answers with the response. Expectations, `wait()` and all other state stay in that one process:
+
+    async with MultiProcessHttpRequestRecorder('upstream', port=8080, workers=4) as recorder:
+        recorder.expect_path('/any-path', iter(lambda: 'response', None))
+        ...  # run the load generator
+        print(len(recorder.unexpected_requests()))
+
+Workers store request bodies according to the recorder's `BodyStoragePolicy`: bodies kept in memory are sent along,
+spilled bodies are handed over as temporary files and never pass through the recorder's process. Files are served
+by the workers themselves (with sendfile where possible), the chunks of `StreamedResponse`s are sent on as they are
+produced.
+
+Messages between the processes are pickled in batches - everything sent within one event loop iteration
+goes out as one length-prefixed frame over a Unix domain socket.
+"""
+import asyncio
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import struct
+import tempfile
+from collections.abc import AsyncIterator, Iterable
+from itertools import count
+from multiprocessing.process import BaseProcess
+from os import PathLike
+from pathlib import Path
+from typing import Any, NamedTuple
+
+from aiohttp import HttpVersion, web
+from aiohttp.web_request import BaseRequest
+from multidict import CIMultiDict
+
+from . import faults as faults_module
+from .body_storage import BodyStoragePolicy, RecordedBody, _BodyParts
+from .capture import CaptureLog
+from .faults import FaultProfile
+from .history import HistoryLimits
+from .http_request_recorder import HttpRequestRecorder, RecordedRequest, ResponsesType
+from .listeners import TcpListener
+from .metrics import METRICS_PATH, RecorderMetrics
+from .responses import StreamedResponse, _iterate, _materialize, _streamed_headers
+
+_FRAME_HEADER = struct.Struct('!I')
+
+
+class _FileBody(NamedTuple):
+    """A file the worker serves itself."""
+    path: str
+
+
+class _StreamedBody(NamedTuple):
+    """The body follows as `_Chunk`s."""
+    content_length: int | None
+
+
+class _Chunk(NamedTuple):
+    request_id: int
+    data: bytes | None  # None ends the body
+
+
+# (request id, method, path, query string, headers, body, HTTP version, remote address)
+_RequestMessage = tuple[int, str, str, str, list[tuple[str, str]], _BodyParts, tuple[int, int], str | None]
+# (request id, status, headers, body, fault plan)
+_ResponseMessage = tuple[int, int, list[tuple[str, str]], bytes | _FileBody | _StreamedBody, faults_module._FaultPlan | None]
+
+
+class MultiProcessHttpRequestRecorder(HttpRequestRecorder):
+    """An `HttpRequestRecorder` whose port is served by `workers` processes.
+
+    Responses need to be `str`, `bytes`, `web.Response`, `StreamedResponse` or a `Path` -
+    other `web.StreamResponse`s can't be forwarded to the workers and are answered with 500.
+    """
+
+    def __init__(self, name: str, port: int = 0, workers: int | None = None, body_storage: BodyStoragePolicy | None = None,
+                 history: HistoryLimits | None = None, faults: FaultProfile | None = None, host: str = '0.0.0.0',
+                 start_timeout: float = 10, capture: CaptureLog | None = None, metrics: RecorderMetrics | None = None) -> None:
+        super().__init__(name, port, body_storage=body_storage, history=history, faults=faults, host=host, capture=capture, metrics=metrics)
+        self._worker_count = workers or os.cpu_count() or 1
+        self._start_timeout = start_timeout
+
+        self._reserved_socket: socket.socket | None = None
+        self._ipc_directory: str | None = None
+        self._ipc_server: asyncio.Server | None = None
+        self._processes: list[BaseProcess] = []
+        self._channels: list[_Channel] = []
+        # reading from the workers and handling their requests, cancelled when stopping
+        self._tasks: set[asyncio.Task[None]] = set()
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} '{self._name}' on :{self._port} with {self._worker_count} workers>"
+
+    async def __aenter__(self) -> 'MultiProcessHttpRequestRecorder':
+        try:
+            await self._start()
+        except BaseException:
+            await self._stop()
+            raise
+        return self
+
+    async def __aexit__(self, *args: tuple[Any], **kwargs: dict[str, Any]) -> None:
+        self._wind_down()
+        await self._stop()
+
+    async def _start(self) -> None:
+        # a bound but not listening socket reserves the port (and resolves port 0) without taking any connections
+        family = socket.AF_INET6 if ':' in self._host else socket.AF_INET
+        self._reserved_socket = socket.socket(family, socket.SOCK_STREAM)
+        self._reserved_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self._reserved_socket.bind((self._host, self._port))
+        self._port = self._reserved_socket.getsockname()[1]
+
+        self._ipc_directory = tempfile.mkdtemp(prefix='recorder-')
+        ipc_path = os.path.join(self._ipc_directory, 'ipc.sock')
+        self._ipc_server = await asyncio.start_unix_server(self._serve_worker, ipc_path)
+
+        # spawned instead of forked: forking a process with a running event loop is not safe
+        context = multiprocessing.get_context('spawn')
+        for _ in range(self._worker_count):
+            process = context.Process(target=_run_worker, args=(self._host, self._port, ipc_path, self._body_storage), daemon=True)
+            process.start()
+            self._processes.append(process)
+
+        # workers connect once they listen, so the recorder is usable as soon as all of them are connected
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self._start_timeout
+        while len(self._channels) < self._worker_count:
+            if any(process.exitcode is not None for process in self._processes):
+                raise RuntimeError(f"{self} could not start its worker processes")
+            if loop.time() > deadline:
+                raise TimeoutError(f"{self} timed out starting its worker processes")
+            await asyncio.sleep(0.01)
+
+        self.addresses.append((self._host, self._port))
+        if self._capture is not None:
+            self._capture.open()
+
+    async def _stop(self) -> None:
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # workers exit once their connection is closed
+        for channel in self._channels:
+            channel.close()
+        if self._ipc_server is not None:
+            self._ipc_server.close()
+
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.exitcode is None:
+                process.kill()
+
+        if self._reserved_socket is not None:
+            self._reserved_socket.close()
+        if self._ipc_directory is not None:
+            shutil.rmtree(self._ipc_directory, ignore_errors=True)
+        await self._close_capture()
+
+    async def _serve_worker(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        channel = _Channel(writer)
+        self._channels.append(channel)
+        # read in a task of our own, the one of the server can't be cancelled without asyncio logging an error
+        self._track(asyncio.create_task(self._read_from(reader, channel)))
+
+    async def _read_from(self, reader: asyncio.StreamReader, channel: '_Channel') -> None:
+        while (batch := await _read_batch(reader)) is not None:
+            for message in batch:
+                # handled concurrently, so slow dynamic responses don't hold up the others
+                self._track(asyncio.create_task(self._handle_forwarded(channel, message)))
+
+    def _track(self, task: 'asyncio.Task[None]') -> None:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _handle_forwarded(self, channel: '_Channel', message: _RequestMessage) -> None:
+        request_id, method, path, query_string, headers, body, version, remote = message
+        if self.metrics is not None and self.metrics.endpoint and path == METRICS_PATH and method in ('GET', 'HEAD'):
+            channel.send((request_id, 200, [('Content-Type', 'text/plain; charset=utf-8')], self.metrics.to_prometheus().encode(), None))
+            return
+
+        recorded_request = RecordedRequest()
+        recorded_request.stored_body = RecordedBody._taken_over(body)
+        recorded_request.method = method
+        recorded_request.path = path
+        recorded_request.headers = headers
+        recorded_request.query_string = query_string
+        recorded_request.version = HttpVersion(*version)
+        recorded_request.remote = remote
+
+        try:
+            dispatched = await self._dispatch(recorded_request)
+            if dispatched is None:
+                channel.send((request_id, 404, [], b'', None))
+                return
+
+            expectation, response = dispatched
+            status, response_headers, response_body = await _for_worker(response)
+        except Exception:
+            self._logger.exception(f"{self} failed to respond to {method} {path}")
+            channel.send((request_id, 500, [], b'', None))
+            return
+
+        faults = expectation.faults or self._faults
+        channel.send((request_id, status, response_headers, response_body, faults._plan() if faults is not None else None))
+        if isinstance(response, StreamedResponse):
+            await self._send_chunks(channel, request_id, response, method == 'HEAD')
+
+    async def _send_chunks(self, channel: '_Channel', request_id: int, response: StreamedResponse, head: bool) -> None:
+        try:
+            if not head:
+                chunks = response.chunks() if callable(response.chunks) else response.chunks
+                async for chunk in _iterate(chunks):
+                    if chunk:
+                        channel.send(_Chunk(request_id, chunk))
+                        # a slow worker holds up the producer instead of chunks piling up here
+                        await channel.drain()
+        except Exception:
+            self._logger.exception(f"{self} failed to produce the body of {response}")
+        finally:
+            channel.send(_Chunk(request_id, None))
+
+
+async def _for_worker(response: ResponsesType) -> tuple[int, list[tuple[str, str]], bytes | _FileBody | _StreamedBody]:
+    if isinstance(response, StreamedResponse):
+        return response.status, _streamed_headers(response), _StreamedBody(response.content_length)
+    if isinstance(response, PathLike):
+        return 200, [], _FileBody(os.fspath(response))
+    return await _materialize(response)
+
+
+class _Channel:
+    """Sends messages as length-prefixed, pickled batches - one batch per event loop iteration."""
+
+    def __init__(self, writer: asyncio.StreamWriter) -> None:
+        self._writer = writer
+        self._pending: list[Any] = []
+
+    def send(self, message: Any) -> None:
+        if not self._pending:
+            asyncio.get_running_loop().call_soon(self._flush)
+        self._pending.append(message)
+
+    def _flush(self) -> None:
+        batch, self._pending = self._pending, []
+        if not batch or self._writer.is_closing():
+            return
+        data = pickle.dumps(batch, protocol=pickle.HIGHEST_PROTOCOL)
+        self._writer.writelines((_FRAME_HEADER.pack(len(data)), data))
+
+    async def drain(self) -> None:
+        """Sends what is pending right away and waits until the socket can take more."""
+        self._flush()
+        if not self._writer.is_closing():
+            await self._writer.drain()
+
+    def close(self) -> None:
+        self._writer.close()
+
+
+async def _read_batch(reader: asyncio.StreamReader) -> list[Any] | None:
+    try:
+        header = await reader.readexactly(_FRAME_HEADER.size)
+        batch: list[Any] = pickle.loads(await reader.readexactly(_FRAME_HEADER.unpack(header)[0]))
+        return batch
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+
+
+def _run_worker(host: str, port: int, ipc_path: str, body_storage: BodyStoragePolicy) -> None:
+    asyncio.run(_Worker(host, port, ipc_path, body_storage).run())
+
+
+class _Worker:
+    def __init__(self, host: str, port: int, ipc_path: str, body_storage: BodyStoragePolicy) -> None:
+        self._host = host
+        self._port = port
+        self._ipc_path = ipc_path
+        self._body_storage = body_storage
+        self._request_ids = count()
+        self._pending: dict[int, asyncio.Future[_ResponseMessage]] = {}
+        # chunks of streamed response bodies, until they are written
+        self._streams: dict[int, asyncio.Queue[bytes | None]] = {}
+
+    async def run(self) -> None:
+        app = web.Application()
+        app.add_routes([web.route('*', '/{tail:.*}', self._forward)])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await TcpListener(self._host, self._port, reuse_port=True).start(runner)
+
+        reader, writer = await asyncio.open_unix_connection(self._ipc_path)
+        self._channel = _Channel(writer)
+        try:
+            while (batch := await _read_batch(reader)) is not None:
+                self._resolve(batch)
+        finally:
+            for future in self._pending.values():
+                future.set_exception(ConnectionError("the recorder has exited"))
+            for queue in self._streams.values():
+                queue.put_nowait(None)
+            await runner.cleanup()
+
+    def _resolve(self, batch: Iterable[_ResponseMessage | _Chunk]) -> None:
+        for message in batch:
+            if isinstance(message, _Chunk):
+                queue = self._streams.get(message.request_id)
+                if queue is not None:
+                    queue.put_nowait(message.data)
+                continue
+            future = self._pending.pop(message[0], None)
+            if future is not None and not future.done():
+                if isinstance(message[3], _StreamedBody):
+                    self._streams[message[0]] = asyncio.Queue()
+                future.set_result(message)
+
+    async def _forward(self, request: BaseRequest) -> web.StreamResponse:
+        # streamed without the client_max_size limit, large bodies are spilled to files the recorder takes over
+        body = await self._body_storage.read(request)
+        request_id = next(self._request_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._channel.send((request_id, request.method, request.path, request.query_string, list(request.headers.items()), body._hand_over(),
+                            tuple(request.version), request.remote))
+
+        _, status, headers, response_body, plan = await future
+        response: web.Response | StreamedResponse | Path
+        if isinstance(response_body, _FileBody):
+            response = Path(response_body.path)
+        elif isinstance(response_body, _StreamedBody):
+            response = StreamedResponse(self._received_chunks(request_id), status=status, headers=dict(headers),
+                                        content_length=response_body.content_length)
+        else:
+            response = web.Response(status=status, body=response_body, headers=CIMultiDict(headers))
+
+        try:
+            if plan is not None:
+                return await faults_module._apply(plan, request, response, _render)
+            return await _render(request, response)
+        finally:
+            self._streams.pop(request_id, None)
+
+    async def _received_chunks(self, request_id: int) -> AsyncIterator[bytes]:
+        queue = self._streams[request_id]
+        while (chunk := await queue.get()) is not None:
+            yield chunk
+
+
+async def _render(request: BaseRequest, response: web.Response | StreamedResponse | Path) -> web.StreamResponse:
+    if isinstance(response, StreamedResponse):
+        return await response.write_to(request)
+    if isinstance(response, Path):
+        return web.FileResponse(response)
+    return response
@@ -0,0 +1,118 @@
+"""Forwarding requests that no expectation matches to a real service:
+
+    async with HttpRequestRecorder('gateway', upstream=Upstream('http://localhost:9000')) as recorder:
+        recorder.expect_path('/flaky-endpoint', 'stubbed')  # everything else is answered by the upstream
+
+All forwarded requests share one keep-alive `ClientSession`. Request bodies are sent from where the recorder stored them,
+responses are streamed back to the client chunk by chunk while being recorded.
+"""
+from collections import deque
+from logging import getLogger
+from typing import TYPE_CHECKING, Any, NamedTuple
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, TCPConnector, web
+from aiohttp.web_request import BaseRequest
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from .body_storage import BodyStoragePolicy, RecordedBody, _BodySink
+
+if TYPE_CHECKING:
+    from .http_request_recorder import RecordedRequest
+
+# meaningful for a single connection only, never forwarded (RFC 9110, section 7.6.1)
+_HOP_BY_HOP_HEADERS = frozenset({'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization', 'proxy-connection',
+                                 'te', 'trailer', 'transfer-encoding', 'upgrade'})
+_CHUNK_SIZE = 64 * 1024
+
+
+class ForwardedExchange(NamedTuple):
+    """A request forwarded to the upstream and the response it got."""
+    request: 'RecordedRequest'
+    status: int
+    headers: CIMultiDictProxy[str]
+    body: RecordedBody
+
+
+class Upstream:
+    """The service requests without a matching expectation are forwarded to.
+
+    At most `limit` connections are opened to it and kept alive between requests. Response bodies are recorded
+    according to `body_storage`; the most recent `max_exchanges` exchanges are kept in `exchanges`.
+    Requests the upstream can't answer (connection errors, `timeout` seconds without data) get a 502 response.
+    """
+
+    def __init__(self, url: str, limit: int = 100, timeout: float | None = 30, body_storage: BodyStoragePolicy | None = None,
+                 max_exchanges: int | None = 1000) -> None:
+        self.url = URL(url)
+        self.limit = limit
+        self.timeout = timeout
+        self.exchanges: deque[ForwardedExchange] = deque(maxlen=max_exchanges)
+        self._body_storage = body_storage or BodyStoragePolicy()
+        self._session: ClientSession | None = None
+        self._logger = getLogger("recorder")
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.url}>"
+
+    async def open(self) -> None:
+        if self._session is None:
+            # bodies are passed through as they are, without decompressing them
+            self._session = ClientSession(connector=TCPConnector(limit=self.limit), auto_decompress=False,
+                                          timeout=ClientTimeout(total=None, sock_connect=self.timeout, sock_read=self.timeout))
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def forward(self, request: BaseRequest, recorded_request: 'RecordedRequest') -> web.StreamResponse:
+        response, _ = await self._exchange(request, recorded_request)
+        return response
+
+    async def _exchange(self, request: BaseRequest, recorded_request: 'RecordedRequest') -> tuple[web.StreamResponse, ForwardedExchange | None]:
+        """The response sent to the client and, if the upstream answered completely, the exchange added to `exchanges`."""
+        if self._session is None:
+            raise RuntimeError(f"{self} is not open, forwarding only works while the recorder is entered")
+        if not recorded_request.stored_body.is_retained:
+            self._logger.warning(f"{self} can't forward {recorded_request}, its body was only kept as digest")
+            return web.Response(status=502, text="the request body was not retained and can't be forwarded"), None
+
+        url = URL(str(self.url).rstrip('/') + str(request.rel_url), encoded=True)
+        headers = CIMultiDict((name, value) for name, value in request.headers.items()
+                              if name.lower() not in _HOP_BY_HOP_HEADERS and name.lower() not in ('host', 'content-length'))
+        kwargs: dict[str, Any] = {}
+        if recorded_request.stored_body.size > 0:
+            # a memory map for bodies that were spilled to disk, so they are not read into memory
+            kwargs['data'] = recorded_request.stored_body.view()
+
+        response: web.StreamResponse | None = None
+        try:
+            async with self._session.request(request.method, url, headers=headers, allow_redirects=False,
+                                             skip_auto_headers=('Accept-Encoding', 'User-Agent', 'Content-Type'), **kwargs) as upstream_response:
+                response = web.StreamResponse(status=upstream_response.status, reason=upstream_response.reason,
+                                              headers=CIMultiDict((name, value) for name, value in upstream_response.headers.items()
+                                                                  if name.lower() not in _HOP_BY_HOP_HEADERS))
+                await response.prepare(request)
+
+                sink = _BodySink(self._body_storage)
+                try:
+                    async for chunk in upstream_response.content.iter_chunked(_CHUNK_SIZE):
+                        await sink.write_async(chunk)
+                        await response.write(chunk)
+                    await response.write_eof()
+                except BaseException:
+                    sink.discard()
+                    raise
+
+                exchange = ForwardedExchange(recorded_request, upstream_response.status, CIMultiDictProxy(CIMultiDict(response.headers)), sink.close())
+                self.exchanges.append(exchange)
+                return response, exchange
+        except (ClientError, TimeoutError) as error:
+            self._logger.warning(f"{self} failed to forward {recorded_request}: {error!r}")
+            if response is not None and response.prepared:
+                # the client already got the start of the response, all that is left is to break the connection
+                if request.transport is not None:
+                    request.transport.close()
+                return response, None
+            return web.Response(status=502, text=f"the upstream failed: {error!r}"), None
@@ -0,0 +1,112 @@
+import asyncio
+import mimetypes
+import os
+from collections.abc import AsyncIterable, AsyncIterator, Callable, Iterable, Mapping
+from os import PathLike
+from typing import TYPE_CHECKING
+
+from aiohttp import payload, web
+from aiohttp.web_request import BaseRequest
+
+if TYPE_CHECKING:
+    from .http_request_recorder import ResponsesType
+
+ChunksType = AsyncIterable[bytes] | Iterable[bytes]
+
+_FILE_CHUNK_SIZE = 64 * 1024
+
+
+class StreamedResponse:
+    """A response whose body is written chunk by chunk instead of being held in memory as a whole.
+
+    `chunks` is an (async) iterable of `bytes` or, for responses that are used more than once, a callable creating one.
+    Without `content_length`, the body is sent with chunked transfer encoding.
+    """
+
+    def __init__(self, chunks: ChunksType | Callable[[], ChunksType], status: int = 200, headers: Mapping[str, str] | None = None,
+                 content_type: str | None = None, content_length: int | None = None) -> None:
+        self.chunks = chunks
+        self.status = status
+        self.headers = dict(headers or {})
+        self.content_type = content_type
+        self.content_length = content_length
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.status}>"
+
+    def prepare_response(self) -> web.StreamResponse:
+        response = web.StreamResponse(status=self.status, headers=self.headers)
+        if self.content_type is not None:
+            response.content_type = self.content_type
+        if self.content_length is not None:
+            response.content_length = self.content_length
+        else:
+            response.enable_chunked_encoding()
+        return response
+
+    async def write_to(self, request: BaseRequest) -> web.StreamResponse:
+        response = self.prepare_response()
+        await response.prepare(request)
+
+        chunks = self.chunks() if callable(self.chunks) else self.chunks
+        if isinstance(chunks, AsyncIterable):
+            async for chunk in chunks:
+                await response.write(chunk)
+        else:
+            for chunk in chunks:
+                await response.write(chunk)
+
+        await response.write_eof()
+        return response
+
+
+async def _file_chunks(path: PathLike[str] | str) -> AsyncIterator[bytes]:
+    """The content of a file, read chunk by chunk in the default executor so the event loop is not blocked."""
+    loop = asyncio.get_running_loop()
+    file = await loop.run_in_executor(None, open, path, 'rb')
+    try:
+        while chunk := await loop.run_in_executor(None, file.read, _FILE_CHUNK_SIZE):
+            yield chunk
+    finally:
+        file.close()
+
+
+async def _iterate(chunks: AsyncIterable[bytes] | Iterable[bytes]) -> AsyncIterable[bytes]:
+    if isinstance(chunks, AsyncIterable):
+        async for chunk in chunks:
+            yield chunk
+    else:
+        for chunk in chunks:
+            yield chunk
+
+
+def _streamed_headers(response: StreamedResponse) -> list[tuple[str, str]]:
+    headers = list(response.headers.items())
+    if response.content_type is not None:
+        headers.append(('Content-Type', response.content_type))
+    return headers
+
+
+async def _materialize(response: 'ResponsesType') -> tuple[int, list[tuple[str, str]], bytes]:
+    """Status, headers and the whole body of a static response, for protocols that don't write responses through aiohttp."""
+    if isinstance(response, (str, bytes)):
+        response = web.Response(status=200, body=response)
+
+    if isinstance(response, web.Response):
+        body = response.body
+        if isinstance(body, payload.Payload):
+            body = await body.as_bytes()
+        headers = [(name, value) for name, value in response.headers.items() if name.lower() != 'content-length']
+        return response.status, headers, bytes(body or b'')
+
+    if isinstance(response, StreamedResponse):
+        chunks = response.chunks() if callable(response.chunks) else response.chunks
+        body = b''.join([chunk async for chunk in _iterate(chunks)])
+        return response.status, _streamed_headers(response), body
+
+    if isinstance(response, PathLike):
+        body = b''.join([chunk async for chunk in _file_chunks(response)])
+        content_type = mimetypes.guess_type(os.fspath(response))[0] or 'application/octet-stream'
+        return 200, [('Content-Type', content_type)], body
+
+    raise TypeError(f"{response!r} can't be turned into status, headers and body")
@@ -0,0 +1,48 @@
+"""Envelopes of JSON-RPC 2.0 and XML-RPC, used by `HttpRequestRecorder.expect_json_rpc_call()` and `expect_xml_rpc_call()`.
+
+Results of RPC expectations are plain values, wrapped in the envelope of the protocol when they are sent.
+An `RpcError` (given as result, or raised by a callable computing the result) is sent as JSON-RPC error or XML-RPC fault.
+"""
+import json
+import xmlrpc.client
+from typing import Any, Literal
+
+RpcProtocol = Literal['json-rpc', 'xml-rpc']
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+
+
+class RpcError(Exception):
+    """An error answering an RPC call: a JSON-RPC error object or an XML-RPC fault."""
+
+    def __init__(self, code: int, message: str, data: Any = None) -> None:
+        super().__init__(code, message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.code}, {self.message!r})"
+
+
+def json_rpc_response(call_id: Any, result: Any) -> bytes:
+    """The JSON-RPC 2.0 response object answering the call with `call_id`."""
+    if isinstance(result, RpcError):
+        error: dict[str, Any] = {'code': result.code, 'message': result.message}
+        if result.data is not None:
+            error['data'] = result.data
+        return json.dumps({'jsonrpc': '2.0', 'error': error, 'id': call_id}).encode()
+    return json.dumps({'jsonrpc': '2.0', 'result': result, 'id': call_id}).encode()
+
+
+def xml_rpc_response(result: Any) -> bytes:
+    """The XML-RPC `methodResponse` with `result` as its only parameter, or a fault."""
+    if isinstance(result, RpcError):
+        return xmlrpc.client.dumps(xmlrpc.client.Fault(result.code, result.message), methodresponse=True).encode()
+    return xmlrpc.client.dumps((result,), methodresponse=True, allow_none=True).encode()
+
+
+def is_json_rpc_call(call: Any) -> bool:
+    return isinstance(call, dict) and isinstance(call.get('method'), str)
@@ -0,0 +1,158 @@
+"""A long-lived recorder server handing out isolated sessions.
+
+Binding a port for every test is slow and prone to collisions. A `RecorderServer` binds once and every
+`session()` is a lightweight `HttpRequestRecorder` with its own expectations, reached through the server:
+
+    async with RecorderServer(port=8080) as server:
+        async with server.session('test_something') as recorder:
+            recorder.expect_path('/any-path', 'response')
+            await http_session.get(recorder.base_url + '/any-path', headers=recorder.headers)
+"""
+from collections.abc import Iterable
+from itertools import count
+from logging import getLogger
+from typing import Any, Literal
+
+from aiohttp import web
+from aiohttp.web_request import BaseRequest
+from yarl import URL
+
+from .body_storage import BodyStoragePolicy
+from .faults import FaultProfile
+from .history import HistoryLimits
+from .listeners import TcpListener, base_url
+from .http_request_recorder import HttpRequestRecorder
+
+SESSION_HEADER = 'X-Recorder-Session'
+SESSION_PATH_PREFIX = '/__sessions/'
+
+RouteBy = Literal['header', 'path', 'port']
+
+
+class RecorderSession(HttpRequestRecorder):
+    """An `HttpRequestRecorder` that is served by a `RecorderServer` instead of binding its own port."""
+
+    def __init__(self, server: 'RecorderServer', session_id: str, name: str, port: int, **kwargs: Any) -> None:
+        super().__init__(name, port, **kwargs)
+        self.session_id = session_id
+        self._server = server
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} '{self._name}' ({self.session_id}) on :{self._port}>"
+
+    async def __aenter__(self) -> 'RecorderSession':
+        return self
+
+    async def __aexit__(self, *args: tuple[Any], **kwargs: dict[str, Any]) -> None:
+        self._wind_down()
+        self._server._release(self)
+
+    @property
+    def base_url(self) -> str:
+        """URL to send requests to, without trailing slash. Requests also need the `headers` of this session."""
+        prefix = SESSION_PATH_PREFIX + self.session_id if self._server.route_by == 'path' else ''
+        return base_url(self._server._host, self._port) + prefix
+
+    @property
+    def headers(self) -> dict[str, str]:
+        """Headers that route requests to this session - only needed when routing by header."""
+        return {self._server.header_name: self.session_id} if self._server.route_by == 'header' else {}
+
+
+class RecorderServer:
+    """Serves any number of `RecorderSession`s from one aiohttp application.
+
+    Requests are routed to sessions
+    - by the `X-Recorder-Session` header (`route_by='header'`),
+    - by a `/__sessions/<session id>` path prefix that is removed before matching (`route_by='path'`), or
+    - by port (`route_by='port'`): every port in `ports` is bound once and lent to one session at a time.
+
+    Ports given as 0 are bound to free ephemeral ports.
+    """
+
+    def __init__(self, port: int | None = 0, host: str = '0.0.0.0', route_by: RouteBy = 'header', ports: Iterable[int] = (),
+                 header_name: str = SESSION_HEADER) -> None:
+        if route_by not in ('header', 'path', 'port'):
+            raise ValueError("route_by must be 'header', 'path' or 'port'")
+        ports = list(ports)
+        if route_by == 'port' and not ports:
+            raise ValueError("routing by port needs a pool of `ports`")
+        if route_by != 'port' and port is None:
+            raise ValueError(f"routing by {route_by} needs a `port`")
+
+        self._logger = getLogger("recorder")
+        self.route_by = route_by
+        self.header_name = header_name
+        self._host = host
+        self._ports = ports if route_by == 'port' or port is None else [port]
+        self._free_ports = list(self._ports)
+        self._session_ids = count(1)
+        self._sessions: dict[str, RecorderSession] = {}
+        self._sessions_by_port: dict[int, RecorderSession] = {}
+        self._runner: web.AppRunner | None = None
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} routing by {self.route_by} on {self._ports}>"
+
+    async def __aenter__(self) -> 'RecorderServer':
+        app = web.Application()
+        app.add_routes([web.route('*', '/{tail:.*}', self._route)])
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        # ports given as 0 are replaced by the ones actually bound
+        self._ports = [(await TcpListener(self._host, port).start(self._runner))[1] for port in self._ports]
+        self._free_ports = list(self._ports)
+
+        return self
+
+    async def __aexit__(self, *args: tuple[Any], **kwargs: dict[str, Any]) -> None:
+        if self._sessions:
+            self._logger.warning(f"{self} is exiting with open sessions: {list(self._sessions.values())}")
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    def session(self, name: str, body_storage: BodyStoragePolicy | None = None, history: HistoryLimits | None = None,
+                faults: FaultProfile | None = None) -> RecorderSession:
+        """A new, empty session. Use it with `async with` to release it again."""
+        if self.route_by == 'port':
+            if not self._free_ports:
+                raise LookupError(f"{self} has no free port left for another session")
+            port = self._free_ports.pop()
+        else:
+            port = self._ports[0]
+
+        session = RecorderSession(self, str(next(self._session_ids)), name, port, body_storage=body_storage, history=history, faults=faults)
+        self._sessions[session.session_id] = session
+        if self.route_by == 'port':
+            self._sessions_by_port[port] = session
+        return session
+
+    def _release(self, session: RecorderSession) -> None:
+        if self._sessions.pop(session.session_id, None) is None:
+            return
+        if self.route_by == 'port':
+            del self._sessions_by_port[session._port]
+            self._free_ports.append(session._port)
+
+    async def _route(self, request: BaseRequest) -> web.StreamResponse:
+        session: RecorderSession | None = None
+
+        if self.route_by == 'header':
+            session = self._sessions.get(request.headers.get(self.header_name, ''))
+        elif self.route_by == 'path':
+            raw_path = request.rel_url.raw_path
+            if raw_path.startswith(SESSION_PATH_PREFIX):
+                session_id, _, path = raw_path[len(SESSION_PATH_PREFIX):].partition('/')
+                session = self._sessions.get(session_id)
+                if session is not None:
+                    request = request.clone(rel_url=URL.build(path=f"/{path}", query_string=request.rel_url.raw_query_string, encoded=True))
+        else:
+            sockname = request.transport.get_extra_info('sockname') if request.transport is not None else None
+            session = self._sessions_by_port.get(sockname[1]) if sockname else None
+
+        if session is None:
+            self._logger.warning(f"{self} got {request.method} to '{request.path}' for no known session")
+            return web.Response(status=404)
+
+        return await session.handle_request(request)
@@ -0,0 +1,91 @@
+import asyncio
+from collections import deque
+from collections.abc import Callable
+from typing import TYPE_CHECKING, Any, Literal
+
+if TYPE_CHECKING:
+    from .http_request_recorder import RecordedRequest
+
+OverflowPolicy = Literal['block', 'drop_newest', 'drop_oldest']
+
+
+class RequestStream:
+    """Recorded requests delivered to one subscriber as they arrive - see `HttpRequestRecorder.stream()`.
+
+    At most `maxsize` requests are queued. When the queue is full, `overflow` decides what happens:
+    - `'block'`: the recorder waits with its response until there is room again, slowing down the client
+    - `'drop_newest'`: the arriving request is not delivered
+    - `'drop_oldest'`: the oldest queued request is discarded to make room
+
+    Dropped requests are counted in `dropped`. Iteration ends once the stream is closed or the recorder exits.
+    """
+
+    def __init__(self, matcher: Callable[['RecordedRequest'], bool] | None, maxsize: int, overflow: OverflowPolicy,
+                 unsubscribe: Callable[['RequestStream'], None]) -> None:
+        if overflow not in ('block', 'drop_newest', 'drop_oldest'):
+            raise ValueError("overflow must be 'block', 'drop_newest' or 'drop_oldest'")
+        if maxsize < 1:
+            raise ValueError("maxsize must be at least 1")
+
+        self.overflow = overflow
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._matcher = matcher
+        self._unsubscribe = unsubscribe
+        self._requests: deque['RecordedRequest'] = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._ended = False
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {len(self._requests)} queued, {self.dropped} dropped>"
+
+    def __aiter__(self) -> 'RequestStream':
+        return self
+
+    async def __anext__(self) -> 'RecordedRequest':
+        while not self._requests:
+            if self._ended:
+                raise StopAsyncIteration
+            self._readable.clear()
+            await self._readable.wait()
+        request = self._requests.popleft()
+        self._writable.set()
+        return request
+
+    async def __aenter__(self) -> 'RequestStream':
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stops delivery. Requests still queued are discarded, so a blocked recorder can go on."""
+        self._unsubscribe(self)
+        self._requests.clear()
+        self._end()
+
+    def _end(self) -> None:
+        # requests still queued are delivered, iteration ends after them
+        self._ended = True
+        self._readable.set()
+        self._writable.set()
+
+    async def _deliver(self, request: 'RecordedRequest') -> None:
+        if self._ended or (self._matcher is not None and not self._matcher(request)):
+            return
+        if len(self._requests) >= self.maxsize:
+            if self.overflow == 'block':
+                while len(self._requests) >= self.maxsize and not self._ended:
+                    self._writable.clear()
+                    await self._writable.wait()
+                if self._ended:
+                    return
+            elif self.overflow == 'drop_newest':
+                self.dropped += 1
+                return
+            else:
+                self._requests.popleft()
+                self.dropped += 1
+        self._requests.append(request)
+        self._readable.set()
@@ -0,0 +1,186 @@
+"""TLS for recorders, with a self-signed certificate that is generated once and then reused:
+
+    tls = TlsConfig()
+    async with HttpRequestRecorder('secure upstream', tls=tls) as recorder:
+        async with ClientSession(connector=TCPConnector(ssl=tls.client_context())) as http_session:
+            await http_session.get(recorder.base_url + '/any-path')  # https://localhost:...
+
+The certificate is generated with the optional `cryptography` package or, without it, the `openssl` command line tool.
+It is cached in `cache_dir` (by default shared by all processes of a user) until it is about to expire. The cache is
+only used if it belongs to the current user and nobody else can access it, `PermissionError` is raised otherwise.
+
+Servers use one `ssl.SSLContext` per `TlsConfig`, so clients can resume TLS sessions (session tickets for TLS 1.3,
+session ids for TLS 1.2) across connections and across all recorders sharing the `TlsConfig`. `session_stats()` tells
+how many handshakes were full ones and how many resumed a session.
+"""
+import asyncio
+import datetime
+import getpass
+import hashlib
+import ipaddress
+import os
+import shutil
+import ssl
+import stat
+import subprocess
+import tempfile
+import time
+from collections.abc import Iterable
+
+_VALIDITY_DAYS = 30
+# certificates are replaced this long before they expire
+_RENEW_BEFORE_SECONDS = 24 * 60 * 60
+
+
+class TlsConfig:
+    """Certificate and TLS settings of a recorder.
+
+    Without `certfile`, a self-signed certificate for `hostnames` is used (see the module documentation).
+    `certfile` may contain the private key, otherwise it is read from `keyfile`.
+    """
+
+    def __init__(self, certfile: str | None = None, keyfile: str | None = None, hostnames: Iterable[str] = ('localhost', '127.0.0.1', '::1'),
+                 cache_dir: str | None = None, session_tickets: int = 2) -> None:
+        self.hostnames = tuple(hostnames)
+        if not self.hostnames:
+            raise ValueError("a certificate needs at least one hostname")
+        self.cache_dir = cache_dir or _default_cache_dir()
+        self.certfile = certfile
+        self.keyfile = keyfile
+        self.session_tickets = session_tickets
+        self._contexts: dict[tuple[str, ...], ssl.SSLContext] = {}
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.certfile or 'self-signed for ' + ', '.join(self.hostnames)}>"
+
+    async def server_context(self, alpn_protocols: Iterable[str] = ('http/1.1',)) -> ssl.SSLContext:
+        """The context to serve with, created once per set of ALPN protocols. The certificate is generated if needed."""
+        alpn = tuple(alpn_protocols)
+        context = self._contexts.get(alpn)
+        if context is None:
+            if self.certfile is None:
+                # generating a key can take a moment, so it doesn't block the event loop
+                self.certfile = await asyncio.get_running_loop().run_in_executor(None, self._self_signed_certificate)
+            context = self._contexts[alpn] = self._create_server_context(alpn)
+        return context
+
+    def client_context(self) -> ssl.SSLContext:
+        """A client context trusting the certificate of this config, e.g. for `aiohttp.TCPConnector(ssl=...)`.
+        Only available once a recorder using this config was entered, which generates self-signed certificates."""
+        if self.certfile is None:
+            raise RuntimeError(f"{self} has no certificate yet, enter a recorder using it first")
+        return ssl.create_default_context(cafile=self.certfile)
+
+    def session_stats(self) -> dict[str, int]:
+        """Handshakes of all server contexts: `accept` counts all of them, `hits` those resuming a session."""
+        totals: dict[str, int] = {}
+        for context in self._contexts.values():
+            for name, value in context.session_stats().items():
+                totals[name] = totals.get(name, 0) + value
+        return totals
+
+    def _create_server_context(self, alpn_protocols: tuple[str, ...]) -> ssl.SSLContext:
+        assert self.certfile is not None
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(self.certfile, self.keyfile)
+        context.set_alpn_protocols(list(alpn_protocols))
+        context.num_tickets = self.session_tickets
+        return context
+
+    def _self_signed_certificate(self) -> str:
+        """Path of a file with key and certificate, generated unless a cached one is still valid."""
+        name = hashlib.sha256(','.join(self.hostnames).encode()).hexdigest()[:16]
+        path = os.path.join(self.cache_dir, f'self-signed-{name}.pem')
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        _check_private(self.cache_dir)
+        try:
+            if time.time() - os.path.getmtime(path) < _VALIDITY_DAYS * 24 * 60 * 60 - _RENEW_BEFORE_SECONDS:
+                return path
+        except FileNotFoundError:
+            pass
+
+        pem = _generate_with_cryptography(self.hostnames) if _has_cryptography() else _generate_with_openssl(self.hostnames)
+        # key and certificate in one file, replaced at once - other processes may be reading it at the same time
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, prefix='.self-signed-', delete=False) as file:
+            file.write(pem)
+        os.chmod(file.name, 0o600)
+        os.replace(file.name, path)
+        return path
+
+
+def _default_cache_dir() -> str:
+    try:
+        user = getpass.getuser()
+    except (KeyError, OSError):
+        user = 'unknown'
+    # per user, nobody else should be able to plant a key there
+    return os.path.join(tempfile.gettempdir(), f'http-request-recorder-{user}')
+
+
+def _check_private(directory: str) -> None:
+    """Refuses directories other users could have planted a key in: not our own, or writable by others."""
+    status = os.lstat(directory)
+    if not stat.S_ISDIR(status.st_mode):
+        raise PermissionError(f"certificate cache {directory} is not a directory")
+    if hasattr(os, 'getuid') and status.st_uid != os.getuid():
+        raise PermissionError(f"certificate cache {directory} is owned by another user, pass a cache_dir of your own")
+    if hasattr(os, 'getuid') and stat.S_IMODE(status.st_mode) & 0o077:
+        raise PermissionError(f"certificate cache {directory} is accessible to other users, it needs mode 0o700")
+
+
+def _has_cryptography() -> bool:
+    try:
+        import cryptography  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _is_ip_address(hostname: str) -> bool:
+    try:
+        ipaddress.ip_address(hostname)
+    except ValueError:
+        return False
+    return True
+
+
+def _generate_with_cryptography(hostnames: tuple[str, ...]) -> bytes:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    subject = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostnames[0])])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    alternative_names: list[x509.GeneralName] = [x509.IPAddress(ipaddress.ip_address(hostname)) if _is_ip_address(hostname) else x509.DNSName(hostname)
+                                                 for hostname in hostnames]
+    certificate = (x509.CertificateBuilder()
+                   .subject_name(subject)
+                   .issuer_name(subject)
+                   .public_key(key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(hours=1))
+                   .not_valid_after(now + datetime.timedelta(days=_VALIDITY_DAYS))
+                   .add_extension(x509.SubjectAlternativeName(alternative_names), critical=False)
+                   .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+                   .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+                   .sign(key, hashes.SHA256()))
+    pem: bytes = (key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+                  + certificate.public_bytes(serialization.Encoding.PEM))
+    return pem
+
+
+def _generate_with_openssl(hostnames: tuple[str, ...]) -> bytes:
+    openssl = shutil.which('openssl')
+    if openssl is None:
+        raise RuntimeError("generating a self-signed certificate needs the cryptography package or the openssl command")
+
+    alternative_names = ','.join(f"IP:{hostname}" if _is_ip_address(hostname) else f"DNS:{hostname}" for hostname in hostnames)
+    with tempfile.TemporaryDirectory() as directory:
+        keyfile, certfile = os.path.join(directory, 'key.pem'), os.path.join(directory, 'cert.pem')
+        subprocess.run([openssl, 'req', '-x509', '-newkey', 'ec', '-pkeyopt', 'ec_paramgen_curve:prime256v1', '-nodes',
+                        '-keyout', keyfile, '-out', certfile, '-days', str(_VALIDITY_DAYS), '-subj', f'/CN={hostnames[0]}',
+                        '-addext', f'subjectAltName={alternative_names}'], check=True, capture_output=True)
+        with open(keyfile, 'rb') as key, open(certfile, 'rb') as certificate:
+            return key.read() + certificate.read()
@@ -0,0 +1,77 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import unittest
+
+from aiohttp import ClientSession
+
+from http_request_recorder import BodyStoragePolicy, HttpRequestRecorder
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestBodyStorage(unittest.IsolatedAsyncioTestCase):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.port = 18080
+
+    async def test_large_body_is_spilled_to_file(self) -> None:
+        body = os.urandom(3 * 1024 * 1024)
+
+        async with (HttpRequestRecorder(name="spilling recorder", port=self.port, body_storage=BodyStoragePolicy(max_in_memory=1024)) as recorder,
+                    ClientSession() as http_session):
+            expectation = recorder.expect_path("/upload", ("first", "second"))
+
+            response = await http_session.post(f"http://localhost:{self.port}/upload", data=body)
+            await http_session.post(f"http://localhost:{self.port}/upload", data=b'small')
+
+            self.assertEqual(200, response.status)
+
+            recorded_request = await expectation.wait_for_request()
+            self.assertIn("file", repr(recorded_request.stored_body))
+            self.assertEqual(len(body), recorded_request.stored_body.size)
+            self.assertEqual(body[:16], bytes(recorded_request.stored_body.view()[:16]))
+            self.assertEqual(body, recorded_request.body)
+
+            self.assertEqual(b'small', await expectation.wait())
+
+    async def test_large_body_can_be_digested_only(self) -> None:
+        body = b'0123456789' * 1000
+
+        async with (HttpRequestRecorder(name="digesting recorder", port=self.port, body_storage=BodyStoragePolicy(max_in_memory=10, overflow='digest')) as recorder,
+                    ClientSession() as http_session):
+            expectation = recorder.expect_path("/upload")
+
+            await http_session.post(f"http://localhost:{self.port}/upload", data=body)
+
+            stored_body = (await expectation.wait_for_request()).stored_body
+            self.assertFalse(stored_body.is_retained)
+            self.assertEqual(len(body), stored_body.size)
+            self.assertEqual(hashlib.sha256(body).hexdigest(), stored_body.sha256)
+            with self.assertRaises(LookupError):
+                bytes(stored_body)
+
+    async def test_aborted_upload_leaves_no_file_behind(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            policy = BodyStoragePolicy(max_in_memory=1024, directory=directory)
+            async with HttpRequestRecorder(name="spilling recorder", body_storage=policy) as recorder:
+                recorder.expect_path("/upload")
+
+                reader, writer = await asyncio.open_connection("localhost", recorder.port)
+                writer.write(b"POST /upload HTTP/1.1\r\nHost: localhost\r\nContent-Length: 10000000\r\n\r\n" + b'x' * 200_000)
+                await writer.drain()
+                for _ in range(100):
+                    if os.listdir(directory):
+                        break
+                    await asyncio.sleep(0.01)
+                self.assertEqual(1, len(os.listdir(directory)))
+
+                writer.close()
+                for _ in range(100):
+                    if not os.listdir(directory):
+                        break
+                    await asyncio.sleep(0.01)
+                self.assertEqual([], os.listdir(directory))
+                self.assertEqual([], recorder.unexpected_requests())
@@ -0,0 +1,85 @@
+import gzip
+import json
+import logging
+import os
+import tempfile
+import unittest
+
+from aiohttp import ClientSession, web
+
+from http_request_recorder import CaptureLog, HttpRequestRecorder, load_capture
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestCapture(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    async def test_captured_traffic_is_replayed(self) -> None:
+        capture_path = os.path.join(self.directory.name, "traffic.jsonl.gz")
+
+        async with (HttpRequestRecorder(name="capturing recorder", capture=CaptureLog(capture_path)) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/users", ["first", web.json_response({"id": 2}, status=201)], method='POST')
+            recorder.expect_path("/search", b'found')
+
+            await http_session.post(f"{recorder.base_url}/users", data="alice")
+            await http_session.post(f"{recorder.base_url}/users", data="alice")
+            await http_session.get(f"{recorder.base_url}/search?q=cats")
+            await http_session.get(f"{recorder.base_url}/unexpected")
+
+        async with (HttpRequestRecorder(name="replaying recorder") as recorder,
+                    ClientSession() as http_session):
+            expectations = load_capture(recorder, capture_path)
+
+            self.assertEqual(2, len(expectations))
+            self.assertEqual(404, (await http_session.get(f"{recorder.base_url}/search?q=dogs")).status)
+            self.assertEqual(404, (await http_session.post(f"{recorder.base_url}/users", data="bob")).status)
+
+            first = await http_session.post(f"{recorder.base_url}/users", data="alice")
+            self.assertEqual(b'first', await first.read())
+            self.assertEqual("text/plain", first.content_type)
+            second = await http_session.post(f"{recorder.base_url}/users", data="alice")
+            self.assertEqual(201, second.status)
+            self.assertEqual({"id": 2}, await second.json())
+
+            self.assertEqual(b'found', await (await http_session.get(f"{recorder.base_url}/search?q=cats")).read())
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+    async def test_bodies_are_stored_once(self) -> None:
+        capture_path = os.path.join(self.directory.name, "traffic.jsonl")
+        stored: dict[str, int] = {}
+
+        for _ in range(2):
+            async with (HttpRequestRecorder(name="capturing recorder", capture=CaptureLog(capture_path)) as recorder,
+                        ClientSession() as http_session):
+                recorder.expect_path("/same", iter(lambda: "same response", None))
+
+                for _ in range(3):
+                    await http_session.post(f"{recorder.base_url}/same", data="same request", headers=[("X-Tag", "a"), ("X-Tag", "b")])
+            stored = stored or {name: os.stat(os.path.join(capture_path + ".bodies", name)).st_mtime_ns for name in os.listdir(capture_path + ".bodies")}
+
+        with open(capture_path, 'rb') as file:
+            records = [json.loads(line) for line in file]
+
+        self.assertEqual({'capture': 1}, records[0])
+        self.assertEqual(2, len(stored))
+        self.assertEqual(stored, {name: os.stat(os.path.join(capture_path + ".bodies", name)).st_mtime_ns for name in stored})
+        self.assertEqual(6, len([record for record in records if 'method' in record]))
+        self.assertEqual([["X-Tag", "a"], ["X-Tag", "b"]], [header for header in records[1]['headers'] if header[0] == "X-Tag"])
+
+    async def test_captures_can_be_continued(self) -> None:
+        capture_path = os.path.join(self.directory.name, "traffic.jsonl.gz")
+
+        for body in ("first run", "second run"):
+            async with (HttpRequestRecorder(name="capturing recorder", capture=CaptureLog(capture_path)) as recorder,
+                        ClientSession() as http_session):
+                recorder.expect_path("/run", body)
+                await http_session.get(f"{recorder.base_url}/run")
+
+        with gzip.open(capture_path, 'rb') as file:
+            exchanges = [json.loads(line) for line in file if b'"method"' in line]
+
+        self.assertEqual(["/run", "/run"], [exchange['path'] for exchange in exchanges])
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import unittest
+from typing import Any
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HttpRequestRecorder
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestControlPlane(unittest.IsolatedAsyncioTestCase):
+    async def test_bulk_registration_and_wait(self) -> None:
+        async with (HttpRequestRecorder(name="controlled recorder", control_plane=True) as recorder,
+                    ClientSession() as http_session):
+            control = f"{recorder.base_url}/__recorder"
+            expectations: list[dict[str, Any]] = [{"match": {"path": f"/stub/{i}"}, "responses": f"stub {i}"} for i in range(1000)]
+            expectations.append({
+                "name": "create user",
+                "match": {"method": "POST", "path": "/users", "json": {"name": "alice"}, "headers": {"Authorization": {"regex": "Bearer .+"}}},
+                "responses": [{"status": 201, "json": {"id": 1}, "headers": {"Location": "/users/1"}}],
+            })
+
+            registration = await http_session.post(f"{control}/expectations", json={"expectations": expectations})
+            registered = (await registration.json())["expectations"]
+
+            self.assertEqual(201, registration.status)
+            self.assertEqual(1001, len(registered))
+            self.assertEqual("create user", registered[-1]["name"])
+
+            waiting = asyncio.create_task(http_session.post(f"{control}/wait", json={"ids": [registered[-1]["id"]], "timeout": 5}))
+            created = await http_session.post(f"{recorder.base_url}/users", json={"name": "alice"}, headers={"Authorization": "Bearer token"})
+            self.assertEqual(201, created.status)
+            self.assertEqual({"id": 1}, await created.json())
+            self.assertEqual("/users/1", created.headers["Location"])
+            self.assertEqual(b'stub 7', await (await http_session.get(f"{recorder.base_url}/stub/7")).read())
+
+            waited = await (await waiting).json()
+            [recorded] = waited["requests"][registered[-1]["id"]]
+            self.assertEqual("POST", recorded["method"])
+            self.assertEqual('{"name": "alice"}', recorded["body"])
+
+            timed_out = await http_session.post(f"{control}/wait", json={"ids": [registered[0]["id"]], "timeout": 0.1})
+            self.assertEqual(408, timed_out.status)
+            self.assertIn("/stub/0", (await timed_out.json())["error"])
+
+            listed = (await (await http_session.get(f"{control}/expectations")).json())["expectations"]
+            self.assertEqual([1], [expectation["recorded"] for expectation in listed if expectation["id"] == registered[7]["id"]])
+            self.assertEqual([], recorder.unexpected_requests())
+
+    async def test_timed_out_wait_can_be_retried(self) -> None:
+        async with (HttpRequestRecorder(name="controlled recorder", control_plane=True) as recorder,
+                    ClientSession() as http_session):
+            control = f"{recorder.base_url}/__recorder"
+            [registered] = (await (await http_session.post(f"{control}/expectations", json=[{"match": {"path": "/late"}}])).json())["expectations"]
+
+            timed_out = await http_session.post(f"{control}/wait", json={"ids": [registered["id"]], "count": 1, "timeout": 0.1})
+            self.assertEqual(408, timed_out.status)
+
+            await http_session.get(f"{recorder.base_url}/late")
+            retried = await http_session.post(f"{control}/wait", json={"ids": [registered["id"]], "count": 1, "timeout": 1})
+            self.assertEqual(200, retried.status)
+            self.assertEqual(["/late"], [request["path"] for request in (await retried.json())["requests"][registered["id"]]])
+
+            exhausted = await http_session.post(f"{control}/wait", json={"ids": [registered["id"]], "count": 1, "timeout": 0.1})
+            self.assertEqual(400, exhausted.status)
+
+    async def test_invalid_wait_is_rejected(self) -> None:
+        async with (HttpRequestRecorder(name="controlled recorder", control_plane=True) as recorder,
+                    ClientSession() as http_session):
+            for invalid in ({"count": "1"}, {"count": -1}, {"timeout": "soon"}, {"ids": "1"}, {"ids": [{"id": 1}]}):
+                with self.subTest(invalid):
+                    response = await http_session.post(f"{recorder.base_url}/__recorder/wait", json=invalid)
+                    self.assertEqual(400, response.status)
+
+    async def test_invalid_expectations_register_nothing(self) -> None:
+        async with (HttpRequestRecorder(name="controlled recorder", control_plane=True) as recorder,
+                    ClientSession() as http_session):
+            response = await http_session.post(f"{recorder.base_url}/__recorder/expectations",
+                                               json=[{"match": {"path": "/fine"}}, {"match": {"colour": "blue"}}])
+
+            self.assertEqual(400, response.status)
+            self.assertIn("expectation 1", (await response.json())["error"])
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+    async def test_paginated_requests(self) -> None:
+        async with (HttpRequestRecorder(name="controlled recorder", control_plane=True) as recorder,
+                    ClientSession() as http_session):
+            control = f"{recorder.base_url}/__recorder"
+            registered = (await (await http_session.post(f"{control}/expectations", json=[
+                {"match": {"path_prefix": "/items"}, "responses": ["ok"], "repeat": True},
+            ])).json())["expectations"]
+
+            for i in range(5):
+                await http_session.put(f"{recorder.base_url}/items/{i}", data=f"item {i}")
+            await http_session.get(f"{recorder.base_url}/elsewhere")
+
+            first_page = await (await http_session.get(f"{control}/requests", params={"expectation": registered[0]["id"], "limit": "3"})).json()
+            second_page = await (await http_session.get(f"{control}/requests", params={"expectation": registered[0]["id"], "offset": str(first_page["next_offset"])})).json()
+            unexpected = await (await http_session.get(f"{control}/requests")).json()
+
+            self.assertEqual(["/items/0", "/items/1", "/items/2"], [request["path"] for request in first_page["requests"]])
+            self.assertEqual(["item 3", "item 4"], [request["body"] for request in second_page["requests"]])
+            self.assertIsNone(second_page["next_offset"])
+            self.assertEqual(5, second_page["total"])
+            self.assertEqual(["/elsewhere"], [request["path"] for request in unexpected["requests"]])
+
+            missing = await http_session.get(f"{control}/requests", params={"expectation": "42"})
+            self.assertEqual(404, missing.status)
@@ -0,0 +1,117 @@
+import json
+import logging
+import unittest
+import unittest.mock
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HttpRequestRecorder, MultiProcessHttpRequestRecorder, RecordedRequest, RecorderServer
+from http_request_recorder import matchers as m
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestDiagnostics(unittest.IsolatedAsyncioTestCase):
+    async def test_unexpected_requests_are_explained(self) -> None:
+        with self.assertLogs("recorder", level="WARNING") as logs:
+            await self._diagnose_unexpected_requests()
+        self.assertIn("the nearest expectations were", logs.output[-1])
+        self.assertIn("'create user' (67%): header 'Authorization' present", logs.output[-1])
+
+    async def _diagnose_unexpected_requests(self) -> None:
+        async with HttpRequestRecorder(name="diagnosed recorder") as recorder:
+            recorder.expect(m.path("/users") & m.method("POST") & m.header("Authorization"), "created", name="create user")
+            recorder.expect(m.path("/users/42/avatar") & m.method("GET"), "avatar", name="avatar")
+            recorder.expect(m.path_prefix("/admin/"), "admin", name="admin")
+            for index in range(100):
+                recorder.expect(m.path(f"/other/{index}"), "other")
+            recorder.expect(lambda request: request.path == "/custom", "custom", name="custom")
+            recorder.expect_json_rpc_call("add", 3)
+
+            async with ClientSession() as http_session:
+                self.assertEqual(404, (await http_session.post(f"{recorder.base_url}/users")).status)
+                self.assertEqual(404, (await http_session.get(f"{recorder.base_url}/users/43/avatar")).status)
+                self.assertEqual(200, (await http_session.post(f"{recorder.base_url}/jsonrpc",
+                                                               data=json.dumps({"jsonrpc": "2.0", "method": "sub", "id": 1}))).status)
+
+            [(post, post_misses), (_avatar, avatar_misses), (call, call_misses)] = recorder.diagnose_unexpected_requests()
+
+            self.assertEqual("/users", post.path)
+            self.assertEqual("create user", post_misses[0].expectation.name)
+            self.assertAlmostEqual(2 / 3, post_misses[0].score)
+            self.assertEqual(("header 'Authorization' present",), post_misses[0].failed)
+            self.assertEqual(3, len(post_misses))
+
+            self.assertEqual("avatar", avatar_misses[0].expectation.name)
+            self.assertEqual(("path == '/users/42/avatar'",), avatar_misses[0].failed)
+            self.assertEqual("'avatar' (50%): path == '/users/42/avatar'", str(avatar_misses[0]))
+
+            self.assertEqual("sub", call.rpc_method())
+            self.assertEqual("JsonRpc: add", call_misses[0].expectation.name)
+            self.assertEqual(("rpc method == 'add'",), call_misses[0].failed)
+            self.assertNotIn("json-rpc endpoint /jsonrpc", [near_miss.expectation.name for near_miss in call_misses])
+
+    async def test_exhausted_and_custom_expectations(self) -> None:
+        async with HttpRequestRecorder(name="diagnosed recorder") as recorder:
+            once = recorder.expect_path("/once", "first")
+            recorder.expect(lambda request: request.path == "/custom", "custom", name="custom")
+
+            async with ClientSession() as http_session:
+                await http_session.get(f"{recorder.base_url}/once")
+                self.assertEqual(404, (await http_session.get(f"{recorder.base_url}/once")).status)
+            await once.wait()
+
+            [near_miss, custom] = recorder.near_misses(recorder.unexpected_requests()[0], limit=2)
+            self.assertEqual((once, 1.0), (near_miss.expectation, near_miss.score))
+            self.assertEqual(("matches, but had no responses left after 1 requests",), near_miss.failed)
+            self.assertEqual(("custom matcher returned False",), custom.failed)
+
+    async def test_failing_matchers_are_logged(self) -> None:
+        async with HttpRequestRecorder(name="diagnosed recorder") as recorder:
+            # no longer works once the request was handled
+            results = [False]
+            recorder.expect(lambda request: results.pop(), "once", name="fragile")
+
+            async with ClientSession() as http_session:
+                self.assertEqual(404, (await http_session.get(f"{recorder.base_url}/users")).status)
+
+            with self.assertLogs("recorder", level="DEBUG") as logs:
+                [near_miss] = recorder.near_misses(recorder.unexpected_requests()[0], limit=1)
+            self.assertEqual((0.0, ("matcher raised IndexError('pop from empty list')",)), (near_miss.score, near_miss.failed))
+            self.assertIn("Traceback", logs.output[0])
+
+    async def test_sessions_and_multi_process_recorders_explain_on_exit(self) -> None:
+        async with RecorderServer() as server, ClientSession() as http_session:
+            with self.assertLogs("recorder", level="WARNING") as logs:
+                async with server.session("diagnosed session") as session:
+                    session.expect_path("/users", method="POST")
+                    await http_session.get(f"{session.base_url}/users", headers=session.headers)
+            self.assertIn("'POST /users' (50%): method in ['POST']", logs.output[-1])
+
+            with self.assertLogs("recorder", level="WARNING") as logs:
+                async with MultiProcessHttpRequestRecorder(name="diagnosed recorder", workers=1) as recorder:
+                    recorder.expect_path("/users", method="POST")
+                    await http_session.get(f"{recorder.base_url}/users")
+            self.assertTrue(any("'POST /users' (50%): method in ['POST']" in line for line in logs.output))
+
+    async def test_only_logged_requests_are_diagnosed_on_exit(self) -> None:
+        with self.assertLogs("recorder", level="WARNING") as logs:
+            async with HttpRequestRecorder(name="diagnosed recorder") as recorder, ClientSession() as http_session:
+                recorder.expect_path("/users")
+                for index in range(25):
+                    await http_session.get(f"{recorder.base_url}/other/{index}")
+                near_misses = unittest.mock.patch.object(recorder, "near_misses", wraps=recorder.near_misses)
+                diagnosed = near_misses.start()
+                self.addCleanup(near_misses.stop)
+
+        self.assertEqual(20, diagnosed.call_count)
+        self.assertTrue(logs.output[-1].endswith("... and 5 more"))
+
+    def test_explain_composed_matchers(self) -> None:
+        matcher = m.path("/users") & m.method("POST") & (m.header("X-A") | m.header("X-B")) & ~m.query_param("dry_run")
+        request = RecordedRequest()
+        request.method, request.path, request.query_string = "POST", "/users", "dry_run=1"
+
+        self.assertEqual(4, matcher.predicate_count())
+        self.assertEqual(["(header 'X-A' present | header 'X-B' present)", "~query 'dry_run' present"], [repr(failed) for failed in matcher.explain(request)])
+        self.assertEqual([], m.path("/users").explain(request))
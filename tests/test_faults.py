@@ -0,0 +1,97 @@
+import asyncio
+import logging
+import pathlib
+import tempfile
+import time
+import unittest
+
+from aiohttp import ClientError, ClientPayloadError, ClientSession
+
+from http_request_recorder import FaultProfile, HttpRequestRecorder, faults
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestFaults(unittest.IsolatedAsyncioTestCase):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.port = 18080
+
+    async def test_delays_overlap(self) -> None:
+        async with (HttpRequestRecorder(name="slow recorder", port=self.port, faults=FaultProfile(delay=0.3)) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/slow", iter(lambda: "finally", None))
+
+            started = time.monotonic()
+            responses = await asyncio.gather(*(http_session.get(f"http://localhost:{self.port}/slow") for _ in range(50)))
+            elapsed = time.monotonic() - started
+
+            self.assertEqual({200}, {response.status for response in responses})
+            self.assertGreaterEqual(elapsed, 0.3)
+            self.assertLess(elapsed, 1.5)
+
+    async def test_expectation_profile_takes_precedence(self) -> None:
+        async with (HttpRequestRecorder(name="slow recorder", port=self.port, faults=FaultProfile(delay=5)) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/fast", "quick", faults=FaultProfile())
+
+            started = time.monotonic()
+            response = await http_session.get(f"http://localhost:{self.port}/fast")
+
+            self.assertEqual(b'quick', await response.read())
+            self.assertLess(time.monotonic() - started, 1)
+
+    async def test_throttled_body(self) -> None:
+        body = b'x' * 40_000
+
+        async with (HttpRequestRecorder(name="throttled recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/download", body, faults=FaultProfile(bytes_per_second=100_000))
+
+            started = time.monotonic()
+            response = await http_session.get(f"http://localhost:{self.port}/download")
+            received = await response.read()
+
+            self.assertEqual(body, received)
+            self.assertGreaterEqual(time.monotonic() - started, 0.35)
+
+    async def test_throttled_file(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = pathlib.Path(directory, "download.bin")
+            path.write_bytes(b'y' * 150_000)
+
+            async with (HttpRequestRecorder(name="throttled recorder", port=self.port) as recorder,
+                        ClientSession() as http_session):
+                recorder.expect_path("/file", path, faults=FaultProfile(bytes_per_second=1_000_000))
+
+                response = await http_session.get(f"http://localhost:{self.port}/file")
+
+                self.assertEqual(150_000, response.content_length)
+                self.assertEqual(b'y' * 150_000, await response.read())
+
+    async def test_connection_reset(self) -> None:
+        async with (HttpRequestRecorder(name="resetting recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            expectation = recorder.expect_path("/reset", iter(lambda: "never seen", None), faults=FaultProfile(reset_probability=1))
+
+            with self.assertRaises(ClientError):
+                await http_session.post(f"http://localhost:{self.port}/reset", data="sent anyway")
+
+            self.assertEqual(b'sent anyway', await expectation.wait())
+
+    async def test_partial_body(self) -> None:
+        async with (HttpRequestRecorder(name="truncating recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/partial", b'0123456789', faults=FaultProfile(partial_body_probability=1, partial_body_fraction=0.3))
+
+            response = await http_session.get(f"http://localhost:{self.port}/partial")
+
+            self.assertEqual("10", response.headers["Content-Length"])
+            with self.assertRaises(ClientPayloadError):
+                await response.read()
+
+    def test_seeded_profiles_are_reproducible(self) -> None:
+        first = FaultProfile(delay=faults.lognormal(mu=-3, sigma=1), seed=42)
+        second = FaultProfile(delay=faults.lognormal(mu=-3, sigma=1), seed=42)
+
+        self.assertEqual([first._next_delay() for _ in range(10)], [second._next_delay() for _ in range(10)])
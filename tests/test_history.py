@@ -0,0 +1,109 @@
+import asyncio
+import logging
+import unittest
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HistoryLimits, HttpRequestRecorder, RecordedRequest, RequestHistory
+from http_request_recorder.http_request_recorder import DEFAULT_EXPECTATION_HISTORY
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+def recorded(path: str, body: bytes) -> RecordedRequest:
+    request = RecordedRequest()
+    request.method = "POST"
+    request.path = path
+    request.body = body
+    request.headers = {"Content-Type": "text/plain", "X-Secret": "dropped"}
+    return request
+
+
+class TestRequestHistory(unittest.TestCase):
+    def test_evicts_oldest_beyond_max_count(self) -> None:
+        history = RequestHistory(HistoryLimits(max_count=2))
+
+        for i in range(5):
+            history.append(recorded(f"/{i}", b''))
+
+        self.assertEqual(["/3", "/4"], [request.path for request in history])
+        self.assertEqual(3, history.evicted)
+
+    def test_evicts_oldest_beyond_max_bytes(self) -> None:
+        history = RequestHistory(HistoryLimits(max_bytes=10))
+
+        for i in range(4):
+            history.append(recorded(f"/{i}", b'1234'))
+
+        self.assertEqual(["/2", "/3"], [request.path for request in history])
+        self.assertEqual(8, history.retained_bytes)
+        self.assertEqual(2, history.evicted)
+
+    def test_keeps_metadata_beyond_max_bytes(self) -> None:
+        history = RequestHistory(HistoryLimits(max_bytes=10, metadata_only_over_budget=True))
+
+        for i in range(4):
+            history.append(recorded(f"/{i}", b'1234'))
+
+        self.assertEqual(["/0", "/1", "/2", "/3"], [request.path for request in history])
+        self.assertEqual(0, history.evicted)
+        self.assertEqual(2, history.reduced_to_metadata)
+        self.assertEqual(8, history.retained_bytes)
+
+        reduced = history[0]
+        self.assertFalse(reduced.stored_body.is_retained)
+        self.assertEqual(4, reduced.stored_body.size)
+        self.assertEqual({"Content-Type": "text/plain"}, reduced.headers)
+        self.assertEqual(b'1234', history[3].body)
+
+
+class TestRecorderHistory(unittest.IsolatedAsyncioTestCase):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.port = 18080
+
+    async def test_unexpected_requests_are_bounded(self) -> None:
+        async with (HttpRequestRecorder(name="forgetful recorder", port=self.port, history=HistoryLimits(max_count=3)) as recorder,
+                    ClientSession() as http_session):
+            expectation = recorder.expect_path("/expected", ["response"] * 5)
+
+            for i in range(5):
+                await http_session.get(f"http://localhost:{self.port}/unexpected/{i}")
+                await http_session.get(f"http://localhost:{self.port}/expected")
+
+            self.assertEqual(["/unexpected/2", "/unexpected/3", "/unexpected/4"], [request.path for request in recorder.unexpected_requests()])
+            self.assertEqual(2, recorder.unexpected_request_history.evicted)
+            self.assertEqual(3, len(expectation.history))
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+    async def test_infinite_expectations_are_bounded_by_default(self) -> None:
+        async with HttpRequestRecorder(name="default recorder") as recorder:
+            expectation = recorder.expect_path("/forever", lambda request: "again")
+
+            self.assertIs(DEFAULT_EXPECTATION_HISTORY, expectation.history.limits)
+            self.assertIsNotNone(DEFAULT_EXPECTATION_HISTORY.max_count)
+
+    async def test_finite_expectations_keep_all_requests(self) -> None:
+        async with HttpRequestRecorder(name="default recorder") as recorder:
+            expectation = recorder.expect_path("/a", ["response"] * 10_001)
+            for _ in range(10_001):
+                await expectation.record_once(RecordedRequest())
+
+            self.assertEqual(b'', await expectation.wait())
+            self.assertEqual(0, expectation.history.evicted)
+
+    async def test_requests_only_wake_waiters_of_their_expectation(self) -> None:
+        async with (HttpRequestRecorder(name="waking recorder") as recorder,
+                    ClientSession() as http_session):
+            first, second = recorder.expect_path("/first"), recorder.expect_path("/second")
+            waiting = [asyncio.create_task(first.wait()), asyncio.create_task(second.wait())]
+            await asyncio.sleep(0)
+            second_event = second._signal._event
+
+            await http_session.get(f"{recorder.base_url}/first")
+            await waiting[0]
+
+            self.assertIs(second_event, second._signal._event)
+            self.assertEqual(1, second._signal.waiters)
+            await http_session.get(f"{recorder.base_url}/second")
+            await waiting[1]
@@ -1,11 +1,11 @@
 import asyncio
 import logging
 import unittest
-from typing import Generator
+from typing import AsyncGenerator, Generator
 
 from aiohttp import web, ClientSession
 
-from http_request_recorder import HttpRequestRecorder
+from http_request_recorder import HttpRequestRecorder, RecordedRequest, StreamedResponse
 
 logging.basicConfig(encoding='utf-8', level=logging.INFO)
 
@@ -20,7 +20,7 @@ logging.basicConfig(encoding='utf-8', level=logging.INFO)
 # - [x] loggen von nicht eintreten von erwarteten requests (timeout) (level=WARN)
 # - [x] Matchen auf Request.Body
 # - [x] Warnen, wenn mehrere Matcher passen
-# - [] .wait_for_all() statt alles einzeln awaiten
+# - [x] .wait_for_all() statt alles einzeln awaiten
 # - [] Wo schneiden zwischen bytes (TCP/HTTP) und string (python)? (Wahrscheinlich überall bytes -für raw http?)
 
 
@@ -168,6 +168,22 @@ class TestHttpRequestRecorder(unittest.IsolatedAsyncioTestCase):
             self.assertEqual("/called", unexpected_requests[0].path)
             self.assertEqual("GET", unexpected_requests[0].method)
 
+    async def test_large_body_is_recorded_and_logged_briefly(self) -> None:
+        large_body = b'<methodCall>' + b'x' * 500_000 + b'<methodName>late_method</methodName></methodCall>'
+
+        with self.assertLogs("recorder", level=logging.INFO) as log_recorder:
+            async with (HttpRequestRecorder(name="large body recorder", port=self.port) as recorder,
+                        ClientSession() as http_session):
+                expectation = recorder.expect_path("/upload", "stored")
+
+                await http_session.post(f"http://localhost:{self.port}/upload", data=large_body)
+
+                self.assertEqual(large_body, await expectation.wait())
+
+        self.assertEqual(1, len(log_recorder.output))
+        self.assertNotIn("late_method", log_recorder.output[0])
+        self.assertIn("/upload", log_recorder.output[0])
+
     async def test_should_handle_late_request(self) -> None:
         async with HttpRequestRecorder(name="patient recorder", port=self.port) as recorder, ClientSession() as http_session:
             expectation = recorder.expect_path(
@@ -183,6 +199,41 @@ class TestHttpRequestRecorder(unittest.IsolatedAsyncioTestCase):
 
             self.assertIn(b'late_data', recorded_request)
 
+    async def test_wait_for_all(self) -> None:
+        async with HttpRequestRecorder(name="batch-waiting recorder", port=self.port) as recorder, ClientSession() as http_session:
+            single = recorder.expect_path('/single', responses="response")
+            multiple = recorder.expect_path('/multiple', responses=["first", "second"])
+            recorder.expect_path('/infinite', responses=iter(lambda: "again", None))
+
+            async def late_requests() -> None:
+                await asyncio.sleep(0.1)
+                await http_session.post(f"http://localhost:{self.port}/multiple", data='m1')
+                await http_session.post(f"http://localhost:{self.port}/single", data='s1')
+                await http_session.post(f"http://localhost:{self.port}/multiple", data='m2')
+
+            recorded, _ = await asyncio.gather(recorder.wait_for_all(), late_requests())
+
+            self.assertEqual({single: [b's1'], multiple: [b'm1', b'm2']}, recorded)
+
+    async def test_wait_for_reports_all_missing_requests(self) -> None:
+        async with HttpRequestRecorder(name="batch-waiting recorder", port=self.port) as recorder, ClientSession() as http_session:
+            first = recorder.expect_path('/first', responses=["a", "b"])
+            second = recorder.expect_path('/second', responses="c")
+            third = recorder.expect_path('/third', responses="d")
+
+            await http_session.get(f"http://localhost:{self.port}/first")
+            await http_session.get(f"http://localhost:{self.port}/third")
+
+            with self.assertRaises(TimeoutError) as raised:
+                await recorder.wait_for(first, second, third, timeout=0.2)
+
+            self.assertIn("'/first'> (1 of 2 requests missing)", str(raised.exception))
+            self.assertIn("'/second'> (1 of 1 requests missing)", str(raised.exception))
+            self.assertNotIn("/third", str(raised.exception))
+
+            await http_session.get(f"http://localhost:{self.port}/first")
+            await http_session.get(f"http://localhost:{self.port}/second")
+
     # TODO: re-enable and define assertion(s)
     async def disabled_test_timeout_on_unrequested_expected_request(self) -> None:
         async with HttpRequestRecorder(name="disappointed recorder", port=self.port) as recorder:
@@ -263,11 +314,77 @@ class TestHttpRequestRecorder(unittest.IsolatedAsyncioTestCase):
                     while True:
                         yield b'on and on...'
 
-                recorder.expect_path("/", infinite_responses())
+                expectation = recorder.expect_path("/", infinite_responses())
 
                 for _ in range(10):
                     await http_session.post(f"http://localhost:{self.port}/")
 
+                for _ in range(10):
+                    self.assertEqual(b'', await expectation.wait())
+
+    async def test_finite_generator_of_responses(self) -> None:
+        async with (HttpRequestRecorder(name="generator recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/", (f"response {i}" for i in range(2)))
+
+            statuses = [(await http_session.get(f"http://localhost:{self.port}/")).status for _ in range(3)]
+
+            self.assertEqual([200, 200, 404], statuses)
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+    async def test_responds_from_async_generator_to_concurrent_requests(self) -> None:
+        async with (HttpRequestRecorder(name="async generator recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            async def slow_responses() -> AsyncGenerator[str, None]:
+                for i in range(10):
+                    await asyncio.sleep(0.01)
+                    yield f"response {i}"
+
+            expectation = recorder.expect_path("/", slow_responses())
+
+            responses = await asyncio.gather(*(http_session.post(f"http://localhost:{self.port}/", data=f"{i}") for i in range(11)))
+            bodies = [await response.read() for response in responses if response.status == 200]
+
+            self.assertEqual(10, len(bodies))
+            self.assertEqual({f"response {i}".encode() for i in range(10)}, set(bodies))
+            self.assertEqual([404], [response.status for response in responses if response.status != 200])
+
+            recorded = await recorder.wait_for(expectation)
+            self.assertEqual({str(i).encode() for i in range(11)} - {recorder.unexpected_requests()[0].body}, set(recorded[expectation]))
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+    async def test_dynamic_responses(self) -> None:
+        async with (HttpRequestRecorder(name="echoing recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/echo", lambda request: b'echo: ' + request.body)
+            recorder.expect_path("/sequence", ["static", lambda request: f"dynamic for {request.method}"])
+
+            echo_response = await http_session.post(f"http://localhost:{self.port}/echo", data="hello")
+            static_response = await http_session.get(f"http://localhost:{self.port}/sequence")
+            dynamic_response = await http_session.get(f"http://localhost:{self.port}/sequence")
+
+            self.assertEqual(b'echo: hello', await echo_response.read())
+            self.assertEqual(b'static', await static_response.read())
+            self.assertEqual(b'dynamic for GET', await dynamic_response.read())
+
+    async def test_slow_async_response_does_not_block_other_requests(self) -> None:
+        async with (HttpRequestRecorder(name="slow recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            async def respond(request: RecordedRequest) -> web.Response:
+                await asyncio.sleep(float(request.body))
+                return web.Response(status=201, text=f"slept {request.body.decode()}")
+
+            recorder.expect_path("/sleep", respond)
+            finished: list[str] = []
+
+            async def sleep_request(seconds: str) -> None:
+                response = await http_session.post(f"http://localhost:{self.port}/sleep", data=seconds)
+                finished.append(await response.text())
+
+            await asyncio.gather(sleep_request("0.3"), sleep_request("0.01"))
+
+            self.assertEqual(["slept 0.01", "slept 0.3"], finished)
+
     async def test_matches_on_headers(self) -> None:
         async with (HttpRequestRecorder(name="header-sensitive recorder", port=self.port) as recorder,
                     ClientSession() as http_session):
@@ -285,6 +402,100 @@ class TestHttpRequestRecorder(unittest.IsolatedAsyncioTestCase):
             recorded_foo_request = await foo_expect.wait()
             self.assertEqual(recorded_foo_request, b'foo-data')
 
+    async def test_expect_path_with_method(self) -> None:
+        async with (HttpRequestRecorder(name="method-sensitive recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            put_expectation = recorder.expect_path("/resource", "put-response", method="put")
+            recorder.expect_path("/resource", "post-response", method="POST")
+
+            put_response = await http_session.put(f"http://localhost:{self.port}/resource", data="put-data")
+            post_response = await http_session.post(f"http://localhost:{self.port}/resource")
+            get_response = await http_session.get(f"http://localhost:{self.port}/resource")
+
+            self.assertEqual(b"put-response", await put_response.read())
+            self.assertEqual(b"post-response", await post_response.read())
+            self.assertEqual(404, get_response.status)
+            self.assertEqual(b"put-data", await put_expectation.wait())
+
+    async def test_all_methods_are_recorded(self) -> None:
+        async with (HttpRequestRecorder(name="method-sensitive recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            patch_expectation = recorder.expect_path("/resource", "patched", method="PATCH")
+            purge_expectation = recorder.expect_path("/resource", "purged", method="PURGE")
+
+            patch_response = await http_session.patch(f"http://localhost:{self.port}/resource", data="patch-data")
+            purge_response = await http_session.request("PURGE", f"http://localhost:{self.port}/resource")
+
+            self.assertEqual(b"patched", await patch_response.read())
+            self.assertEqual(b"purged", await purge_response.read())
+            self.assertEqual(b"patch-data", await patch_expectation.wait())
+            self.assertEqual("PURGE", (await purge_expectation.wait_for_request()).method)
+
+    async def test_head_is_answered_like_get_without_body(self) -> None:
+        produced: list[bytes] = []
+
+        def chunks() -> Generator[bytes, None, None]:
+            for chunk in (b'streamed ', b'body'):
+                produced.append(chunk)
+                yield chunk
+
+        computed: list[RecordedRequest] = []
+
+        def compute(request: RecordedRequest) -> web.Response:
+            computed.append(request)
+            return web.Response(status=201, text="computed")
+
+        async def generated() -> AsyncGenerator[str, None]:
+            yield "generated"
+
+        async with (HttpRequestRecorder(name="head recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            get_expectation = recorder.expect_path("/document", "document body", method="GET")
+            recorder.expect_path("/computed", compute, method="GET")
+            generated_expectation = recorder.expect_path("/generated", generated(), method="GET")
+            recorder.expect_path("/stream", StreamedResponse(chunks), method="GET")
+            head_expectation = recorder.expect_path("/status", "", method="HEAD")
+
+            head_response = await http_session.head(f"http://localhost:{self.port}/document")
+            get_response = await http_session.get(f"http://localhost:{self.port}/document")
+            streamed_head_response = await http_session.head(f"http://localhost:{self.port}/stream")
+            status_response = await http_session.head(f"http://localhost:{self.port}/status")
+            computed_head_response = await http_session.head(f"http://localhost:{self.port}/computed")
+            generated_head_response = await http_session.head(f"http://localhost:{self.port}/generated")
+            generated_response = await http_session.get(f"http://localhost:{self.port}/generated")
+
+            self.assertEqual(200, head_response.status)
+            self.assertEqual("13", head_response.headers["Content-Length"])
+            self.assertEqual(b"", await head_response.read())
+            self.assertEqual(b"document body", await get_response.read())
+            # the HEAD request neither used up the only response nor counts as one of the GET requests
+            self.assertEqual(["GET"], [request.method for request in get_expectation.history])
+            self.assertEqual(["HEAD"], [request.method for request in get_expectation.head_history])
+            self.assertFalse(get_expectation.is_still_expecting_requests())
+
+            self.assertEqual(200, streamed_head_response.status)
+            self.assertEqual([], produced)
+            self.assertEqual(200, status_response.status)
+            self.assertEqual("HEAD", (await head_expectation.wait_for_request()).method)
+            # computed and generated responses are produced to answer with their status and headers
+            self.assertEqual((201, "8"), (computed_head_response.status, computed_head_response.headers["Content-Length"]))
+            self.assertEqual(["HEAD"], [request.method for request in computed])
+            self.assertEqual("9", generated_head_response.headers["Content-Length"])
+            self.assertEqual(b"generated", await generated_response.read())
+            self.assertEqual(["GET"], [request.method for request in generated_expectation.history])
+
+    async def test_exhausted_expectation_no_longer_matches(self) -> None:
+        async with (HttpRequestRecorder(name="exhausted recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/once", "only once")
+
+            first_response = await http_session.get(f"http://localhost:{self.port}/once")
+            second_response = await http_session.get(f"http://localhost:{self.port}/once")
+
+            self.assertEqual(200, first_response.status)
+            self.assertEqual(404, second_response.status)
+            self.assertEqual(["/once"], [request.path for request in recorder.unexpected_requests()])
+
     # aiohttp (< 3.10.2) has buggy behavior when dealing with http2 upgrade requests.
     # This was fixed in https://github.com/aio-libs/aiohttp/pull/8252 which according
     # to release notes is included in 3.9.4. However, first working version is 3.10.2.
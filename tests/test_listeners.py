@@ -0,0 +1,53 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from aiohttp import ClientSession, UnixConnector
+
+from http_request_recorder import HttpRequestRecorder, RecorderServer, TcpListener, UnixListener
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestListeners(unittest.IsolatedAsyncioTestCase):
+    async def test_ephemeral_ports(self) -> None:
+        async with (HttpRequestRecorder(name="first recorder", port=0) as first,
+                    HttpRequestRecorder(name="second recorder") as second,
+                    ClientSession() as http_session):
+            first.expect_path("/", "first")
+            second.expect_path("/", "second")
+
+            self.assertNotEqual(0, first.port)
+            self.assertNotEqual(first.port, second.port)
+            self.assertEqual(f"http://localhost:{first.port}", first.base_url)
+            self.assertIn(str(second.port), repr(second))
+
+            self.assertEqual(b'first', await (await http_session.get(f"{first.base_url}/")).read())
+            self.assertEqual(b'second', await (await http_session.get(f"{second.base_url}/")).read())
+
+    async def test_multiple_listeners(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(directory, "recorder.sock")
+
+            async with HttpRequestRecorder(name="multi-listener recorder", listeners=[TcpListener(host='::1'), UnixListener(socket_path)]) as recorder:
+                expectation = recorder.expect_path("/", ["ipv4", "ipv6", "unix"])
+
+                self.assertEqual(3, len(recorder.addresses))
+                ipv6_port = recorder.addresses[1][1]
+
+                async with ClientSession() as http_session:
+                    self.assertEqual(b'ipv4', await (await http_session.get(f"{recorder.base_url}/")).read())
+                    self.assertEqual(b'ipv6', await (await http_session.get(f"http://[::1]:{ipv6_port}/")).read())
+                async with ClientSession(connector=UnixConnector(path=socket_path)) as unix_session:
+                    self.assertEqual(b'unix', await (await unix_session.get("http://recorder/")).read())
+
+                await recorder.wait_for(expectation)
+
+    async def test_server_with_ephemeral_port(self) -> None:
+        async with RecorderServer() as server, ClientSession() as http_session:
+            async with server.session("ephemeral session") as recorder:
+                recorder.expect_path("/", "found")
+
+                self.assertNotIn(":0", recorder.base_url)
+                self.assertEqual(b'found', await (await http_session.get(f"{recorder.base_url}/", headers=recorder.headers)).read())
@@ -0,0 +1,118 @@
+import logging
+import re
+import unittest
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HttpRequestRecorder, RecordedRequest
+from http_request_recorder import matchers as m
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+def recorded(method: str = "GET", path: str = "/", body: bytes = b'', headers: dict[str, str] | None = None, query_string: str = "") -> RecordedRequest:
+    request = RecordedRequest()
+    request.method = method
+    request.path = path
+    request.body = body
+    request.headers = headers or {}
+    request.query_string = query_string
+    return request
+
+
+class TestMatchers(unittest.TestCase):
+    def test_path_matchers(self) -> None:
+        request = recorded(path="/users/42/avatar")
+
+        self.assertTrue(m.path("/users/42/avatar")(request))
+        self.assertFalse(m.path("/users/42")(request))
+        self.assertTrue(m.path_prefix("/users/")(request))
+        self.assertTrue(m.path_regex(r"/users/\d+/avatar")(request))
+        self.assertFalse(m.path_regex(r"/users/\d+")(request))
+        self.assertTrue(m.path_glob("/users/*/avatar")(request))
+        self.assertFalse(m.path_glob("/groups/*")(request))
+
+    def test_incomplete_matchers_cannot_be_created(self) -> None:
+        class Incomplete(m.Matcher):
+            pass
+
+        with self.assertRaises(TypeError):
+            Incomplete()  # type: ignore[abstract]
+
+    def test_method_and_headers(self) -> None:
+        request = recorded(method="POST", headers={"Content-Type": "application/json", "X-Trace": "abc-123"})
+
+        self.assertTrue(m.method("post", "put")(request))
+        self.assertFalse(m.method("GET")(request))
+        self.assertTrue(m.header("content-type")(request))
+        self.assertTrue(m.header("CONTENT-TYPE", "application/json")(request))
+        self.assertTrue(m.header("x-trace", re.compile(r"abc-\d+"))(request))
+        self.assertFalse(m.header("authorization")(request))
+
+    def test_query_params(self) -> None:
+        request = recorded(query_string="page=2&tag=a&tag=b&empty=")
+
+        self.assertTrue(m.query_param("page", "2")(request))
+        self.assertTrue(m.query_param("tag", "b")(request))
+        self.assertTrue(m.query_param("empty")(request))
+        self.assertFalse(m.query_param("page", "3")(request))
+        self.assertFalse(m.query_param("missing")(request))
+
+    def test_body_fields(self) -> None:
+        json_request = recorded(body=b'{"method": "create", "params": [{"name": "alice"}], "nothing": null}')
+        xml_request = recorded(body=b'<methodCall><methodName>any_method</methodName><params/></methodCall>')
+
+        self.assertTrue(m.json_field("method", "create")(json_request))
+        self.assertTrue(m.json_field("params.0.name", "alice")(json_request))
+        self.assertTrue(m.json_field("nothing", None)(json_request))
+        self.assertFalse(m.json_field("params.1")(json_request))
+        self.assertFalse(m.json_field("method")(xml_request))
+
+        self.assertTrue(m.xml_field("/methodCall/methodName", "any_method")(xml_request))
+        self.assertTrue(m.xml_field("//methodName")(xml_request))
+        self.assertFalse(m.xml_field("/methodResponse/methodName")(xml_request))
+        self.assertFalse(m.xml_field("//methodName")(json_request))
+
+    def test_composition(self) -> None:
+        request = recorded(method="DELETE", path="/items/1")
+
+        self.assertTrue((m.path_prefix("/items") & m.method("DELETE"))(request))
+        self.assertFalse((m.path_prefix("/items") & m.method("GET"))(request))
+        self.assertTrue((m.method("GET") | m.path("/items/1"))(request))
+        self.assertTrue((~m.method("GET"))(request))
+
+
+class TestMatchersInRecorder(unittest.IsolatedAsyncioTestCase):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.port = 18080
+
+    async def test_declarative_matchers_select_expectation(self) -> None:
+        async with (HttpRequestRecorder(name="declarative recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            create = recorder.expect(m.path("/users") & m.method("POST") & m.json_field("name", "alice"), responses="created")
+            search = recorder.expect(m.path_prefix("/users") & m.query_param("q"), responses="found")
+            recorder.expect(lambda request: request.path == "/custom", responses="custom")
+
+            create_response = await http_session.post(f"http://localhost:{self.port}/users", json={"name": "alice"})
+            search_response = await http_session.get(f"http://localhost:{self.port}/users/search?q=bob")
+            custom_response = await http_session.get(f"http://localhost:{self.port}/custom")
+            unexpected_response = await http_session.post(f"http://localhost:{self.port}/users", json={"name": "bob"})
+
+            self.assertEqual(b"created", await create_response.read())
+            self.assertEqual(b"found", await search_response.read())
+            self.assertEqual(b"custom", await custom_response.read())
+            self.assertEqual(404, unexpected_response.status)
+
+            self.assertEqual(b'{"name": "alice"}', await create.wait())
+            self.assertEqual(b'', await search.wait())
+            self.assertIn("/users", search.name or "")
+
+    async def test_ignore_case_regex_is_dispatched(self) -> None:
+        async with (HttpRequestRecorder(name="declarative recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect(m.path_regex(re.compile('/Users/.*', re.I)), responses="user")
+
+            response = await http_session.get(f"http://localhost:{self.port}/users/1")
+
+            self.assertEqual(b"user", await response.read())
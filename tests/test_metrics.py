@@ -0,0 +1,85 @@
+import asyncio
+import logging
+import unittest
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HttpRequestRecorder, RecorderMetrics, matchers
+from http_request_recorder.metrics import Histogram
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestMetrics(unittest.IsolatedAsyncioTestCase):
+    async def test_request_handling_is_measured(self) -> None:
+        metrics = RecorderMetrics()
+
+        async with (HttpRequestRecorder(name="measured recorder", metrics=metrics) as recorder,
+                    ClientSession() as http_session):
+            first = recorder.expect(matchers.path("/first"), name="first")
+            recorder.expect(matchers.path("/second"), name="second")
+            waiting = asyncio.create_task(recorder.expect(matchers.path("/never"), name="never", timeout=1).wait())
+            await asyncio.sleep(0.05)
+
+            self.assertEqual(1, metrics.snapshot()['pending_waiters'])
+            self.assertEqual(3, metrics.snapshot()['active_expectations'])
+
+            await http_session.post(f"{recorder.base_url}/first", data=b'x' * 100)
+            await http_session.get(f"{recorder.base_url}/unknown")
+            await first.wait()
+
+            snapshot = metrics.snapshot()
+            self.assertEqual(2, snapshot['requests'])
+            self.assertEqual(1, snapshot['unexpected_requests'])
+            self.assertEqual(2, snapshot['body_read_seconds']['count'])
+            self.assertEqual(2, snapshot['matching_seconds']['count'])
+            self.assertEqual(1, snapshot['response_write_seconds']['count'])
+            self.assertEqual({"#0 first": 1}, snapshot['match_attempts'])
+            self.assertEqual(100, snapshot['retained_bytes'])
+
+            waiting.cancel()
+
+    async def test_prometheus_endpoint(self) -> None:
+        async with (HttpRequestRecorder(name="measured recorder", metrics=RecorderMetrics(endpoint=True)) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect(matchers.path("/path"), name='say "hi"')
+            await http_session.get(f"{recorder.base_url}/path")
+
+            response = await http_session.get(f"{recorder.base_url}/__recorder/metrics")
+            text = await response.text()
+
+            self.assertEqual("text/plain", response.content_type)
+            self.assertIn("recorder_requests_total 1\n", text)
+            self.assertIn('recorder_match_attempts_total{expectation="#0 say \\"hi\\""} 1\n', text)
+            self.assertIn('recorder_matcher_seconds_bucket{expectation="#0 say \\"hi\\"",le="+Inf"} 1\n', text)
+            self.assertIn('recorder_body_read_seconds_bucket{le="+Inf"} 1\n', text)
+            self.assertIn("# TYPE recorder_pending_waiters gauge\n", text)
+            self.assertEqual([], recorder.unexpected_requests())
+
+    async def test_expectation_series_are_bounded(self) -> None:
+        metrics = RecorderMetrics(max_expectations=2)
+
+        async with (HttpRequestRecorder(name="measured recorder", metrics=metrics) as recorder,
+                    ClientSession() as http_session):
+            for index in range(4):
+                recorder.expect(matchers.path(f"/{index}"), name="same name")
+                await http_session.get(f"{recorder.base_url}/{index}")
+
+            self.assertEqual({"#0 same name": 1, "#1 same name": 1, "other": 2}, metrics.snapshot()['match_attempts'])
+            self.assertEqual(4, sum(histogram['count'] for histogram in metrics.snapshot()['matcher_seconds'].values()))
+
+    async def test_metrics_are_off_by_default(self) -> None:
+        async with (HttpRequestRecorder(name="unmeasured recorder") as recorder,
+                    ClientSession() as http_session):
+            response = await http_session.get(f"{recorder.base_url}/__recorder/metrics")
+
+            self.assertEqual(404, response.status)
+            self.assertIsNone(recorder.metrics)
+
+    def test_histogram_buckets_are_cumulative(self) -> None:
+        histogram = Histogram([0.1, 1])
+        for value in (0.05, 0.1, 0.5, 5):
+            histogram.observe(value)
+
+        self.assertEqual([(0.1, 2), (1, 3), (float('inf'), 4)], histogram.cumulative())
+        self.assertAlmostEqual(5.65, histogram.sum)
@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import tempfile
+import unittest
+from collections.abc import AsyncIterator
+from pathlib import Path
+
+from aiohttp import ClientError, ClientSession, web
+
+from http_request_recorder import BodyStoragePolicy, FaultProfile, MultiProcessHttpRequestRecorder, StreamedResponse
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestMultiProcessHttpRequestRecorder(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_are_recorded_in_the_controlling_process(self) -> None:
+        async with (MultiProcessHttpRequestRecorder(name="multi-process recorder", workers=2) as recorder,
+                    ClientSession() as http_session):
+            expectation = recorder.expect_path("/path", [f"response {i}" for i in range(20)], method='POST')
+
+            responses = await asyncio.gather(*(http_session.post(f"{recorder.base_url}/path?query=value", data=f"request {i}") for i in range(20)))
+            unexpected_response = await http_session.get(f"{recorder.base_url}/unknown")
+
+            self.assertEqual({f"response {i}".encode() for i in range(20)}, {await response.read() for response in responses})
+            self.assertEqual(404, unexpected_response.status)
+            self.assertEqual(["/unknown"], [request.path for request in recorder.unexpected_requests()])
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+            recorded = await recorder.wait_for(expectation, count=20)
+            self.assertEqual({f"request {i}".encode() for i in range(20)}, set(recorded[expectation]))
+            self.assertEqual({"query=value"}, {request.query_string for request in expectation.history})
+
+    async def test_no_task_outlives_the_recorder(self) -> None:
+        async def never_answered(request: object) -> str:
+            await asyncio.sleep(60)
+            return "too late"
+
+        async with ClientSession() as http_session:
+            async with MultiProcessHttpRequestRecorder(name="multi-process recorder", workers=1) as recorder:
+                expectation = recorder.expect_path("/slow", never_answered)
+                request = asyncio.create_task(http_session.get(f"{recorder.base_url}/slow"))
+                await expectation.wait()
+
+            self.assertEqual({asyncio.current_task()}, asyncio.all_tasks() - {request})
+            request.cancel()
+
+    async def test_responses_are_forwarded_to_workers(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            file = Path(directory) / "response.json"
+            file.write_bytes(b'{"from": "file"}')
+
+            async with (MultiProcessHttpRequestRecorder(name="multi-process recorder", workers=1) as recorder,
+                        ClientSession() as http_session):
+                recorder.expect_path("/native", web.json_response({"native": True}, status=201))
+                recorder.expect_path("/streamed", StreamedResponse([b'chunk 1, ', b'chunk 2'], headers={"X-Streamed": "yes"}))
+                recorder.expect_path("/file", file)
+                recorder.expect_path("/dynamic", lambda request: request.path.upper())
+                recorder.expect_path("/reset", iter(lambda: "never seen", None), faults=FaultProfile(reset_probability=1))
+
+                native = await http_session.get(f"{recorder.base_url}/native")
+                self.assertEqual(201, native.status)
+                self.assertEqual({"native": True}, await native.json())
+
+                streamed = await http_session.get(f"{recorder.base_url}/streamed")
+                self.assertEqual(b'chunk 1, chunk 2', await streamed.read())
+                self.assertEqual("yes", streamed.headers["X-Streamed"])
+
+                from_file = await http_session.get(f"{recorder.base_url}/file")
+                self.assertEqual("application/json", from_file.content_type)
+                self.assertEqual(b'{"from": "file"}', await from_file.read())
+
+                self.assertEqual(b'/DYNAMIC', await (await http_session.get(f"{recorder.base_url}/dynamic")).read())
+
+                with self.assertRaises(ClientError):
+                    await http_session.post(f"{recorder.base_url}/reset")
+
+    async def test_bodies_are_streamed_between_processes(self) -> None:
+        async def slow_chunks() -> AsyncIterator[bytes]:
+            for i in range(3):
+                await asyncio.sleep(0.01)
+                yield f"chunk {i};".encode()
+
+        with tempfile.TemporaryDirectory() as directory:
+            async with (MultiProcessHttpRequestRecorder(name="multi-process recorder", workers=1,
+                                                        body_storage=BodyStoragePolicy(max_in_memory=1024, directory=directory)) as recorder,
+                        ClientSession() as http_session):
+                upload = recorder.expect_path("/upload", "stored", method="POST")
+                recorder.expect_path("/streamed", StreamedResponse(slow_chunks))
+
+                self.assertEqual(b'stored', await (await http_session.post(f"{recorder.base_url}/upload", data=b'x' * 100_000)).read())
+                streamed = await http_session.get(f"{recorder.base_url}/streamed")
+                self.assertEqual(b'chunk 0;chunk 1;chunk 2;', await streamed.read())
+                self.assertEqual("chunked", streamed.headers["Transfer-Encoding"])
+
+                stored_body = (await upload.wait_for_request()).stored_body
+                self.assertEqual("<RecordedBody 100000 bytes in file>", repr(stored_body))
+                self.assertEqual(b'x' * 100_000, bytes(stored_body))
+                # the file the worker spilled the body to now belongs to the recorder's process
+                self.assertEqual(1, len(list(Path(directory).iterdir())))
@@ -0,0 +1,105 @@
+import logging
+import os
+import tempfile
+import unittest
+
+from aiohttp import ClientSession, web
+
+from http_request_recorder import BodyStoragePolicy, CaptureLog, HttpRequestRecorder, Upstream, load_capture, matchers
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestProxy(unittest.IsolatedAsyncioTestCase):
+    async def test_unmatched_requests_are_forwarded(self) -> None:
+        async with HttpRequestRecorder(name="real service") as service:
+            service.expect(matchers.path("/users") & matchers.method("POST") & matchers.query_param("notify", "yes"),
+                           web.Response(status=201, body=b'{"id": 1}', headers={"Location": "/users/1"}, content_type="application/json"))
+            service.expect_path("/big", b'x' * 300_000)
+
+            upstream = Upstream(service.base_url, body_storage=BodyStoragePolicy(max_in_memory=1024, overflow='digest'))
+            async with (HttpRequestRecorder(name="gateway", upstream=upstream) as gateway,
+                        ClientSession() as http_session):
+                stubbed = gateway.expect_path("/stubbed", "from the gateway")
+
+                created = await http_session.post(f"{gateway.base_url}/users?notify=yes", data=b'{"name": "alice"}',
+                                                  headers={"Content-Type": "application/json", "X-Trace": "abc"})
+                big = await http_session.get(f"{gateway.base_url}/big")
+                stub = await http_session.get(f"{gateway.base_url}/stubbed")
+                missing = await http_session.get(f"{gateway.base_url}/missing")
+
+                self.assertEqual(201, created.status)
+                self.assertEqual({"id": 1}, await created.json())
+                self.assertEqual("/users/1", created.headers["Location"])
+                self.assertEqual(300_000, len(await big.read()))
+                self.assertEqual("from the gateway", await stub.text())
+                self.assertEqual(404, missing.status)
+
+                self.assertEqual(b"", await stubbed.wait())
+                self.assertEqual([], gateway.unexpected_requests())
+                self.assertEqual(["/users", "/big", "/missing"], [exchange.request.path for exchange in upstream.exchanges])
+                self.assertEqual([201, 200, 404], [exchange.status for exchange in upstream.exchanges])
+                self.assertEqual(b'{"id": 1}', bytes(upstream.exchanges[0].body))
+                self.assertEqual(300_000, upstream.exchanges[1].body.size)
+                self.assertFalse(upstream.exchanges[1].body.is_retained)
+
+            self.assertEqual(["/missing"], [request.path for request in service.unexpected_requests()])
+
+    async def test_forwarded_requests_reach_the_upstream_unchanged(self) -> None:
+        async with HttpRequestRecorder(name="real service") as service:
+            users = service.expect_path("/users", "ok")
+
+            async with (HttpRequestRecorder(name="gateway", upstream=service.base_url) as gateway,
+                        ClientSession() as http_session):
+                await http_session.post(f"{gateway.base_url}/users?notify=yes", data=b'{"name": "alice"}',
+                                        headers={"Content-Type": "application/json", "X-Trace": "abc"})
+
+            request = await users.wait_for_request()
+            self.assertEqual(b'{"name": "alice"}', request.body)
+            self.assertEqual("notify=yes", request.query_string)
+            self.assertEqual("application/json", request.headers["Content-Type"])
+            self.assertEqual("abc", request.headers["X-Trace"])
+
+    async def test_failing_upstream(self) -> None:
+        async with HttpRequestRecorder(name="real service") as service:
+            unreachable = service.base_url
+        async with (HttpRequestRecorder(name="gateway", upstream=unreachable) as gateway,
+                    ClientSession() as http_session):
+            response = await http_session.get(f"{gateway.base_url}/anything")
+
+            self.assertEqual(502, response.status)
+
+    async def test_forwarded_traffic_is_captured_for_replay(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic.jsonl")
+            async with HttpRequestRecorder(name="real service") as service:
+                service.expect_path("/price", web.Response(status=200, text="42"))
+
+                async with (HttpRequestRecorder(name="gateway", upstream=service.base_url, capture=CaptureLog(path)) as gateway,
+                            ClientSession() as http_session):
+                    await http_session.get(f"{gateway.base_url}/price")
+
+            async with (HttpRequestRecorder(name="replayed service") as replayed,
+                        ClientSession() as http_session):
+                load_capture(replayed, path)
+                response = await http_session.get(f"{replayed.base_url}/price")
+
+                self.assertEqual("42", await response.text())
+
+    async def test_capture_is_complete_beyond_kept_exchanges(self) -> None:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "traffic.jsonl")
+            async with HttpRequestRecorder(name="real service") as service:
+                service.expect_path("/price", iter(lambda: "42", None))
+                upstream = Upstream(service.base_url, max_exchanges=2)
+
+                async with (HttpRequestRecorder(name="gateway", upstream=upstream, capture=CaptureLog(path)) as gateway,
+                            ClientSession() as http_session):
+                    for _ in range(5):
+                        await http_session.get(f"{gateway.base_url}/price")
+
+            with open(path, 'rb') as file:
+                captured = [line for line in file if b'"method"' in line]
+
+            self.assertEqual(2, len(upstream.exchanges))
+            self.assertEqual(5, len(captured))
@@ -0,0 +1,67 @@
+import logging
+import unittest
+
+from aiohttp import ClientSession, HttpVersion11
+from multidict import CIMultiDict
+
+from http_request_recorder import HttpRequestRecorder, RecordedRequest
+from http_request_recorder import matchers as m
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+def recorded(body: bytes = b'', query_string: str = "") -> RecordedRequest:
+    request = RecordedRequest()
+    request.body = body
+    request.query_string = query_string
+    return request
+
+
+class TestRecordedRequest(unittest.TestCase):
+    def test_is_slotted(self) -> None:
+        self.assertFalse(hasattr(RecordedRequest(), '__dict__'))
+
+    def test_parsed_views_are_memoized(self) -> None:
+        request = recorded(body=b'{"jsonrpc": "2.0", "method": "sum", "params": [1, 2]}', query_string="a=1&a=2")
+
+        self.assertIs(request.json(), request.json())
+        self.assertEqual([1, 2], request.json()["params"])
+        self.assertEqual(["1", "2"], request.query.getall("a"))
+        self.assertIs(request.query, request.query)
+        self.assertEqual("sum", request.rpc_method())
+        self.assertIsNone(request.xml())
+
+    def test_views_of_other_bodies(self) -> None:
+        form_request = recorded(body=b'name=alice&tag=a&tag=b')
+        xml_rpc_request = recorded(body=b'<methodCall><methodName>system.listMethods</methodName></methodCall>')
+
+        self.assertEqual(["a", "b"], form_request.form().getall("tag"))
+        self.assertIsNone(form_request.rpc_method())
+        with self.assertRaises(ValueError):
+            form_request.json()
+
+        self.assertEqual("system.listMethods", xml_rpc_request.rpc_method())
+        self.assertEqual("methodCall", getattr(xml_rpc_request.xml(), "tag", None))
+
+    def test_repeated_headers_are_kept(self) -> None:
+        request = RecordedRequest()
+        request.headers = CIMultiDict([("Accept", "text/html"), ("accept", "application/json")])
+
+        self.assertEqual(["text/html", "application/json"], request.raw_headers.getall("ACCEPT"))
+        self.assertEqual({"Accept": "text/html"}, request.headers)
+        self.assertTrue(m.header("accept", "application/json")(request))
+
+
+class TestRecordedRequestInRecorder(unittest.IsolatedAsyncioTestCase):
+    async def test_request_details_are_recorded(self) -> None:
+        async with (HttpRequestRecorder(name="detailed recorder") as recorder,
+                    ClientSession() as http_session):
+            expectation = recorder.expect(m.path("/details") & m.header("X-Tag", "second"))
+
+            await http_session.get(f"{recorder.base_url}/details?q=1", headers=CIMultiDict([("X-Tag", "first"), ("X-Tag", "second")]))
+            request = await expectation.wait_for_request()
+
+            self.assertEqual(["first", "second"], request.raw_headers.getall("x-tag"))
+            self.assertEqual("1", request.query["q"])
+            self.assertEqual(HttpVersion11, request.version)
+            self.assertEqual("127.0.0.1", request.remote)
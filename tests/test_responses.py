@@ -0,0 +1,60 @@
+import logging
+import os
+import tempfile
+import unittest
+from collections.abc import AsyncGenerator
+from pathlib import Path
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HttpRequestRecorder, StreamedResponse
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestResponses(unittest.IsolatedAsyncioTestCase):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.port = 18080
+
+    async def test_streamed_response(self) -> None:
+        async def chunks() -> AsyncGenerator[bytes, None]:
+            for i in range(100):
+                yield f"chunk {i}\n".encode()
+
+        async with (HttpRequestRecorder(name="streaming recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/stream", StreamedResponse(chunks, status=206, content_type="text/plain"))
+
+            response = await http_session.get(f"http://localhost:{self.port}/stream")
+
+            self.assertEqual(206, response.status)
+            self.assertEqual("chunked", response.headers["Transfer-Encoding"])
+            self.assertEqual("text/plain", response.content_type)
+            self.assertEqual("".join(f"chunk {i}\n" for i in range(100)).encode(), await response.read())
+
+    async def test_streamed_response_with_content_length(self) -> None:
+        async with (HttpRequestRecorder(name="streaming recorder", port=self.port) as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/stream", StreamedResponse([b'abc', b'def'], content_length=6))
+
+            response = await http_session.get(f"http://localhost:{self.port}/stream")
+
+            self.assertEqual("6", response.headers["Content-Length"])
+            self.assertEqual(b'abcdef', await response.read())
+
+    async def test_file_response(self) -> None:
+        content = os.urandom(2 * 1024 * 1024)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory, "download.bin")
+            path.write_bytes(content)
+
+            async with (HttpRequestRecorder(name="file-serving recorder", port=self.port) as recorder,
+                        ClientSession() as http_session):
+                recorder.expect_path("/download", path)
+
+                response = await http_session.get(f"http://localhost:{self.port}/download")
+
+                self.assertEqual(200, response.status)
+                self.assertEqual(str(len(content)), response.headers["Content-Length"])
+                self.assertEqual(content, await response.read())
@@ -1,7 +1,9 @@
+import asyncio
 import logging
 import unittest
+from xmlrpc.client import Fault, ServerProxy
 
-from http_request_recorder import HttpRequestRecorder
+from http_request_recorder import HttpRequestRecorder, RecorderMetrics, RpcError
 
 from aiohttp import ClientSession
 
@@ -68,3 +70,87 @@ class TestHttpRequestRecorder(unittest.IsolatedAsyncioTestCase):
 
             self.assertEqual(200, response.status)
             self.assertEqual(b"{}", await response.content.read())
+
+
+class TestRpcCalls(unittest.IsolatedAsyncioTestCase):
+    async def test_json_rpc_batch(self) -> None:
+        async with (HttpRequestRecorder(name="rpc recorder") as recorder,
+                    ClientSession() as http_session):
+            add = recorder.expect_json_rpc_call("add", lambda request: sum(request.json()["params"]), repeat=True)
+            fail = recorder.expect_json_rpc_call("fail", RpcError(-32000, "failed", data={"reason": "test"}))
+            notified = recorder.expect_json_rpc_call("notify")
+
+            response = await http_session.post(f"{recorder.base_url}/jsonrpc", json=[
+                {"jsonrpc": "2.0", "method": "add", "params": [1, 2], "id": 1},
+                {"jsonrpc": "2.0", "method": "fail", "id": "two"},
+                {"jsonrpc": "2.0", "method": "notify", "params": ["no id, no response"]},
+                {"jsonrpc": "2.0", "method": "subtract", "params": [3, 1], "id": 4},
+                {"jsonrpc": "2.0", "method": "add", "params": [3, 4], "id": 5},
+                "not a call",
+            ])
+
+            self.assertEqual(200, response.status)
+            self.assertEqual([
+                {"jsonrpc": "2.0", "result": 3, "id": 1},
+                {"jsonrpc": "2.0", "error": {"code": -32000, "message": "failed", "data": {"reason": "test"}}, "id": "two"},
+                {"jsonrpc": "2.0", "error": {"code": -32601, "message": "Method not found: subtract"}, "id": 4},
+                {"jsonrpc": "2.0", "result": 7, "id": 5},
+                {"jsonrpc": "2.0", "error": {"code": -32600, "message": "Invalid Request"}, "id": None},
+            ], await response.json())
+
+            await recorder.wait_for(add, count=2)
+            self.assertEqual([[1, 2], [3, 4]], [request.json()["params"] for request in add.history])
+            self.assertEqual({"jsonrpc": "2.0", "method": "fail", "id": "two"}, (await fail.wait_for_request()).json())
+            self.assertEqual(["no id, no response"], (await notified.wait_for_request()).json()["params"])
+            self.assertEqual(["subtract", None], [request.rpc_method() for request in recorder.unexpected_requests()])
+            self.assertEqual([], recorder.unsatisfied_expectations())
+
+    async def test_json_rpc_single_calls(self) -> None:
+        metrics = RecorderMetrics()
+        async with (HttpRequestRecorder(name="rpc recorder", metrics=metrics) as recorder,
+                    ClientSession() as http_session):
+            ping = recorder.expect_json_rpc_call("ping", "pong")
+            log = recorder.expect_json_rpc_call("log")
+
+            pong = await http_session.post(f"{recorder.base_url}/jsonrpc", json={"jsonrpc": "2.0", "method": "ping", "id": 1})
+            again = await http_session.post(f"{recorder.base_url}/jsonrpc", json={"jsonrpc": "2.0", "method": "ping", "id": 2})
+            notification = await http_session.post(f"{recorder.base_url}/jsonrpc", json={"jsonrpc": "2.0", "method": "log"})
+            unparsable = await http_session.post(f"{recorder.base_url}/jsonrpc", data=b'{"jsonrpc": ')
+
+            self.assertEqual({"jsonrpc": "2.0", "result": "pong", "id": 1}, await pong.json())
+            self.assertEqual(-32601, (await again.json())["error"]["code"])
+            self.assertEqual(204, notification.status)
+            self.assertEqual(-32700, (await unparsable.json())["error"]["code"])
+
+            with self.assertRaises(ValueError):
+                recorder.expect_xml_rpc_call("ping", path="/jsonrpc")
+            # the calls are kept in the histories of their expectations only, not by the endpoint as well
+            self.assertEqual((1, 1), (len(ping.history), len(log.history)))
+            kept = [*ping.history, *log.history, *recorder.unexpected_requests()]
+            self.assertEqual(sum(len(request.body) for request in kept), metrics.snapshot()['retained_bytes'])
+
+    async def test_deprecated_json_rpc_is_not_mixed_with_calls(self) -> None:
+        async with HttpRequestRecorder(name="rpc recorder") as recorder:
+            recorder.expect_json_rpc_call("ping", "pong")
+            with self.assertRaisesRegex(ValueError, "deprecated expect_json_rpc"):
+                recorder.expect_json_rpc(b"ping")
+
+        async with HttpRequestRecorder(name="rpc recorder") as recorder:
+            recorder.expect_json_rpc(b"ping")
+            with self.assertRaisesRegex(ValueError, "deprecated expect_json_rpc"):
+                recorder.expect_json_rpc_call("ping", "pong")
+
+    async def test_xml_rpc(self) -> None:
+        async with HttpRequestRecorder(name="rpc recorder") as recorder:
+            proxy = ServerProxy(f"{recorder.base_url}/RPC2")
+            lookup = recorder.expect_xml_rpc_call("users.lookup", {"id": 7, "name": "alice"})
+            recorder.expect_xml_rpc_call("users.delete", RpcError(4, "not allowed"))
+
+            self.assertEqual({"id": 7, "name": "alice"}, await asyncio.to_thread(proxy.users.lookup, "alice"))
+            with self.assertRaises(Fault) as fault:
+                await asyncio.to_thread(proxy.users.delete, 7)
+            self.assertEqual(4, fault.exception.faultCode)
+            with self.assertRaises(Fault):
+                await asyncio.to_thread(proxy.users.create, "bob")
+
+            self.assertEqual("users.lookup", (await lookup.wait_for_request()).rpc_method())
@@ -0,0 +1,58 @@
+import logging
+import unittest
+
+from aiohttp import ClientSession
+
+from http_request_recorder import RecorderServer
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestRecorderServer(unittest.IsolatedAsyncioTestCase):
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.port = 18080
+
+    async def test_sessions_routed_by_header_are_isolated(self) -> None:
+        async with RecorderServer(port=self.port) as server, ClientSession() as http_session:
+            async with server.session("first test") as first, server.session("second test") as second:
+                first_expectation = first.expect_path("/path", "first response")
+                second.expect_path("/path", "second response")
+
+                second_response = await http_session.post(f"{second.base_url}/path", headers=second.headers)
+                first_response = await http_session.post(f"{first.base_url}/path", headers=first.headers, data="for first")
+                unrouted_response = await http_session.post(f"{first.base_url}/path")
+
+                self.assertEqual(b'first response', await first_response.read())
+                self.assertEqual(b'second response', await second_response.read())
+                self.assertEqual(404, unrouted_response.status)
+                self.assertEqual(b'for first', await first_expectation.wait())
+
+            async with server.session("third test") as third:
+                response = await http_session.post(f"{third.base_url}/path", headers=third.headers)
+
+                self.assertEqual(404, response.status)
+                self.assertEqual(["/path"], [request.path for request in third.unexpected_requests()])
+
+    async def test_sessions_routed_by_path_prefix(self) -> None:
+        async with RecorderServer(port=self.port, route_by='path') as server, ClientSession() as http_session:
+            async with server.session("prefixed test") as recorder:
+                expectation = recorder.expect_path("/some/path", "routed")
+
+                response = await http_session.get(f"{recorder.base_url}/some/path?query=value")
+
+                self.assertEqual(b'routed', await response.read())
+                self.assertEqual("query=value", (await expectation.wait_for_request()).query_string)
+
+    async def test_sessions_routed_by_port(self) -> None:
+        async with RecorderServer(route_by='port', ports=[self.port, self.port + 1]) as server, ClientSession() as http_session:
+            async with server.session("first test") as first, server.session("second test") as second:
+                first.expect_path("/", "first")
+                second.expect_path("/", "second")
+
+                self.assertNotEqual(first.base_url, second.base_url)
+                self.assertEqual(b'first', await (await http_session.get(f"{first.base_url}/")).read())
+                self.assertEqual(b'second', await (await http_session.get(f"{second.base_url}/")).read())
+
+                with self.assertRaises(LookupError):
+                    server.session("one too many")
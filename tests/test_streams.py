@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import unittest
+
+from aiohttp import ClientSession
+
+from http_request_recorder import HttpRequestRecorder, RecordedRequest, matchers
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+class TestStreams(unittest.IsolatedAsyncioTestCase):
+    async def test_stream_delivers_requests_as_they_arrive(self) -> None:
+        async with (HttpRequestRecorder(name="streaming recorder") as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/expected", iter(lambda: "ok", None))
+            everything = recorder.stream()
+            only_expected = recorder.stream(matchers.path("/expected"))
+
+            await http_session.post(f"{recorder.base_url}/expected", data="first")
+            await http_session.post(f"{recorder.base_url}/unexpected", data="second")
+
+            first = await anext(everything)
+            self.assertIsInstance(first, RecordedRequest)
+            self.assertEqual(b'first', first.body)
+            self.assertEqual("/unexpected", (await anext(everything)).path)
+            self.assertEqual("/expected", (await anext(only_expected)).path)
+
+            await http_session.post(f"{recorder.base_url}/expected", data="third")
+            only_expected.close()
+            await http_session.post(f"{recorder.base_url}/expected", data="fourth")
+
+            self.assertEqual([], [request async for request in only_expected])
+            self.assertEqual(2, len(everything._requests))
+
+        # the recorder exiting ends the stream after the requests still queued
+        self.assertEqual([b'third', b'fourth'], [request.body async for request in everything])
+
+    async def test_blocking_stream_slows_down_the_client(self) -> None:
+        async with (HttpRequestRecorder(name="streaming recorder") as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/", iter(lambda: "ok", None))
+
+            async with recorder.stream(maxsize=2) as requests:
+                sending = asyncio.gather(*(http_session.get(f"{recorder.base_url}/") for _ in range(10)))
+                await asyncio.sleep(0.2)
+
+                self.assertFalse(sending.done())
+                self.assertEqual(2, len(requests._requests))
+
+                received = 0
+                async for _ in requests:
+                    received += 1
+                    if received == 10:
+                        break
+                self.assertEqual({200}, {response.status for response in await sending})
+
+    async def test_dropping_streams(self) -> None:
+        async with (HttpRequestRecorder(name="streaming recorder") as recorder,
+                    ClientSession() as http_session):
+            recorder.expect_path("/", iter(lambda: "ok", None))
+            newest_dropped = recorder.stream(maxsize=2, overflow='drop_newest')
+            oldest_dropped = recorder.stream(maxsize=2, overflow='drop_oldest')
+
+            for i in range(5):
+                await http_session.post(f"{recorder.base_url}/", data=str(i))
+
+            self.assertEqual(3, newest_dropped.dropped)
+            self.assertEqual(3, oldest_dropped.dropped)
+            self.assertEqual([b'0', b'1'], [(await anext(newest_dropped)).body for _ in range(2)])
+            self.assertEqual([b'3', b'4'], [(await anext(oldest_dropped)).body for _ in range(2)])
@@ -0,0 +1,159 @@
+import asyncio
+import importlib.util
+import logging
+import os
+import shutil
+import socket
+import ssl
+import tempfile
+import unittest
+
+from aiohttp import ClientSession, HttpVersion, TCPConnector
+
+from http_request_recorder import Http2Listener, HttpRequestRecorder, TlsConfig
+from http_request_recorder.listeners import AddressType
+from http_request_recorder.tls import _generate_with_openssl
+
+logging.basicConfig(encoding='utf-8', level=logging.INFO)
+
+
+def resumed_handshakes(port: int, client_context: ssl.SSLContext, connections: int) -> list[bool]:
+    """Connects `connections` times in a row, offering the TLS session of the previous connection."""
+    session = None
+    resumed = []
+    for _ in range(connections):
+        with socket.create_connection(('localhost', port)) as raw, client_context.wrap_socket(raw, server_hostname='localhost', session=session) as tls:
+            tls.sendall(b'GET /resumed HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n\r\n')
+            # TLS 1.3 session tickets arrive after the handshake, with the response
+            while tls.recv(65536):
+                pass
+            resumed.append(bool(tls.session_reused))
+            session = tls.session
+    return resumed
+
+
+def port_of(address: AddressType) -> int:
+    assert isinstance(address, tuple), f"{address} is no TCP address"
+    return address[1]
+
+
+async def http2_requests(port: int, requests: list[tuple[str, str, bytes]], ssl_context: ssl.SSLContext | None = None) -> list[tuple[int, bytes]]:
+    """Sends all `requests` at once, multiplexed over one HTTP/2 connection."""
+    from h2.config import H2Configuration
+    from h2.connection import H2Connection
+    from h2.events import DataReceived, ResponseReceived, StreamEnded
+
+    reader, writer = await asyncio.open_connection('localhost', port, ssl=ssl_context)
+    connection = H2Connection(H2Configuration(client_side=True))
+    connection.initiate_connection()
+    stream_ids = []
+    for method, path, body in requests:
+        stream_id = connection.get_next_available_stream_id()
+        connection.send_headers(stream_id, [(':method', method), (':path', path), (':scheme', 'https' if ssl_context else 'http'),
+                                            (':authority', f'localhost:{port}')], end_stream=not body)
+        # bodies have to fit into the initial flow control window
+        for offset in range(0, len(body), connection.max_outbound_frame_size):
+            chunk = body[offset:offset + connection.max_outbound_frame_size]
+            connection.send_data(stream_id, chunk, end_stream=offset + len(chunk) == len(body))
+        stream_ids.append(stream_id)
+    writer.write(connection.data_to_send())
+
+    statuses: dict[int, int] = {}
+    bodies: dict[int, bytearray] = {stream_id: bytearray() for stream_id in stream_ids}
+    ended: set[int] = set()
+    while len(ended) < len(stream_ids):
+        data = await reader.read(65536)
+        if not data:
+            break
+        for event in connection.receive_data(data):
+            if isinstance(event, ResponseReceived):
+                statuses[event.stream_id] = int(dict(event.headers)[b':status'])
+            elif isinstance(event, DataReceived):
+                bodies[event.stream_id] += event.data
+                connection.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+            elif isinstance(event, StreamEnded):
+                ended.add(event.stream_id)
+        writer.write(connection.data_to_send())
+    writer.close()
+    return [(statuses[stream_id], bytes(bodies[stream_id])) for stream_id in stream_ids]
+
+
+class TestTls(unittest.IsolatedAsyncioTestCase):
+    def setUp(self) -> None:
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.cache_dir)
+
+    async def test_https_with_cached_self_signed_certificate(self) -> None:
+        tls = TlsConfig(cache_dir=self.cache_dir)
+        async with HttpRequestRecorder(name="secure recorder", tls=tls) as recorder:
+            expectation = recorder.expect_path("/secure", "secret")
+            recorder.expect_path("/resumed", iter(lambda: "again", None))
+
+            async with ClientSession(connector=TCPConnector(ssl=tls.client_context())) as http_session:
+                response = await http_session.get(f"{recorder.base_url}/secure")
+
+                self.assertTrue(recorder.base_url.startswith("https://localhost:"))
+                self.assertEqual("secret", await response.text())
+                self.assertEqual(b"", await expectation.wait())
+
+            resumed = await asyncio.to_thread(resumed_handshakes, recorder.port, tls.client_context(), 3)
+            self.assertEqual([False, True, True], resumed)
+            self.assertEqual(2, tls.session_stats()['hits'])
+
+        reused = TlsConfig(cache_dir=self.cache_dir)
+        async with HttpRequestRecorder(name="another secure recorder", tls=reused):
+            self.assertEqual(tls.certfile, reused.certfile)
+
+    @unittest.skipUnless(hasattr(os, 'getuid'), "needs POSIX permissions")
+    async def test_cache_dir_accessible_to_others_is_refused(self) -> None:
+        os.chmod(self.cache_dir, 0o777)
+        with self.assertRaisesRegex(PermissionError, "accessible to other users"):
+            async with HttpRequestRecorder(name="secure recorder", tls=TlsConfig(cache_dir=self.cache_dir)):
+                pass
+
+    @unittest.skipUnless(shutil.which('openssl'), "needs the openssl command")
+    def test_certificate_generated_with_openssl(self) -> None:
+        path = os.path.join(self.cache_dir, 'generated.pem')
+        with open(path, 'wb') as file:
+            file.write(_generate_with_openssl(('localhost', '127.0.0.1')))
+
+        ssl.create_default_context(ssl.Purpose.CLIENT_AUTH).load_cert_chain(path)
+        ssl.create_default_context(cafile=path)
+
+
+@unittest.skipUnless(importlib.util.find_spec('h2'), "needs the h2 package")
+class TestHttp2(unittest.IsolatedAsyncioTestCase):
+    async def test_requests_are_multiplexed(self) -> None:
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        tls = TlsConfig(cache_dir=cache_dir)
+        cleartext, encrypted = Http2Listener(host='127.0.0.1'), Http2Listener(host='127.0.0.1', tls=tls)
+
+        async with HttpRequestRecorder(name="http2 recorder", listeners=[cleartext, encrypted]) as recorder:
+            small = recorder.expect_path("/small", iter(lambda: "small", None))
+            recorder.expect_path("/large", iter(lambda: b'x' * 200_000, None))
+            echo = recorder.expect_path("/echo", lambda request: request.body, method="POST")
+
+            responses = await http2_requests(port_of(recorder.addresses[1]), [
+                ("GET", "/small?page=1", b''),
+                ("GET", "/large", b''),
+                ("POST", "/echo", b'y' * 50_000),
+                ("HEAD", "/large", b''),
+                ("GET", "/missing", b''),
+            ])
+
+            self.assertEqual([(200, b'small'), (200, b'x' * 200_000), (200, b'y' * 50_000), (200, b''), (404, b'')], responses)
+            self.assertEqual((1, 5), (cleartext.connections, cleartext.streams))
+            request = await small.wait_for_request()
+            self.assertEqual(HttpVersion(2, 0), request.version)
+            self.assertEqual("page=1", request.query_string)
+            self.assertEqual(f"localhost:{port_of(recorder.addresses[1])}", request.headers["Host"])
+            self.assertEqual(50_000, len(await echo.wait()))
+
+            client_context = tls.client_context()
+            client_context.set_alpn_protocols(['h2'])
+            self.assertEqual([(200, b'small')] * 2,
+                             await http2_requests(port_of(recorder.addresses[2]), [("GET", "/small", b'')] * 2, client_context))
+            self.assertEqual((1, 2), (encrypted.connections, encrypted.streams))